@@ -11,6 +11,8 @@ import os
 
 from django.core.asgi import get_asgi_application
 
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'eventpass.settings')
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'eventsphere.settings')
+# Tells settings that connections must not be bound to threads
+os.environ.setdefault('SERVER_INTERFACE', 'asgi')
 
 application = get_asgi_application()
@@ -40,17 +40,21 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'eventsphereApp'
 ]
 
 MIDDLEWARE = [
+    'eventsphereApp.logs.RequestIdMiddleware',
+    'eventsphereApp.metrics.MetricsMiddleware',  # First, so it times every other middleware too
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',  # Add WhiteNoise for static files
+    'eventsphereApp.async_support.StaticFilesMiddleware',  # WhiteNoise, kept off the async request path
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    'eventsphereApp.db_router.ReplicaPinMiddleware',  # After sessions and messages, so only view writes pin
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
@@ -78,18 +82,46 @@ WSGI_APPLICATION = 'eventsphere.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
+# Connection reuse, see eventsphereApp/db_pool.py. DB_POOL_SIZE > 0 shares a
+# bounded pool between all threads of a process; otherwise each thread keeps
+# its connection for DB_CONN_MAX_AGE seconds. Thread-bound connections leak
+# under ASGI, so asgi.py sets SERVER_INTERFACE and they are turned off there.
+SERVER_INTERFACE = os.environ.get('SERVER_INTERFACE', 'wsgi')
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', '0'))
+DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', '10'))
+DB_POOL_MAX_IDLE = int(os.environ.get('DB_POOL_MAX_IDLE', '300'))
+DB_CONN_MAX_AGE = int(os.environ.get('DB_CONN_MAX_AGE', '60'))
+DB_CONN_HEALTH_CHECKS = os.environ.get('DB_CONN_HEALTH_CHECKS', 'True') == 'True'
+DB_CONNECT_TIMEOUT = int(os.environ.get('DB_CONNECT_TIMEOUT', '5'))
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': 'eventsphereApp.db_backend',
         # 'URL': os.environ.get("DBURL"),
         'NAME': os.environ.get("DBNAME"),
         'USER': os.environ.get("DBUSER"),
         'PASSWORD': os.environ.get("DBPASSWORD"),
         'HOST': os.environ.get("DBHOST"),
         'PORT': os.environ.get("DBPORT"),
+        'CONN_MAX_AGE': 0 if DB_POOL_SIZE or SERVER_INTERFACE == 'asgi' else DB_CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': DB_CONN_HEALTH_CHECKS,
+        'OPTIONS': {'connect_timeout': DB_CONNECT_TIMEOUT},
+        'POOL': {'max_size': DB_POOL_SIZE, 'timeout': DB_POOL_TIMEOUT, 'max_idle': DB_POOL_MAX_IDLE},
     }
 }
 
+# Read replicas, see eventsphereApp/db_router.py. Comma-separated hosts that
+# share the primary's credentials. Pointing one at the primary's own host gives
+# a local stand-in. REPLICA_LAG_WINDOW is the longest replication lag tolerated:
+# a user's reads stay on the primary that long after they write.
+DB_REPLICA_HOSTS = [host for host in os.environ.get('DB_REPLICA_HOSTS', '').split(',') if host]
+DATABASE_REPLICAS = []
+for index, host in enumerate(DB_REPLICA_HOSTS, start=1):
+    DATABASES[f'replica{index}'] = {**DATABASES['default'], 'HOST': host, 'TEST': {'MIRROR': 'default'}}
+    DATABASE_REPLICAS.append(f'replica{index}')
+DATABASE_ROUTERS = ['eventsphereApp.db_router.ReplicaRouter']
+REPLICA_LAG_WINDOW = int(os.environ.get('REPLICA_LAG_WINDOW', '15'))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -136,4 +168,112 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 MEDIA_URL = 'media/'
 
-MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
\ No newline at end of file
+MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# Keyset pagination for event listings
+EVENTS_PAGE_SIZE = int(os.environ.get('EVENTS_PAGE_SIZE', '12'))
+EVENTS_PAGE_SIZE_MAX = int(os.environ.get('EVENTS_PAGE_SIZE_MAX', '100'))
+HOME_PAGE_SIZE = int(os.environ.get('HOME_PAGE_SIZE', '5'))
+# My Tickets: event groups per page, and bookings fetched per expanded group
+MY_TICKETS_PAGE_SIZE = int(os.environ.get('MY_TICKETS_PAGE_SIZE', '20'))
+MY_TICKETS_BOOKINGS_PAGE_SIZE = int(os.environ.get('MY_TICKETS_BOOKINGS_PAGE_SIZE', '50'))
+# Organizer's attendee list, and the rows fetched per round trip by its export
+ATTENDEES_PAGE_SIZE = int(os.environ.get('ATTENDEES_PAGE_SIZE', '50'))
+ATTENDEE_EXPORT_CHUNK_SIZE = int(os.environ.get('ATTENDEE_EXPORT_CHUNK_SIZE', '2000'))
+
+# Maximum number of ranked matches rendered by searchResults
+SEARCH_RESULTS_LIMIT = int(os.environ.get('SEARCH_RESULTS_LIMIT', '100'))
+# Seconds faceted search results and counts stay cached per filter set (see eventsphereApp/facets.py)
+SEARCH_CACHE_TIMEOUT = int(os.environ.get('SEARCH_CACHE_TIMEOUT', '300'))
+
+# "You may also like" (see eventsphereApp/recommendations.py): similar events
+# stored per event, and the newest events per user the rebuild looks at
+RECOMMENDATIONS_PER_EVENT = int(os.environ.get('RECOMMENDATIONS_PER_EVENT', '10'))
+RECOMMENDATION_HISTORY_LIMIT = int(os.environ.get('RECOMMENDATION_HISTORY_LIMIT', '100'))
+
+# Background jobs (see eventsphereApp/jobs.py and the run_workers command)
+JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', '5'))
+JOB_RETRY_BASE_DELAY = int(os.environ.get('JOB_RETRY_BASE_DELAY', '30'))
+JOB_RETRY_MAX_DELAY = int(os.environ.get('JOB_RETRY_MAX_DELAY', '3600'))
+JOB_LOCK_TIMEOUT = int(os.environ.get('JOB_LOCK_TIMEOUT', '600'))
+
+# Event image uploads
+IMAGE_HOST_BACKEND = os.environ.get('IMAGE_HOST_BACKEND', 'eventsphereApp.image_hosts.ImgbbImageHost')
+IMAGE_UPLOAD_TIMEOUT = int(os.environ.get('IMAGE_UPLOAD_TIMEOUT', '30'))
+
+# Event image thumbnails (see eventsphereApp/thumbnails.py). THUMBNAIL_WORKERS=0
+# resizes in the calling process instead of a process pool.
+THUMBNAIL_WIDTHS = [int(width) for width in os.environ.get('THUMBNAIL_WIDTHS', '320,640,960').split(',')]
+THUMBNAIL_QUALITY = int(os.environ.get('THUMBNAIL_QUALITY', '80'))
+THUMBNAIL_WORKERS = int(os.environ.get('THUMBNAIL_WORKERS', '2'))
+THUMBNAIL_DISK_BUDGET = int(os.environ.get('THUMBNAIL_DISK_BUDGET', str(512 * 1024 * 1024)))
+THUMBNAIL_MAX_SOURCE_BYTES = int(os.environ.get('THUMBNAIL_MAX_SOURCE_BYTES', str(20 * 1024 * 1024)))
+THUMBNAIL_FETCH_TIMEOUT = int(os.environ.get('THUMBNAIL_FETCH_TIMEOUT', '15'))
+
+# Largest number of seats one purchase can book
+MAX_TICKETS_PER_PURCHASE = int(os.environ.get('MAX_TICKETS_PER_PURCHASE', '50'))
+
+# Gate check-in (see eventsphereApp/checkin.py). Ticket tokens are signed with
+# TICKET_SIGNING_KEY, falling back to SECRET_KEY; changing it invalidates
+# every ticket already issued.
+TICKET_SIGNING_KEY = os.environ.get('TICKET_SIGNING_KEY', '')
+CHECKIN_MAX_BATCH = int(os.environ.get('CHECKIN_MAX_BATCH', '1000'))
+
+# Cache backend. LocMemCache is per process, so point CACHE_BACKEND/CACHE_LOCATION
+# at a shared cache (e.g. django.core.cache.backends.redis.RedisCache) in production
+# for page cache purges to reach every gunicorn worker.
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', 'eventsphere'),
+    }
+}
+
+# Full-page cache for catalogue pages (see eventsphereApp/page_cache.py)
+PAGE_CACHE_ENABLED = os.environ.get('PAGE_CACHE_ENABLED', 'True') == 'True'
+PAGE_CACHE_ALIAS = 'default'
+PAGE_CACHE_TIMEOUT = int(os.environ.get('PAGE_CACHE_TIMEOUT', '300'))
+
+# How long a user's bookmarked event ids stay cached (see eventsphereApp/bookmark_cache.py)
+BOOKMARK_CACHE_TIMEOUT = int(os.environ.get('BOOKMARK_CACHE_TIMEOUT', '3600'))
+
+# Request metrics served at /metrics (see eventsphereApp/metrics.py). Scrapers
+# authenticate with "Authorization: Bearer $METRICS_TOKEN"; staff users can also
+# view it. Set METRICS_DIR to a directory shared by the gunicorn workers to
+# report all of them instead of whichever worker answers the scrape.
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'True') == 'True'
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+METRICS_DIR = os.environ.get('METRICS_DIR', '')
+METRICS_FLUSH_INTERVAL = int(os.environ.get('METRICS_FLUSH_INTERVAL', '10'))
+
+# Logging (see eventsphereApp/logs.py). Records are written by a background
+# thread; LOG_SAMPLE_RATE keeps that fraction of requests' DEBUG/INFO lines.
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'json')
+LOG_SAMPLE_RATE = float(os.environ.get('LOG_SAMPLE_RATE', '1.0'))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'filters': {
+        'request_id': {'()': 'eventsphereApp.logs.RequestIdFilter'},
+        'sampling': {'()': 'eventsphereApp.logs.SamplingFilter'},
+    },
+    'formatters': {
+        'json': {'()': 'eventsphereApp.logs.JsonFormatter'},
+        'text': {'format': '%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s'},
+    },
+    'handlers': {
+        'queue': {
+            '()': 'eventsphereApp.logs.QueueHandler',
+            'stream': 'ext://sys.stdout',
+            'formatter': LOG_FORMAT,
+            'filters': ['request_id', 'sampling'],
+        },
+    },
+    'loggers': {
+        'eventsphereApp': {'handlers': ['queue'], 'level': LOG_LEVEL, 'propagate': False},
+        'django': {'handlers': ['queue'], 'level': 'WARNING', 'propagate': False},
+        # 4xx responses are logged as warnings; only server errors are worth a line
+        'django.request': {'handlers': ['queue'], 'level': 'ERROR', 'propagate': False},
+    },
+}
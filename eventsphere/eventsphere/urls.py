@@ -16,7 +16,7 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path
-from eventsphereApp import views
+from eventsphereApp import api, views
 from eventsphereApp.views import *
 from django.conf.urls.static import static
 from django.conf import settings
@@ -40,12 +40,30 @@ urlpatterns = [
 
     path('bookmarks/', views.bookmarked_events, name='bookmarked_events'),
 
+    path('page-state/', views.page_state, name='page_state'),
+
+    path('metrics', views.metrics, name='metrics'),
+
+    path('thumbnails/<str:key>/<str:name>', views.thumbnail, name='thumbnail'),
+
+    path('api/v1/events/', api.events, name='api_events'),
+
+    path('api/v1/events/<int:event_id>/', api.event_detail, name='api_event_detail'),
+
+    path('api/v1/events/<int:event_id>/availability/', api.event_availability, name='api_event_availability'),
+
+    path('api/v1/me/tickets/', api.my_tickets, name='api_my_tickets'),
+
+    path('api/v1/me/bookmarks/', api.my_bookmarks, name='api_my_bookmarks'),
+
     path('my-listed-events/', views.my_listed_events, name='my_listed_events'),
 
     path('analytics-dashboard/', views.analytics_dashboard, name='analytics_dashboard'),  # ADD THIS LINE
 
     path('event-attendees/<int:event_id>/', views.event_attendees, name='event_attendees'),
 
+    path('event-attendees/<int:event_id>/export/', views.event_attendees_export, name='event_attendees_export'),
+
     path('event-bookmarks/<int:event_id>/', views.event_bookmarks_list, name='event_bookmarks_list'),
 
     path('edit-ticket-price/<int:event_id>/', views.edit_ticket_price, name='edit_ticket_price'),
@@ -60,7 +78,13 @@ urlpatterns = [
 
     path('my-tickets/', myTicketsList, name='MyTickets'),
 
+    path('my-tickets/<int:event_id>/', views.my_event_tickets, name='my_event_tickets'),
+
     path('ticket/', showTicket, name='Ticket'),
+
+    path('check-in/<int:event_id>/', views.checkin_scan, name='checkin_scan'),
+
+    path('check-in/<int:event_id>/manifest/', views.checkin_manifest, name='checkin_manifest'),
  
     path('about/', about, name='About'),
 
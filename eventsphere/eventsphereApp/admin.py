@@ -1,7 +1,8 @@
 from django.contrib import admin
-from .models import Event, Ticket, Bookmark
+from .models import Event, Ticket, Bookmark, Job
 
 # Register your models here.
 admin.site.register(Event)
 admin.site.register(Ticket)
-admin.site.register(Bookmark)
\ No newline at end of file
+admin.site.register(Bookmark)
+admin.site.register(Job)
\ No newline at end of file
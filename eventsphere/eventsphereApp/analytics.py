@@ -0,0 +1,188 @@
+"""
+Daily analytics rollup.
+
+Every booking, cancellation and bookmark bumps a single EventDailyStats row with
+F() expressions, so the organizer dashboard reads pre-aggregated numbers instead
+of counting Booking rows per event. rebuild_daily_stats() recomputes the table
+from scratch (see the rebuild_analytics management command).
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Booking, Bookmark, Event, EventDailyStats
+
+REBUILD_BATCH_SIZE = 1000
+
+
+def _day(value):
+    return timezone.localdate(value) if value else timezone.localdate()
+
+
+def bump_daily_stats(event, day, **deltas):
+    """Add deltas to the event's row for day, creating the row if needed"""
+    stats, _ = EventDailyStats.objects.get_or_create(
+        event_id=event.id,
+        date=day,
+        defaults={'organizer_id': event.user_id_id}
+    )
+    EventDailyStats.objects.filter(pk=stats.pk).update(
+        **{field: F(field) + delta for field, delta in deltas.items()}
+    )
+
+
+def _decrement_daily_stats(event_id, day, **deltas):
+    # Never create rows here: deletes can cascade from an Event that is going away
+    EventDailyStats.objects.filter(event_id=event_id, date=day).update(
+        **{field: F(field) - delta for field, delta in deltas.items()}
+    )
+
+
+def record_event_created(event):
+    """Give a new event an empty row so it shows up on the dashboard"""
+    EventDailyStats.objects.get_or_create(
+        event_id=event.id,
+        date=_day(None),
+        defaults={'organizer_id': event.user_id_id}
+    )
+
+
+def record_booking(booking, quantity=1):
+    event = booking.event_id
+    bump_daily_stats(
+        event, _day(booking.booked_at),
+        bookings=quantity, revenue=quantity * event.ticket_price
+    )
+
+
+def record_cancellation(booking, quantity=1):
+    bump_daily_stats(booking.event_id, _day(booking.cancelled_at), cancellations=quantity)
+
+
+def record_uncancellation(booking):
+    _decrement_daily_stats(booking.event_id_id, _day(booking.cancelled_at), cancellations=1)
+
+
+def record_booking_deleted(booking):
+    _decrement_daily_stats(
+        booking.event_id_id, _day(booking.booked_at),
+        bookings=1, revenue=booking.event_id.ticket_price
+    )
+    if booking.is_cancelled:
+        _decrement_daily_stats(booking.event_id_id, _day(booking.cancelled_at), cancellations=1)
+
+
+def record_bookmark(bookmark):
+    bump_daily_stats(bookmark.event, _day(bookmark.created_at), bookmarks=1)
+
+
+def record_bookmark_deleted(bookmark):
+    _decrement_daily_stats(bookmark.event_id, _day(bookmark.created_at), bookmarks=1)
+
+
+def rebuild_daily_stats(events=None):
+    """
+    Recompute EventDailyStats from Booking and Bookmark.
+
+    Revenue uses each event's current ticket price, since historical prices are
+    not stored anywhere else. Returns the number of rows written.
+    """
+    if events is None:
+        events = Event.objects.all()
+
+    rows = defaultdict(lambda: defaultdict(int))
+    organizers = dict(events.values_list('id', 'user_id'))
+
+    bookings = (
+        Booking.objects.filter(event_id__in=events)
+        .annotate(day=TruncDate('booked_at'))
+        .values('event_id', 'day')
+        .annotate(count=Count('id'), revenue=Sum('event_id__ticket_price'))
+    )
+    for row in bookings:
+        stats = rows[(row['event_id'], row['day'])]
+        stats['bookings'] += row['count']
+        stats['revenue'] += row['revenue'] or 0
+
+    cancellations = (
+        Booking.objects.filter(event_id__in=events, is_cancelled=True)
+        .annotate(day=TruncDate('cancelled_at'))
+        .values('event_id', 'day')
+        .annotate(count=Count('id'))
+    )
+    for row in cancellations:
+        rows[(row['event_id'], row['day'] or timezone.localdate())]['cancellations'] += row['count']
+
+    bookmarks = (
+        Bookmark.objects.filter(event__in=events)
+        .annotate(day=TruncDate('created_at'))
+        .values('event_id', 'day')
+        .annotate(count=Count('id'))
+    )
+    for row in bookmarks:
+        rows[(row['event_id'], row['day'])]['bookmarks'] += row['count']
+
+    # Events with no activity still get a row so they appear on the dashboard
+    seen_events = {event_id for event_id, _ in rows}
+    for event_id in organizers:
+        if event_id not in seen_events:
+            rows[(event_id, timezone.localdate())]
+
+    with transaction.atomic():
+        EventDailyStats.objects.filter(event_id__in=events).delete()
+        EventDailyStats.objects.bulk_create(
+            [
+                EventDailyStats(event_id=event_id, organizer_id=organizers[event_id], date=day, **stats)
+                for (event_id, day), stats in rows.items()
+            ],
+            batch_size=REBUILD_BATCH_SIZE
+        )
+    return len(rows)
+
+
+def organizer_dashboard(user):
+    """Build the analytics_dashboard context from the rollup table in one query"""
+    rows = list(
+        EventDailyStats.objects.filter(organizer=user)
+        .values('event_id', 'event__title', 'event__category')
+        .annotate(tickets_sold=Sum('bookings'), revenue=Sum('revenue'))
+        .order_by('event_id')
+    )
+    if not rows:
+        return None
+
+    total_tickets_sold = sum(row['tickets_sold'] for row in rows)
+    total_revenue = sum(row['revenue'] for row in rows)
+
+    event_stats = [
+        {'title': row['event__title'], 'tickets_sold': row['tickets_sold'], 'revenue': row['revenue']}
+        for row in rows
+    ]
+
+    category_revenue = defaultdict(int)
+    for row in rows:
+        category_revenue[row['event__category']] += row['revenue']
+
+    top_5_events = sorted(event_stats, key=lambda x: x['tickets_sold'], reverse=True)[:5]
+    top_5_categories = sorted(category_revenue.items(), key=lambda x: x[1], reverse=True)[:5]
+
+    event_revenue_percentage = []
+    if total_revenue > 0:
+        for stat in event_stats:
+            if stat['revenue'] > 0:
+                event_revenue_percentage.append({
+                    'title': stat['title'],
+                    'revenue': stat['revenue'],
+                    'percentage': round(stat['revenue'] / total_revenue * 100, 2)
+                })
+
+    return {
+        'total_revenue': total_revenue,
+        'total_tickets_sold': total_tickets_sold,
+        'top_5_events': top_5_events,
+        'top_5_categories': top_5_categories,
+        'event_revenue_percentage': event_revenue_percentage,
+    }
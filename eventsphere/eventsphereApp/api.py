@@ -0,0 +1,187 @@
+"""
+Read-only JSON API, version 1, under /api/v1/.
+
+The endpoints mirror the HTML views and reuse their queries. They cover keyset
+pages of events (newest first), one event, an event's seat availability, and
+the signed-in user's tickets and bookmarks. Lists take ?after= and
+?page_size= like the HTML pages and return the next page's URL. ?fields=
+picks which fields come back, and only the columns those need are loaded.
+Objects are turned into dicts directly, without templates. Responses are
+gzipped for clients that accept it.
+
+The /me/ endpoints use the session cookie and answer 401 rather than
+redirecting to the login page.
+"""
+from functools import wraps
+from operator import attrgetter
+
+from django.http import Http404, JsonResponse
+from django.middleware.gzip import GZipMiddleware
+from django.urls import reverse
+
+from . import thumbnails
+from .async_support import aget_object_or_404, aget_user
+from .bookings import seat_availability
+from .checkin import ticket_token
+from .db_router import read_from_replica
+from .models import Booking, Bookmark, Event
+from .pagination import akeyset_paginate, get_page_size
+
+
+def _columns(*names):
+    return {name: ((name,), attrgetter(name)) for name in names}
+
+
+# Field name: (model columns it needs, how to read it)
+EVENT_FIELDS = {
+    **_columns(
+        'id', 'title', 'category', 'city', 'address', 'pincode', 'starts_at', 'ends_at',
+        'description', 'image', 'ticket_price', 'capacity', 'updated_at',
+    ),
+    'seats_left': (('capacity', 'active_tickets'), attrgetter('seats_left')),
+    'sold_out': (('capacity', 'active_tickets'), attrgetter('is_sold_out')),
+    'thumbnails': (('image', 'thumbnails'), thumbnails.variants),
+    'url': (('id',), lambda event: f"{reverse('ViewEvent')}?id={event.id}"),
+}
+EVENT_DEFAULT_FIELDS = ('id', 'title', 'category', 'city', 'starts_at', 'ends_at', 'ticket_price', 'image')
+
+TICKET_FIELDS = {
+    **_columns('id', 'booked_at', 'is_cancelled', 'cancelled_at', 'checked_in_at'),
+    'event_id': (('event_id',), attrgetter('event_id_id')),
+    # The signed token the ticket's QR code carries
+    'token': (('event_id',), ticket_token),
+}
+TICKET_DEFAULT_FIELDS = ('id', 'event_id', 'booked_at', 'is_cancelled', 'checked_in_at')
+
+_gzip = GZipMiddleware(get_response=lambda request: None)
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def _error(status, message):
+    return JsonResponse({'error': message}, status=status)
+
+
+def api_view(view):
+    """Read-only async API view: GET only, errors as JSON, gzipped"""
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            response = _error(405, 'The API is read-only')
+            response['Allow'] = 'GET, HEAD'
+        else:
+            try:
+                response = await view(request, *args, **kwargs)
+            except ApiError as e:
+                response = _error(e.status, e.message)
+            except Http404:
+                response = _error(404, 'Not found')
+        return _gzip.process_response(request, response)
+    return wrapper
+
+
+def requested_fields(request, available, default):
+    names = [name.strip() for name in request.GET.get('fields', '').split(',') if name.strip()] or list(default)
+    unknown = [name for name in names if name not in available]
+    if unknown:
+        raise ApiError(400, f"Unknown fields: {', '.join(unknown)}. Available: {', '.join(available)}")
+    return list(dict.fromkeys(names))
+
+
+def only_columns(names, available, prefix='', required=('id',)):
+    """The columns to pass to .only() for names; keyset pagination needs the id"""
+    columns = set(required).union(*(available[name][0] for name in names))
+    return [prefix + column for column in sorted(columns)]
+
+
+def serialize(obj, names, available):
+    return {name: available[name][1](obj) for name in names}
+
+
+def _page_response(request, page, results):
+    next_url = None
+    if page.has_next:
+        query = request.GET.copy()
+        query['after'] = page.next_cursor
+        next_url = f'{request.path}?{query.urlencode()}'
+    return JsonResponse({'results': results, 'next': next_url})
+
+
+async def _user(request):
+    user = await aget_user(request)
+    if not user.is_authenticated:
+        raise ApiError(401, 'Sign in to use this endpoint')
+    return user
+
+
+@api_view
+@read_from_replica
+async def events(request):
+    """Events newest first, as on /events/"""
+    names = requested_fields(request, EVENT_FIELDS, EVENT_DEFAULT_FIELDS)
+    page = await akeyset_paginate(
+        Event.objects.only(*only_columns(names, EVENT_FIELDS)),
+        after=request.GET.get('after'),
+        page_size=get_page_size(request)
+    )
+    return _page_response(request, page, [serialize(event, names, EVENT_FIELDS) for event in page])
+
+
+@api_view
+@read_from_replica
+async def event_detail(request, event_id):
+    names = requested_fields(request, EVENT_FIELDS, EVENT_DEFAULT_FIELDS)
+    event = await aget_object_or_404(Event.objects.only(*only_columns(names, EVENT_FIELDS)), id=event_id)
+    return JsonResponse(serialize(event, names, EVENT_FIELDS))
+
+
+@api_view
+async def event_availability(request, event_id):
+    """Seats left, read from the primary like page_state since it changes with every booking"""
+    event = await aget_object_or_404(Event.objects.only('id', 'capacity', 'active_tickets'), id=event_id)
+    response = JsonResponse({'id': event.id, **seat_availability([event])[event.id]})
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+
+@api_view
+async def my_tickets(request):
+    """The user's bookings newest first, optionally for one ?event=, as on My Tickets"""
+    user = await _user(request)
+    names = requested_fields(request, TICKET_FIELDS, TICKET_DEFAULT_FIELDS)
+    bookings = Booking.objects.filter(user_id=user)
+    if request.GET.get('event'):
+        if not request.GET['event'].isdigit():
+            raise ApiError(400, 'event must be an event id')
+        bookings = bookings.filter(event_id=request.GET['event'])
+    page = await akeyset_paginate(
+        # Booking's post_init handler reads is_cancelled; deferring it costs a query per row
+        bookings.only(*only_columns(names, TICKET_FIELDS, required=('id', 'is_cancelled'))),
+        after=request.GET.get('after'),
+        page_size=get_page_size(request)
+    )
+    response = _page_response(request, page, [serialize(booking, names, TICKET_FIELDS) for booking in page])
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+@api_view
+async def my_bookmarks(request):
+    """The user's bookmarked events, newest bookmark first; ?fields= applies to the events"""
+    user = await _user(request)
+    names = requested_fields(request, EVENT_FIELDS, EVENT_DEFAULT_FIELDS)
+    bookmarks = Bookmark.objects.filter(user=user).select_related('event').only(
+        'id', 'created_at', 'event', *only_columns(names, EVENT_FIELDS, prefix='event__')
+    )
+    page = await akeyset_paginate(bookmarks, after=request.GET.get('after'), page_size=get_page_size(request))
+    response = _page_response(request, page, [
+        {'bookmarked_at': bookmark.created_at, 'event': serialize(bookmark.event, names, EVENT_FIELDS)}
+        for bookmark in page
+    ])
+    response['Cache-Control'] = 'private, no-cache'
+    return response
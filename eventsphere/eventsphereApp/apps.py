@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class EventsphereappConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'eventsphereApp'
+
+    def ready(self):
+        from . import metrics, signals, tasks  # noqa: F401
@@ -0,0 +1,106 @@
+"""
+Helpers for async views on Django 4.2.
+
+The ORM has async methods, but request.user, render() and the auth and
+method decorators are sync only; Django 5.0 adds request.auser() and
+async-aware decorators. The decorators here wrap sync views exactly like
+Django's, and wrap coroutine views without leaving the event loop except to
+load the user from the session. StaticFilesMiddleware keeps WhiteNoise out
+of the way of async requests.
+"""
+from functools import wraps
+from urllib.parse import urlparse
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.auth import decorators as auth_decorators
+from django.contrib.auth.views import redirect_to_login
+from django.http import Http404, HttpResponseNotAllowed
+from django.shortcuts import render
+from django.utils.log import log_response
+from django.views.decorators import http
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+
+async def aget_user(request):
+    """request.user, loaded in a worker thread since it reads the session and auth tables"""
+    await sync_to_async(lambda: request.user.is_authenticated)()
+    return request.user
+
+
+async def aget_object_or_404(queryset, **lookup):
+    try:
+        return await queryset.aget(**lookup)
+    except queryset.model.DoesNotExist:
+        raise Http404(f'No {queryset.model._meta.object_name} matches the given query.')
+
+
+async def arender(request, template_name, context=None):
+    # Context processors read the session and messages, and templates may
+    # evaluate lazy querysets, so rendering happens in a worker thread
+    return await sync_to_async(render)(request, template_name, context)
+
+
+def login_required(view):
+    if not iscoroutinefunction(view):
+        return auth_decorators.login_required(view)
+
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        user = await aget_user(request)
+        if not user.is_authenticated:
+            return redirect_to_login(request.get_full_path())
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+
+def require_POST(view):
+    if not iscoroutinefunction(view):
+        return http.require_POST(view)
+
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method != 'POST':
+            response = HttpResponseNotAllowed(['POST'])
+            log_response(
+                'Method Not Allowed (%s): %s', request.method, request.path, response=response, request=request
+            )
+            return response
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+
+class StaticFilesMiddleware:
+    """
+    WhiteNoise, consulted only for paths under STATIC_URL.
+
+    WhiteNoise 6 is sync only. Under ASGI every request passing through it
+    would hold a worker thread while the async views behind it wait, so
+    here only static file requests do.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        # Returns None for anything that is not a static file
+        self.whitenoise = WhiteNoiseMiddleware(get_response=lambda request: None)
+        self.static_prefix = '/' + urlparse(settings.STATIC_URL).path.lstrip('/')
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if request.path_info.startswith(self.static_prefix):
+            response = self.whitenoise(request)
+            if response is not None:
+                return response
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        if request.path_info.startswith(self.static_prefix):
+            response = await sync_to_async(self.whitenoise, thread_sensitive=False)(request)
+            if response is not None:
+                return response
+        return await self.get_response(request)
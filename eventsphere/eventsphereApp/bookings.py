@@ -0,0 +1,136 @@
+"""
+Seat reservation for bookings.
+
+Seats are taken with one conditional UPDATE on the Event row: it only matches
+while active_tickets + quantity still fits in capacity, so concurrent buyers
+can never oversell. The row lock is held only for the rest of the short
+booking transaction, and every path locks Event before EventDailyStats, so
+buy and cancel cannot deadlock each other.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import BooleanField, Case, Count, F, Max, Min, Q, Value, When
+from django.utils import timezone
+
+from . import analytics, counters
+from .models import CANCELLATION_NOTICE_DAYS, Booking, Event, Ticket
+
+
+class SoldOut(Exception):
+    """Not enough seats left on the event for this booking"""
+
+
+def reserve_seats(event, user, quantity=1):
+    """
+    Book quantity seats for user in one transaction, raising SoldOut if they
+    don't all fit. The bookings are written with a single bulk_create and the
+    purchase is recorded as one Ticket row carrying the quantity.
+    """
+    if quantity < 1:
+        raise ValueError('quantity must be at least 1')
+
+    with transaction.atomic():
+        reserved = Event.objects.filter(pk=event.pk).filter(
+            Q(capacity__isnull=True) | Q(active_tickets__lte=F('capacity') - quantity)
+        ).update(
+            tickets_sold=F('tickets_sold') + quantity,
+            active_tickets=F('active_tickets') + quantity
+        )
+        if not reserved:
+            raise SoldOut(f'Not enough seats left for {event.title}')
+
+        # bulk_create skips the post_save handlers: the UPDATE above already
+        # moved the Event counters and the rollup is bumped once below
+        bookings = Booking.objects.bulk_create(
+            [Booking(event_id=event, user_id=user) for _ in range(quantity)]
+        )
+        Ticket.objects.create(event=event, user=user, quantity=quantity)
+        analytics.record_booking(bookings[0], quantity=quantity)
+    return bookings
+
+
+def release_seats(booking, quantity=1):
+    """
+    Cancel booking plus up to quantity - 1 more of the same user's active
+    bookings for that event, and give the seats back. Returns how many were
+    actually cancelled, so a double submit can only release each seat once.
+    """
+    with transaction.atomic():
+        # Locking the booking first makes a second submit of the same form
+        # wait, then find it cancelled, rather than pick other seats
+        active = Booking.objects.select_for_update().filter(is_cancelled=False)
+        if not active.filter(pk=booking.pk).values_list('id', flat=True).first():
+            return 0
+        candidate_ids = [booking.pk] + list(
+            active.filter(event_id=booking.event_id_id, user_id=booking.user_id_id)
+            .exclude(pk=booking.pk).order_by('-id').values_list('id', flat=True)[:max(quantity - 1, 0)]
+        )
+
+        cancelled_at = timezone.now()
+        released = Booking.objects.filter(pk__in=candidate_ids, is_cancelled=False).update(
+            is_cancelled=True,
+            cancelled_at=cancelled_at
+        )
+        if not released:
+            return 0
+
+        booking.is_cancelled = True
+        booking.cancelled_at = cancelled_at
+        booking._was_cancelled = True
+        counters.booking_cancelled(booking, quantity=released)
+        analytics.record_cancellation(booking, quantity=released)
+    return released
+
+
+def seat_availability(events):
+    """{event id: seats left, sold out, most seats one purchase may book} for events loaded with their capacity"""
+    return {
+        event.id: {
+            'seats_left': event.seats_left,
+            'sold_out': event.is_sold_out,
+            'max_tickets': min(
+                settings.MAX_TICKETS_PER_PURCHASE,
+                event.seats_left if event.seats_left is not None else settings.MAX_TICKETS_PER_PURCHASE
+            )
+        }
+        for event in events
+    }
+
+
+def cancellation_cutoff():
+    """Bookings for events starting before this can no longer be cancelled"""
+    return timezone.now() + timedelta(days=CANCELLATION_NOTICE_DAYS)
+
+
+def booking_groups(user):
+    """
+    One row per event user has booked, most recently booked first.
+
+    Counts, the latest booking time and whether the event can still be
+    cancelled are all worked out by the GROUP BY query, so the cost of a page
+    does not grow with the number of bookings behind it.
+    """
+    return (
+        Booking.objects.filter(user_id=user)
+        .values('event_id')
+        .annotate(
+            event_name=F('event_id__title'),
+            dateTime=F('event_id__starts_at'),
+            location=F('event_id__city'),
+            event_image=F('event_id__image'),
+            can_cancel=Case(
+                When(event_id__starts_at__gte=cancellation_cutoff(), then=Value(True)),
+                default=Value(False),
+                output_field=BooleanField()
+            ),
+            total_tickets=Count('id'),
+            active_tickets=Count('id', filter=Q(is_cancelled=False)),
+            cancelled_tickets=Count('id', filter=Q(is_cancelled=True)),
+            latest_booked_at=Max('booked_at'),
+            # Any active booking can anchor a partial cancellation of the group
+            cancel_anchor_id=Min('id', filter=Q(is_cancelled=False))
+        )
+        .order_by('-latest_booked_at', '-event_id')
+    )
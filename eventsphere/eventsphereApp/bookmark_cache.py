@@ -0,0 +1,48 @@
+"""
+Per-user set of bookmarked event ids, kept in the cache backend.
+
+Pages ask "is this event bookmarked?" for every card they show. Loading the
+user's ids once into a frozenset makes each check a constant-time lookup, and
+the table is only read again when the entry expires or the user's bookmarks
+change.
+
+Entries are never patched in place. The Bookmark signal handlers bump a
+per-user generation once the write commits, and the set is cached under the
+generation it was read at. A reader that loaded the set before the bump can
+still store it afterwards, but under the old generation, which is never read
+again. Two toggles in quick succession each bump the generation, so neither
+change is lost.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Bookmark
+
+# Bump when the cached value's shape changes
+CACHE_VERSION = 1
+
+
+def _generation_key(user_id):
+    return f'bookmarks:user:{user_id}:generation'
+
+
+def get_bookmarked_ids(user):
+    """Return a frozenset of the event ids user has bookmarked"""
+    generation = cache.get(_generation_key(user.pk), 0, version=CACHE_VERSION)
+    key = f'bookmarks:user:{user.pk}:{generation}'
+    event_ids = cache.get(key, version=CACHE_VERSION)
+    if event_ids is None:
+        event_ids = frozenset(Bookmark.objects.filter(user_id=user.pk).order_by().values_list('event_id', flat=True))
+        cache.set(key, event_ids, settings.BOOKMARK_CACHE_TIMEOUT, version=CACHE_VERSION)
+    return event_ids
+
+
+def invalidate(user_id):
+    """Make the next get_bookmarked_ids() for the user read the table"""
+    key = _generation_key(user_id)
+    # add() is a no-op if the key exists; incr() is atomic on shared backends
+    cache.add(key, 0, timeout=None, version=CACHE_VERSION)
+    try:
+        cache.incr(key, version=CACHE_VERSION)
+    except ValueError:
+        cache.set(key, 1, timeout=None, version=CACHE_VERSION)
@@ -0,0 +1,143 @@
+"""
+Conditional GET (ETag and Last-Modified) for pages built from events.
+
+A decorated view is given a validator that returns (version, last_modified)
+from one indexed lookup, without rendering anything. The validators are
+Event.updated_at for an event page (with the recommendations ContentVersion
+row, for its "you may also like" list), the catalogue ContentVersion row for
+listings, and an aggregate over the user's bookmarks for the bookmarks page.
+The ETag hashes that version together with the rest of what the HTML depends
+on: the viewer (the navbar shows their name), the path and the normalised
+query string. A client sending a matching If-None-Match or If-Modified-Since
+gets a 304.
+
+Like the page cache, listings only go stale when an event's own fields
+change. Counters and seats left come from page_state. ContentVersion rows
+are also kept in the page cache, so a cached listing still costs no queries.
+"""
+import hashlib
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Count, F, Max
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+from .models import Bookmark, ContentVersion, Event
+from .page_cache import has_pending_messages, normalise_query_string
+
+CATALOGUE = 'catalogue'
+RECOMMENDATIONS = 'recommendations'
+
+
+def _version_key(name):
+    return f'conditional:version:{name}'
+
+
+def bump(name):
+    """Move a ContentVersion on, creating its row the first time"""
+    now = timezone.now()
+    if not ContentVersion.objects.filter(name=name).update(version=F('version') + 1, updated_at=now):
+        ContentVersion.objects.get_or_create(name=name, defaults={'version': 1, 'updated_at': now})
+    transaction.on_commit(lambda: caches[settings.PAGE_CACHE_ALIAS].delete(_version_key(name)))
+
+
+def bump_catalogue():
+    bump(CATALOGUE)
+
+
+def _cached_version(name):
+    """(version, updated_at) of a ContentVersion row, read through the page cache"""
+    cache = caches[settings.PAGE_CACHE_ALIAS]
+    row = cache.get(_version_key(name))
+    if row is None:
+        row = ContentVersion.objects.filter(name=name).values_list('version', 'updated_at').first()
+        row = row or (0, None)
+        # Bounded in case a reader races a bump's delete
+        cache.set(_version_key(name), row, settings.PAGE_CACHE_TIMEOUT)
+    return row
+
+
+def catalogue_validator(request):
+    return _cached_version(CATALOGUE)
+
+
+def event_validator(request):
+    event_id = request.GET.get('id', '')
+    if not event_id.isdigit():
+        return None
+    updated_at = Event.objects.filter(id=event_id).values_list('updated_at', flat=True).first()
+    if updated_at is None:
+        return None
+    version, rebuilt_at = _cached_version(RECOMMENDATIONS)
+    return f'{updated_at.isoformat()}:{version}', max(updated_at, rebuilt_at or updated_at)
+
+
+def bookmarks_validator(request):
+    # Adding or removing a bookmark moves the count or the newest created_at
+    stats = Bookmark.objects.filter(user=request.user).aggregate(
+        count=Count('id'), added=Max('created_at'), changed=Max('event__updated_at')
+    )
+    stamps = [stamp for stamp in (stats['added'], stats['changed']) if stamp is not None]
+    return (
+        f"{stats['count']}:{stats['added']}:{stats['changed']}",
+        max(stamps) if stamps else None,
+    )
+
+
+def _validators(request, validator):
+    """(etag, last_modified timestamp) for the request, or None if it must not be answered with a 304"""
+    if request.method not in ('GET', 'HEAD') or has_pending_messages(request):
+        return None
+    result = validator(request)
+    if result is None:
+        return None
+    version, last_modified = result
+    viewer = f'user:{request.user.pk}' if request.user.is_authenticated else 'anon'
+    raw = '|'.join([viewer, request.path, normalise_query_string(request.GET), str(version)])
+    etag = quote_etag(hashlib.sha256(raw.encode('utf-8')).hexdigest()[:32])
+    return etag, int(last_modified.timestamp()) if last_modified else None
+
+
+def _finish(request, response, etag, last_modified):
+    if response.status_code == 200 and not response.has_header('ETag'):
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+    # Always revalidate; a 304 is one indexed lookup
+    patch_cache_control(response, no_cache=True, private=request.user.is_authenticated)
+    return response
+
+
+def conditional_page(validator):
+    """Answer conditional GETs for a sync or async view from validator(request), without running the view"""
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                validators = await sync_to_async(_validators)(request, validator)
+                if validators is None:
+                    return await view(request, *args, **kwargs)
+                etag, last_modified = validators
+                response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+                if response is None:
+                    response = await view(request, *args, **kwargs)
+                return _finish(request, response, etag, last_modified)
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            validators = _validators(request, validator)
+            if validators is None:
+                return view(request, *args, **kwargs)
+            etag, last_modified = validators
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if response is None:
+                response = view(request, *args, **kwargs)
+            return _finish(request, response, etag, last_modified)
+        return wrapper
+    return decorator
@@ -0,0 +1,100 @@
+"""
+Denormalized booking and bookmark counters stored on Event.
+
+The counters are bumped with F() expressions from the Booking/Bookmark signal
+handlers, so they commit in the same transaction as the row that changed them.
+find_counter_drift() and repair_counters() back the reconcile_counters command.
+"""
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from .models import Booking, Bookmark, Event
+
+COUNTER_FIELDS = ('tickets_sold', 'active_tickets', 'cancelled_tickets', 'bookmarks_count')
+
+RECONCILE_CHUNK_SIZE = 2000
+
+
+def _bump(event_id, **deltas):
+    Event.objects.filter(pk=event_id).update(
+        **{field: F(field) + delta for field, delta in deltas.items()}
+    )
+
+
+def booking_created(booking, quantity=1):
+    if booking.is_cancelled:
+        _bump(booking.event_id_id, tickets_sold=quantity, cancelled_tickets=quantity)
+    else:
+        _bump(booking.event_id_id, tickets_sold=quantity, active_tickets=quantity)
+
+
+def booking_cancelled(booking, quantity=1):
+    _bump(booking.event_id_id, active_tickets=-quantity, cancelled_tickets=quantity)
+
+
+def booking_uncancelled(booking):
+    _bump(booking.event_id_id, active_tickets=1, cancelled_tickets=-1)
+
+
+def booking_deleted(booking):
+    if booking.is_cancelled:
+        _bump(booking.event_id_id, tickets_sold=-1, cancelled_tickets=-1)
+    else:
+        _bump(booking.event_id_id, tickets_sold=-1, active_tickets=-1)
+
+
+def bookmark_created(bookmark):
+    _bump(bookmark.event_id, bookmarks_count=1)
+
+
+def bookmark_deleted(bookmark):
+    _bump(bookmark.event_id, bookmarks_count=-1)
+
+
+def _count(queryset, fk):
+    counts = (
+        queryset.filter(**{fk: OuterRef('pk')})
+        .order_by()
+        .values(fk)
+        .annotate(count=Count('pk'))
+        .values('count')
+    )
+    return Coalesce(Subquery(counts), Value(0))
+
+
+def actual_count_expressions():
+    """Subquery expressions recomputing each counter from Booking and Bookmark"""
+    return {
+        'tickets_sold': _count(Booking.objects.all(), 'event_id'),
+        'active_tickets': _count(Booking.objects.filter(is_cancelled=False), 'event_id'),
+        'cancelled_tickets': _count(Booking.objects.filter(is_cancelled=True), 'event_id'),
+        'bookmarks_count': _count(Bookmark.objects.all(), 'event'),
+    }
+
+
+def find_counter_drift(events=None):
+    """Yield (event, {field: (stored, actual)}) for every event whose counters are wrong"""
+    if events is None:
+        events = Event.objects.all()
+
+    actual = {f'actual_{field}': expression for field, expression in actual_count_expressions().items()}
+    events = events.only('id', *COUNTER_FIELDS).annotate(**actual).order_by('id')
+    for event in events.iterator(chunk_size=RECONCILE_CHUNK_SIZE):
+        drift = {}
+        for field in COUNTER_FIELDS:
+            stored, recomputed = getattr(event, field), getattr(event, f'actual_{field}')
+            if stored != recomputed:
+                drift[field] = (stored, recomputed)
+        if drift:
+            yield event, drift
+
+
+def repair_counters(event_ids, fields=COUNTER_FIELDS):
+    """
+    Recompute counters inside the UPDATE itself, so bookings that land while
+    the reconcile runs are not overwritten by a stale value.
+    """
+    expressions = actual_count_expressions()
+    return Event.objects.filter(pk__in=event_ids).update(
+        **{field: expressions[field] for field in fields}
+    )
@@ -0,0 +1,78 @@
+"""
+The stock PostgreSQL backend, plus connection counting and optional pooling.
+
+With DATABASES[alias]['POOL']['max_size'] > 0, connections come from a
+per-process db_pool.ConnectionPool and closing one hands it back. Otherwise
+this behaves exactly like django.db.backends.postgresql.
+"""
+from django.db.backends.postgresql import base
+
+from eventsphereApp import db_pool
+
+# libpq PQtransactionStatus values, the same for psycopg2 and psycopg 3
+TRANSACTION_IDLE = 0
+TRANSACTION_UNKNOWN = 4
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    @property
+    def pool_settings(self):
+        return self.settings_dict.get('POOL') or {}
+
+    @property
+    def pooled(self):
+        return self.pool_settings.get('max_size', 0) > 0
+
+    def open_connection(self, conn_params):
+        connection = super().get_new_connection(conn_params)
+        db_pool.connection_opened(self.alias)
+        return connection
+
+    def get_new_connection(self, conn_params):
+        if not self.pooled:
+            return self.open_connection(conn_params)
+        # A pooled connection was opened with another wrapper's state; set it up for this one
+        self.isolation_level = base.IsolationLevel(
+            self.settings_dict['OPTIONS'].get('isolation_level', base.IsolationLevel.READ_COMMITTED)
+        )
+        return self.get_pool(conn_params).getconn()
+
+    def get_pool(self, conn_params):
+        pool_settings = self.pool_settings
+        return db_pool.get_pool(self.alias, lambda: db_pool.ConnectionPool(
+            connect=lambda: self.open_connection(conn_params),
+            max_size=pool_settings['max_size'],
+            timeout=pool_settings.get('timeout', 10),
+            max_idle=pool_settings.get('max_idle', 300),
+            check=ping if self.settings_dict['CONN_HEALTH_CHECKS'] else None,
+        ))
+
+    def _close(self):
+        if not self.pooled:
+            return super()._close()
+        connection = self.connection
+        self.get_pool(self.get_connection_params()).putconn(connection, discard=not reset_for_reuse(connection))
+
+
+def ping(connection):
+    if connection.closed:
+        raise base.Database.InterfaceError('connection already closed')
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT 1')
+
+
+def reset_for_reuse(connection):
+    """Roll back whatever the last user left open; False if the connection should be dropped"""
+    if connection.closed:
+        return False
+    status = connection.info.transaction_status
+    if status == TRANSACTION_UNKNOWN:
+        return False
+    try:
+        if status != TRANSACTION_IDLE:
+            connection.rollback()
+        # Closed inside atomic(); the health check must not open a transaction
+        connection.autocommit = True
+    except base.Database.Error:
+        return False
+    return True
@@ -0,0 +1,168 @@
+"""
+Database connection reuse.
+
+Django's persistent connections (CONN_MAX_AGE) keep one connection per
+thread. That suits gunicorn's sync workers, where one thread serves every
+request of a process. Under ASGI the sync parts of a request run on executor
+threads, so persistent connections pile up, one per thread, and are never
+closed. ConnectionPool fixes that. It holds up to max_size connections per
+process and database alias, and any thread can use them. Django closes its
+connection after every request (CONN_MAX_AGE=0) and the pool takes it back.
+
+A checkout waits up to `timeout` seconds for a free connection and then
+raises PoolTimeout. Idle connections older than max_idle are closed rather
+than handed out. With health checks on, each one is pinged before reuse.
+Every process also counts the connections it really opened, pooled or not,
+and metrics.py exports those counts.
+"""
+import os
+import threading
+import time
+from collections import deque
+
+_pools = {}
+_opened = {}
+_lock = threading.Lock()
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class ConnectionPool:
+    """
+    A bounded, thread-safe pool of DB-API connections.
+
+    connect() opens a new connection, check(conn) raises if it is unusable
+    and close(conn) closes it.
+    """
+
+    def __init__(self, connect, max_size, timeout, max_idle, check=None, close=None):
+        self._connect = connect
+        self._check = check
+        self._close = close or (lambda conn: conn.close())
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.pid = os.getpid()
+        self._idle = deque()
+        self._condition = threading.Condition()
+        self.in_use = 0
+        self.stats = {
+            'opened': 0, 'closed': 0, 'checkouts': 0, 'reused': 0,
+            'waits': 0, 'wait_seconds': 0.0, 'timeouts': 0, 'failed_checks': 0,
+        }
+
+    @property
+    def size(self):
+        return self.in_use + len(self._idle)
+
+    def getconn(self):
+        started = time.monotonic()
+        deadline = started + self.timeout
+        waited = False
+        with self._condition:
+            while True:
+                conn = self._take_idle()
+                if conn is not None:
+                    self._checked_out(started, waited, reused=True)
+                    return conn
+                if self.size < self.max_size:
+                    # Reserve the slot, then connect without holding the lock
+                    self.in_use += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.stats['timeouts'] += 1
+                    raise PoolTimeout(
+                        f'No database connection free after {self.timeout}s ({self.max_size} in use)'
+                    )
+                waited = True
+                self._condition.wait(remaining)
+
+        try:
+            conn = self._connect()
+        except BaseException:
+            with self._condition:
+                self.in_use -= 1
+                self._condition.notify()
+            raise
+        with self._condition:
+            self.stats['opened'] += 1
+            self._checked_out(started, waited, reused=False)
+        return conn
+
+    def _checked_out(self, started, waited, reused):
+        self.stats['checkouts'] += 1
+        if reused:
+            self.stats['reused'] += 1
+        if waited:
+            self.stats['waits'] += 1
+            self.stats['wait_seconds'] += time.monotonic() - started
+
+    def _take_idle(self):
+        # Most recently returned first, so surplus connections go idle and expire
+        while self._idle:
+            conn, idle_since = self._idle.pop()
+            if time.monotonic() - idle_since > self.max_idle:
+                self._discard(conn)
+                continue
+            if self._check is not None:
+                try:
+                    self._check(conn)
+                except Exception:
+                    self.stats['failed_checks'] += 1
+                    self._discard(conn)
+                    continue
+            self.in_use += 1
+            return conn
+        return None
+
+    def putconn(self, conn, discard=False):
+        with self._condition:
+            self.in_use -= 1
+            if discard:
+                self._discard(conn)
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._condition.notify()
+
+    def _discard(self, conn):
+        self.stats['closed'] += 1
+        try:
+            self._close(conn)
+        except Exception:
+            pass
+
+    def closeall(self):
+        with self._condition:
+            while self._idle:
+                self._discard(self._idle.pop()[0])
+
+
+def get_pool(alias, factory):
+    """The pool for alias in this process, created with factory() on first use"""
+    with _lock:
+        pool = _pools.get(alias)
+        # A forked worker must not share its parent's sockets
+        if pool is None or pool.pid != os.getpid():
+            pool = _pools[alias] = factory()
+        return pool
+
+
+def connection_opened(alias):
+    with _lock:
+        _opened[alias] = _opened.get(alias, 0) + 1
+
+
+def connection_stats():
+    """{alias: {stat: value}} for this process: connections opened, plus pool usage where pooled"""
+    with _lock:
+        stats = {alias: {'opened': count} for alias, count in _opened.items()}
+        pools = [(alias, pool) for alias, pool in _pools.items() if pool.pid == os.getpid()]
+    for alias, pool in pools:
+        with pool._condition:
+            entry = stats.setdefault(alias, {'opened': 0})
+            entry.update({key: value for key, value in pool.stats.items() if key != 'opened'})
+            entry.update({'in_use': pool.in_use, 'idle': len(pool._idle), 'max_size': pool.max_size})
+    return stats
@@ -0,0 +1,139 @@
+"""
+Read-replica routing.
+
+Views decorated with @read_from_replica send their reads to one of
+DATABASE_REPLICAS, picked at random per request, so they must not write
+and then read back. Every other read, and every write, goes to the primary.
+A user who has just written something (a booking, a bookmark, a
+cancellation) gets a cookie that pins their reads to the primary for
+REPLICA_LAG_WINDOW seconds, so they see their own change even while the
+replicas catch up. The page cache does
+the same after a purge, so it never stores a page rendered from stale data.
+"""
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+PIN_COOKIE = 'db_primary_until'
+
+_read_alias = ContextVar('db_read_alias', default=None)
+_pinned = ContextVar('db_pinned', default=False)
+# Set per request by ReplicaPinMiddleware; db_for_write() flags it
+_writes = ContextVar('db_writes', default=None)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        return _read_alias.get() or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        writes = _writes.get()
+        if writes is not None:
+            writes['seen'] = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        return True
+
+
+@contextmanager
+def use_replica():
+    """Send reads in this block to a replica, unless the request is pinned to the primary"""
+    if _pinned.get() or not settings.DATABASE_REPLICAS:
+        yield
+        return
+    token = _read_alias.set(random.choice(settings.DATABASE_REPLICAS))
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+
+@contextmanager
+def use_primary():
+    """Send reads in this block, including any use_replica() inside it, to the primary"""
+    read_token = _read_alias.set(None)
+    pinned_token = _pinned.set(True)
+    try:
+        yield
+    finally:
+        _read_alias.reset(read_token)
+        _pinned.reset(pinned_token)
+
+
+def read_from_replica(view):
+    """Run a read-only view, sync or async, against a replica"""
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            with use_replica():
+                return await view(request, *args, **kwargs)
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        with use_replica():
+            return view(request, *args, **kwargs)
+    return wrapper
+
+
+class ReplicaPinMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not settings.DATABASE_REPLICAS:
+            return self.get_response(request)
+
+        writes, tokens = self._start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            self._finish(tokens)
+        return self._pin(response, writes)
+
+    async def __acall__(self, request):
+        if not settings.DATABASE_REPLICAS:
+            return await self.get_response(request)
+
+        writes, tokens = self._start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            self._finish(tokens)
+        return self._pin(response, writes)
+
+    def _start(self, request):
+        try:
+            pinned = float(request.COOKIES.get(PIN_COOKIE, 0)) > time.time()
+        except ValueError:
+            pinned = False
+        writes = {'seen': False}
+        return writes, (_writes.set(writes), _pinned.set(pinned))
+
+    def _finish(self, tokens):
+        writes_token, pinned_token = tokens
+        _writes.reset(writes_token)
+        _pinned.reset(pinned_token)
+
+    def _pin(self, response, writes):
+        if writes['seen']:
+            window = settings.REPLICA_LAG_WINDOW
+            response.set_cookie(
+                PIN_COOKIE, str(int(time.time() + window)), max_age=window, httponly=True, samesite='Lax'
+            )
+        return response
@@ -0,0 +1,261 @@
+"""
+Faceted event search.
+
+The search page narrows events by category, city, price range and date range
+on top of the free-text query. It shows how many events each facet value
+would leave, e.g. how many Music events there are in Paris this month.
+
+All of those counts come from one grouped query. The events matching the
+text query, price range and date range are grouped by (category, city,
+price band, month), and the per-facet counts are summed from those rows in
+Python. Category and city counts ignore their own selection, so picking
+Music still shows how many events the other categories have. The results
+and counts are cached per normalised filter set, across users, until the
+catalogue or any price changes.
+"""
+import calendar
+import datetime
+import hashlib
+from collections import Counter
+from contextlib import nullcontext
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Case, CharField, Count, Value, When
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from . import page_cache
+from .db_router import use_primary
+from .models import Event
+from .search import search_events
+
+# (value, label, lowest price, highest price); the last band has no upper bound
+PRICE_BANDS = (
+    ('free', 'Free', 0, 0),
+    ('1-25', '$1 to $25', 1, 25),
+    ('26-50', '$26 to $50', 26, 50),
+    ('51-100', '$51 to $100', 51, 100),
+    ('101+', 'Over $100', 101, None),
+)
+
+# Category and city values listed per facet, besides selected ones
+FACET_LIMIT = 10
+
+CACHE_TAGS = (page_cache.CATALOGUE_TAG, page_cache.PRICES_TAG)
+
+
+def parse_filters(query_dict):
+    """(filters, errors) from the search page's query string"""
+    filters = {
+        'query': query_dict.get('query', '').strip(),
+        'search_type': query_dict.get('search-type', '').strip(),
+        'categories': sorted({value.strip() for value in query_dict.getlist('category') if value.strip()}),
+        'cities': sorted({value.strip() for value in query_dict.getlist('city') if value.strip()}),
+        'price_min': None,
+        'price_max': None,
+        'date_from': None,
+        'date_to': None,
+    }
+    errors = []
+    for name in ('price_min', 'price_max'):
+        value = query_dict.get(name, '').strip()
+        if value:
+            try:
+                filters[name] = max(int(value), 0)
+            except ValueError:
+                errors.append('Invalid price.')
+    # ?date= is the single day picked in the search box
+    day = query_dict.get('date', '').strip()
+    for name in ('date_from', 'date_to'):
+        value = query_dict.get(name, '').strip() or day
+        if value:
+            try:
+                filters[name] = datetime.datetime.strptime(value, '%Y-%m-%d').date()
+            except ValueError:
+                errors.append('Invalid date format.')
+    return filters, sorted(set(errors))
+
+
+# Filters where 0 or a date is a real choice rather than "not set"
+RANGE_FILTERS = ('price_min', 'price_max', 'date_from', 'date_to')
+
+
+def is_empty(filters):
+    return not any(
+        filters[name] is not None if name in RANGE_FILTERS else filters[name]
+        for name in filters if name != 'search_type'
+    )
+
+
+def _query_items(filters):
+    items = []
+    if filters['query']:
+        items.append(('query', filters['query']))
+        if filters['search_type']:
+            items.append(('search-type', filters['search_type']))
+    items += [('category', value) for value in filters['categories']]
+    items += [('city', value) for value in filters['cities']]
+    for name in RANGE_FILTERS:
+        if filters[name] is not None:
+            items.append((name, str(filters[name])))
+    return items
+
+
+def search_url(filters, **changes):
+    """The search page for filters with changes applied"""
+    return '/search/?' + urlencode(_query_items({**filters, **changes}))
+
+
+def _day_start(day):
+    return timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+
+
+def _apply_ranges(queryset, filters):
+    if filters['price_min'] is not None:
+        queryset = queryset.filter(ticket_price__gte=filters['price_min'])
+    if filters['price_max'] is not None:
+        queryset = queryset.filter(ticket_price__lte=filters['price_max'])
+    if filters['date_from'] is not None:
+        queryset = queryset.filter(starts_at__gte=_day_start(filters['date_from']))
+    if filters['date_to'] is not None:
+        queryset = queryset.filter(starts_at__lt=_day_start(filters['date_to'] + datetime.timedelta(days=1)))
+    return queryset
+
+
+def _ranged(filters):
+    """Events matching everything but the category and city selections"""
+    queryset = _apply_ranges(Event.objects.all(), filters)
+    if filters['query']:
+        queryset = queryset.filter(id__in=search_events(filters['query'], filters['search_type']).values('id'))
+    return queryset
+
+
+def _facet_rows(queryset):
+    price_band = Case(
+        *[When(ticket_price__lte=high, then=Value(value)) for value, _, _, high in PRICE_BANDS if high is not None],
+        default=Value(PRICE_BANDS[-1][0]),
+        output_field=CharField(),
+    )
+    return (
+        queryset.order_by()
+        .annotate(price_band=price_band, month=TruncMonth('starts_at'))
+        .values('category', 'city', 'price_band', 'month')
+        .annotate(count=Count('id'))
+    )
+
+
+def _selected(row, filters, skip=None):
+    if skip != 'category' and filters['categories'] and row['category'] not in filters['categories']:
+        return False
+    if skip != 'city' and filters['cities'] and row['city'] not in filters['cities']:
+        return False
+    return True
+
+
+def _count_facets(rows, filters):
+    counts = {'category': Counter(), 'city': Counter(), 'price': Counter(), 'month': Counter()}
+    total = 0
+    for row in rows:
+        month = row['month'].strftime('%Y-%m')
+        if _selected(row, filters, skip='category'):
+            counts['category'][row['category']] += row['count']
+        if _selected(row, filters, skip='city'):
+            counts['city'][row['city']] += row['count']
+        if _selected(row, filters):
+            counts['price'][row['price_band']] += row['count']
+            counts['month'][month] += row['count']
+            total += row['count']
+    return {name: dict(counter) for name, counter in counts.items()}, total
+
+
+def _results(filters):
+    queryset = _apply_ranges(Event.objects.all(), filters)
+    if filters['categories']:
+        queryset = queryset.filter(category__in=filters['categories'])
+    if filters['cities']:
+        queryset = queryset.filter(city__in=filters['cities'])
+    if filters['query']:
+        # Best match first
+        queryset = search_events(filters['query'], filters['search_type'], queryset=queryset)
+    else:
+        queryset = queryset.order_by('starts_at', 'id')
+    return list(queryset[:settings.SEARCH_RESULTS_LIMIT])
+
+
+def _cache_key(filters):
+    raw = '|'.join([urlencode(_query_items(filters)), *page_cache.tag_versions(CACHE_TAGS)])
+    return 'search:facets:' + hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def search(filters):
+    """(events, total matching, facet groups) for filters"""
+    cache = caches[settings.PAGE_CACHE_ALIAS]
+    key = _cache_key(filters)
+    cached = cache.get(key)
+    if cached is None:
+        # Like the page cache, don't refill from a replica that may predate a purge
+        with use_primary() if page_cache.recently_purged(CACHE_TAGS) else nullcontext():
+            counts, total = _count_facets(_facet_rows(_ranged(filters)), filters)
+            events = _results(filters)
+        cached = {'ids': [event.id for event in events], 'total': total, 'counts': counts}
+        cache.set(key, cached, settings.SEARCH_CACHE_TIMEOUT)
+    else:
+        by_id = Event.objects.in_bulk(cached['ids'])
+        events = [by_id[event_id] for event_id in cached['ids'] if event_id in by_id]
+    return events, cached['total'], facet_groups(filters, cached['counts'])
+
+
+def _month_bounds(month):
+    year, number = (int(part) for part in month.split('-'))
+    return datetime.date(year, number, 1), datetime.date(year, number, calendar.monthrange(year, number)[1])
+
+
+def _toggle(values, value):
+    return sorted(set(values) ^ {value})
+
+
+def facet_groups(filters, counts):
+    """[{'name', 'label', 'values': [{'label', 'count', 'selected', 'url'}]}] for the template"""
+    groups = []
+    for name, field, label in (('category', 'categories', 'Category'), ('city', 'cities', 'City')):
+        top = sorted(counts[name].items(), key=lambda item: (-item[1], item[0]))[:FACET_LIMIT]
+        shown = dict(top)
+        for value in filters[field]:
+            shown.setdefault(value, counts[name].get(value, 0))
+        groups.append({'name': name, 'label': label, 'values': [
+            {
+                'label': value,
+                'count': count,
+                'selected': value in filters[field],
+                'url': search_url(filters, **{field: _toggle(filters[field], value)}),
+            }
+            for value, count in sorted(shown.items(), key=lambda item: (-item[1], item[0]))
+        ]})
+
+    prices = []
+    for value, label, low, high in PRICE_BANDS:
+        if not counts['price'].get(value):
+            continue
+        selected = (filters['price_min'], filters['price_max']) == (low, high)
+        prices.append({
+            'label': label,
+            'count': counts['price'][value],
+            'selected': selected,
+            'url': search_url(filters, price_min=None if selected else low, price_max=None if selected else high),
+        })
+    groups.append({'name': 'price', 'label': 'Price', 'values': prices})
+
+    months = []
+    for month in sorted(counts['month']):
+        first, last = _month_bounds(month)
+        selected = (filters['date_from'], filters['date_to']) == (first, last)
+        months.append({
+            'label': first.strftime('%B %Y'),
+            'count': counts['month'][month],
+            'selected': selected,
+            'url': search_url(filters, date_from=None if selected else first, date_to=None if selected else last),
+        })
+    groups.append({'name': 'month', 'label': 'Month', 'values': months})
+    return groups
@@ -0,0 +1,57 @@
+"""
+Where uploaded event images end up.
+
+IMAGE_HOST_BACKEND names the class the upload_event_image job uses. ImgbbImageHost
+is the production host; LocalImageHost keeps images in MEDIA_ROOT and is what
+tests and local development use.
+"""
+import os
+import posixpath
+
+import requests
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.storage import default_storage
+from django.utils.module_loading import import_string
+
+
+class ImageHostError(Exception):
+    """The image host rejected or failed the upload; worth retrying"""
+
+
+class ImgbbImageHost:
+    upload_url = 'https://api.imgbb.com/1/upload'
+
+    def __init__(self):
+        self.key = os.environ.get('IMGBB_KEY')
+        if not self.key:
+            raise ImproperlyConfigured('IMGBB_KEY not found in environment variables')
+
+    def upload(self, name, file, content_type):
+        try:
+            response = requests.post(
+                self.upload_url,
+                params={'key': self.key},
+                files={'image': (name, file, content_type)},
+                timeout=settings.IMAGE_UPLOAD_TIMEOUT
+            )
+            response_data = response.json()
+        except (requests.RequestException, ValueError) as e:
+            raise ImageHostError(f'imgbb upload failed: {e}') from e
+
+        if response.status_code != 200 or 'data' not in response_data:
+            raise ImageHostError(f'imgbb returned {response.status_code}: {response_data}')
+        return response_data['data']['url']
+
+
+class LocalImageHost:
+    """Stand-in for imgbb that serves images from MEDIA_ROOT"""
+    directory = 'event_images'
+
+    def upload(self, name, file, content_type):
+        path = default_storage.save(posixpath.join(self.directory, name), file)
+        return default_storage.url(path)
+
+
+def get_image_host():
+    return import_string(settings.IMAGE_HOST_BACKEND)()
@@ -0,0 +1,55 @@
+"""
+Image resizing for event thumbnails, run in a process pool.
+
+Nothing here imports Django, so the pool's workers can be started with
+"spawn" and stay small. thumbnails.py does the fetching, storage and
+bookkeeping.
+"""
+import io
+
+from PIL import Image, ImageOps, features
+
+FORMATS = ('webp', 'jpeg') if features.check('webp') else ('jpeg',)
+
+
+def _encode(image, image_format, quality):
+    buffer = io.BytesIO()
+    if image_format == 'jpeg':
+        if image.mode != 'RGB':
+            # JPEG has no alpha; flatten transparent images onto white
+            background = Image.new('RGB', image.size, 'white')
+            background.paste(image, mask=image.getchannel('A') if 'A' in image.getbands() else None)
+            image = background
+        image.save(buffer, 'JPEG', quality=quality, optimize=True, progressive=True)
+    else:
+        image.save(buffer, 'WEBP', quality=quality, method=4)
+    return buffer.getvalue()
+
+
+def render_variants(data, widths, quality):
+    """
+    Resize the encoded image in data to each of widths, in every format.
+
+    Widths wider than the source are skipped rather than upscaled; a source
+    narrower than all of them is kept at its own width. Returns
+    {'width': w, 'height': h, 'variants': {width: {format: bytes}}}, where w
+    and h are the dimensions of the widest variant.
+    """
+    with Image.open(io.BytesIO(data)) as source:
+        # JPEGs decode at a reduced scale when the target is much smaller
+        source.draft('RGB', (max(widths), max(widths)))
+        image = ImageOps.exif_transpose(source)
+        image.load()
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'transparency' in image.info or 'A' in image.getbands() else 'RGB')
+
+    targets = sorted({width for width in widths if width < image.width}) or [image.width]
+    variants = {}
+    size = None
+    for width in reversed(targets):
+        # Each size is scaled from the next larger one, which is cheaper than from the original
+        height = max(round(image.height * width / image.width), 1)
+        image = image.resize((width, height), Image.LANCZOS, reducing_gap=3.0)
+        size = size or image.size
+        variants[width] = {image_format: _encode(image, image_format, quality) for image_format in FORMATS}
+    return {'width': size[0], 'height': size[1], 'variants': variants}
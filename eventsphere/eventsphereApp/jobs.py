@@ -0,0 +1,120 @@
+"""
+A small database-backed job queue.
+
+Views call enqueue(); the run_workers management command claims due jobs,
+runs the handler registered for each job's kind, and reschedules failures with
+exponential backoff until max_attempts is reached.
+"""
+import traceback
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Job
+
+JOB_HANDLERS = {}
+
+
+class PermanentJobError(Exception):
+    """Raised by a handler when retrying the job cannot help"""
+
+
+def job_handler(kind):
+    """Register the decorated function as the handler for jobs of this kind"""
+    def register(func):
+        JOB_HANDLERS[kind] = func
+        return func
+    return register
+
+
+def enqueue(kind, payload, delay=None, max_attempts=None):
+    run_after = timezone.now()
+    if delay:
+        run_after += timedelta(seconds=delay)
+    return Job.objects.create(
+        kind=kind,
+        payload=payload,
+        run_after=run_after,
+        max_attempts=max_attempts or settings.JOB_MAX_ATTEMPTS
+    )
+
+
+def retry_delay(attempts):
+    """Seconds to wait before the next attempt, doubling each time"""
+    delay = settings.JOB_RETRY_BASE_DELAY * (2 ** max(attempts - 1, 0))
+    return min(delay, settings.JOB_RETRY_MAX_DELAY)
+
+
+def claim_jobs(worker_id, limit=10):
+    """
+    Mark up to limit due jobs as running for this worker and return them.
+
+    On Postgres, SKIP LOCKED lets many workers poll the same table without
+    blocking each other. The claim UPDATE re-checks the status, so a job can
+    never be handed to two workers even where row locks are unavailable.
+    Jobs left running by a crashed worker are picked up again after
+    JOB_LOCK_TIMEOUT seconds.
+    """
+    now = timezone.now()
+    claim = f'{worker_id}:{uuid.uuid4().hex}'
+    claimable = (
+        Q(status=Job.PENDING, run_after__lte=now)
+        | Q(status=Job.RUNNING, locked_at__lt=now - timedelta(seconds=settings.JOB_LOCK_TIMEOUT))
+    )
+
+    with transaction.atomic():
+        job_ids = list(
+            Job.objects.select_for_update(skip_locked=True)
+            .filter(claimable)
+            .order_by('run_after', 'id')
+            .values_list('id', flat=True)[:limit]
+        )
+        Job.objects.filter(claimable, id__in=job_ids).update(
+            status=Job.RUNNING,
+            locked_by=claim,
+            locked_at=now,
+            attempts=F('attempts') + 1
+        )
+    return list(Job.objects.filter(locked_by=claim, status=Job.RUNNING).order_by('run_after', 'id'))
+
+
+def run_job(job):
+    """Run one claimed job and record the outcome; returns True on success"""
+    handler = JOB_HANDLERS.get(job.kind)
+    try:
+        if handler is None:
+            raise PermanentJobError(f'No handler registered for job kind {job.kind!r}')
+        handler(job.payload)
+    except Exception as e:
+        error = ''.join(traceback.format_exception_only(type(e), e)).strip()
+        if isinstance(e, PermanentJobError) or job.attempts >= job.max_attempts:
+            Job.objects.filter(pk=job.pk).update(
+                status=Job.FAILED, last_error=error, locked_by='', locked_at=None, updated_at=timezone.now()
+            )
+        else:
+            Job.objects.filter(pk=job.pk).update(
+                status=Job.PENDING,
+                last_error=error,
+                locked_by='',
+                locked_at=None,
+                run_after=timezone.now() + timedelta(seconds=retry_delay(job.attempts)),
+                updated_at=timezone.now()
+            )
+        return False
+
+    Job.objects.filter(pk=job.pk).update(
+        status=Job.DONE, last_error='', locked_by='', locked_at=None, updated_at=timezone.now()
+    )
+    return True
+
+
+def run_pending(worker_id, batch_size=10):
+    """Claim and run one batch of due jobs; returns the number of jobs run"""
+    jobs = claim_jobs(worker_id, limit=batch_size)
+    for job in jobs:
+        run_job(job)
+    return len(jobs)
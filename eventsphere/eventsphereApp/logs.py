@@ -0,0 +1,162 @@
+"""
+Structured logging that stays off the request thread.
+
+RequestIdMiddleware gives every request a correlation id: the incoming
+X-Request-ID header when it looks sane, otherwise a fresh one. The id is
+stamped on every log record and echoed back in the response. QueueHandler only
+puts records on an in-memory queue. A listener thread formats them as JSON
+and writes them out, and when the queue is full records are dropped rather
+than blocking the view. DEBUG and INFO records are sampled per request with
+LOG_SAMPLE_RATE, so every line of a sampled request is kept together.
+"""
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import re
+import sys
+import uuid
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+_request_id = ContextVar('request_id', default=None)
+_sampled = ContextVar('log_sampled', default=None)
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+VALID_REQUEST_ID = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
+# Attributes every LogRecord has; anything else came from extra={...}
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'request_id'}
+
+
+def get_request_id():
+    return _request_id.get()
+
+
+class RequestIdMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        request_id, tokens = self._start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            self._finish(tokens)
+        response[REQUEST_ID_HEADER] = request_id
+        return response
+
+    async def __acall__(self, request):
+        request_id, tokens = self._start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            self._finish(tokens)
+        response[REQUEST_ID_HEADER] = request_id
+        return response
+
+    def _start(self, request):
+        request_id = request.headers.get(REQUEST_ID_HEADER, '')
+        if not VALID_REQUEST_ID.match(request_id):
+            request_id = uuid.uuid4().hex
+        request.request_id = request_id
+        return request_id, (_request_id.set(request_id), _sampled.set(random.random() < settings.LOG_SAMPLE_RATE))
+
+    def _finish(self, tokens):
+        id_token, sampled_token = tokens
+        _request_id.reset(id_token)
+        _sampled.reset(sampled_token)
+
+
+class RequestIdFilter(logging.Filter):
+    """Stamp records with the current request's correlation id"""
+
+    def filter(self, record):
+        record.request_id = _request_id.get() or '-'
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keep LOG_SAMPLE_RATE of DEBUG/INFO records; warnings and errors always pass"""
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        sampled = _sampled.get()
+        if sampled is None:
+            # Outside a request (management commands, job workers) sample line by line
+            sampled = random.random() < settings.LOG_SAMPLE_RATE
+        return sampled
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, including any extra={...} fields"""
+
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'request_id': getattr(record, 'request_id', '-'),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        if record.stack_info:
+            entry['stack'] = self.formatStack(record.stack_info)
+        return json.dumps(entry, default=str)
+
+
+class QueueHandler(logging.handlers.QueueHandler):
+    """
+    Hand records to a background thread that formats and writes them.
+
+    The formatter configured on this handler is applied by the listener, so
+    JSON encoding also happens off the request thread.
+    """
+
+    def __init__(self, stream=None, queue_size=10000):
+        super().__init__(queue.Queue(queue_size))
+        self.target = logging.StreamHandler(stream or sys.stdout)
+        self.dropped = 0
+        self.listener = logging.handlers.QueueListener(self.queue, self.target)
+        self.listener.start()
+        atexit.register(self.close)
+
+    def setFormatter(self, fmt):
+        self.target.setFormatter(fmt)
+
+    def prepare(self, record):
+        # Only freeze the message; the args may be mutated after the view moves on
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        if self.listener is not None:
+            # Writes out whatever is still queued
+            self.listener.stop()
+            self.listener = None
+        super().close()
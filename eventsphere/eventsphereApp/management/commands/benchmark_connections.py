@@ -0,0 +1,113 @@
+import json
+import platform
+import time
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils import timezone
+
+from eventsphereApp.db_pool import ConnectionPool
+from eventsphereApp.profiling import percentile
+
+
+def run_query(conn):
+    cursor = conn.cursor()
+    try:
+        cursor.execute('SELECT 1')
+        cursor.fetchall()
+    finally:
+        cursor.close()
+
+
+class Command(BaseCommand):
+    help = 'Measure the per-request cost of opening a database connection versus reusing one, as JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=200, help='Simulated requests per strategy')
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS, help='Database alias to connect to')
+        parser.add_argument(
+            '--no-health-checks',
+            action='store_true',
+            help='Skip the ping a pooled or persistent connection gets before reuse',
+        )
+        parser.add_argument('--output', help='Write the JSON report to this file instead of stdout')
+
+    def handle(self, *args, **options):
+        wrapper = connections[options['database']]
+        params = wrapper.get_connection_params()
+        health_checks = not options['no_health_checks']
+
+        def connect():
+            return wrapper.Database.connect(**params)
+
+        def fresh():
+            conn = connect()
+            try:
+                run_query(conn)
+            finally:
+                conn.close()
+
+        persistent_conn = connect()
+
+        def persistent():
+            # CONN_MAX_AGE: the thread keeps its connection between requests
+            if health_checks:
+                run_query(persistent_conn)
+            run_query(persistent_conn)
+
+        pool = ConnectionPool(
+            connect=connect, max_size=1, timeout=1, max_idle=3600, check=run_query if health_checks else None
+        )
+
+        def pooled():
+            conn = pool.getconn()
+            try:
+                run_query(conn)
+            finally:
+                pool.putconn(conn)
+
+        strategies = {'fresh': fresh, 'persistent': persistent, 'pooled': pooled}
+        try:
+            results = {name: self.measure(request, options['iterations']) for name, request in strategies.items()}
+        finally:
+            persistent_conn.close()
+            pool.closeall()
+
+        report = {
+            'meta': {
+                'created_at': timezone.now().isoformat(),
+                'database': wrapper.vendor,
+                'host': wrapper.settings_dict['HOST'] or 'local',
+                'django': django.get_version(),
+                'python': platform.python_version(),
+                'iterations': options['iterations'],
+                'health_checks': health_checks,
+            },
+            'results': results,
+            'saved_per_request_ms': {
+                name: round(results['fresh']['p50_ms'] - results[name]['p50_ms'], 3)
+                for name in ('persistent', 'pooled')
+            },
+        }
+        output = json.dumps(report, indent=2, sort_keys=True)
+        if options['output']:
+            with open(options['output'], 'w') as report_file:
+                report_file.write(output + '\n')
+            self.stderr.write(self.style.SUCCESS(f"Wrote results to {options['output']}"))
+        else:
+            self.stdout.write(output)
+
+    def measure(self, request, iterations):
+        # Warm up imports and the server's caches before timing
+        request()
+        timings = []
+        for _ in range(iterations):
+            started = time.perf_counter()
+            request()
+            timings.append((time.perf_counter() - started) * 1000)
+        return {
+            'p50_ms': round(percentile(timings, 50), 3),
+            'p95_ms': round(percentile(timings, 95), 3),
+            'p99_ms': round(percentile(timings, 99), 3),
+        }
@@ -0,0 +1,164 @@
+import json
+import platform
+import time
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+from django.utils import timezone
+
+from eventsphereApp.models import Booking, Event
+from eventsphereApp.profiling import (
+    ROLES, SKIPPED_ROUTES, MissingData, client_for, iter_routes, percentile, pick_fixtures, route_requests
+)
+
+
+class Command(BaseCommand):
+    help = 'Measure latency, SQL queries and response size of every route, as JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20, help='Timed requests per route and role')
+        parser.add_argument('--warmup', type=int, default=2, help='Untimed requests before timing starts')
+        parser.add_argument('--output', help='Write the JSON report to this file instead of stdout')
+        parser.add_argument(
+            '--use-existing',
+            action='store_true',
+            help='Measure against the configured database as it is, instead of a seeded scratch database. '
+                 'Routes that write rows are skipped.',
+        )
+        parser.add_argument(
+            '--no-page-cache',
+            action='store_true',
+            help='Disable the full-page cache so every request reaches the view',
+        )
+        parser.add_argument('--route', action='append', help='Only measure this url name (can be repeated)')
+        # Passed through to load_test_data when seeding the scratch database
+        parser.add_argument('--users', type=int, default=500)
+        parser.add_argument('--events', type=int, default=200)
+        parser.add_argument('--bookings-per-event', type=float, default=50)
+        parser.add_argument('--bookmarks-per-user', type=float, default=5)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        scratch_db_name = None
+        try:
+            # Lets the test client through ALLOWED_HOSTS and keeps mail in memory
+            setup_test_environment()
+            own_test_environment = True
+        except RuntimeError:
+            # Already set up, e.g. when called from the test suite
+            own_test_environment = False
+        try:
+            if not options['use_existing']:
+                self.stderr.write('Creating scratch database...')
+                scratch_db_name = connection.settings_dict['NAME']
+                connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+                self.stderr.write('Seeding synthetic data...')
+                call_command(
+                    'load_test_data',
+                    users=options['users'],
+                    events=options['events'],
+                    bookings_per_event=options['bookings_per_event'],
+                    bookmarks_per_user=options['bookmarks_per_user'],
+                    seed=options['seed'],
+                    stdout=self.stderr,
+                )
+
+            with override_settings(PAGE_CACHE_ENABLED=not options['no_page_cache']):
+                report = self.run_benchmarks(options)
+        finally:
+            if scratch_db_name is not None:
+                connection.creation.destroy_test_db(scratch_db_name, verbosity=0)
+            if own_test_environment:
+                teardown_test_environment()
+
+        output = json.dumps(report, indent=2, sort_keys=True)
+        if options['output']:
+            with open(options['output'], 'w') as report_file:
+                report_file.write(output + '\n')
+            self.stderr.write(self.style.SUCCESS(f"Wrote {len(report['results'])} results to {options['output']}"))
+        else:
+            self.stdout.write(output)
+
+    def run_benchmarks(self, options):
+        try:
+            fixtures = pick_fixtures()
+        except MissingData as e:
+            raise CommandError(str(e))
+        requests = route_requests(fixtures)
+        caches[settings.PAGE_CACHE_ALIAS].clear()
+
+        results = []
+        skipped = {}
+        routes = iter_routes(requests, only=options['route'], include_writes=not options['use_existing'])
+        for name, spec, skip_reason in routes:
+            if skip_reason:
+                skipped[name] = skip_reason
+                if name not in requests and name not in SKIPPED_ROUTES:
+                    self.stderr.write(self.style.WARNING(f'No benchmark request defined for route {name!r}'))
+                continue
+
+            for role in ROLES:
+                self.stderr.write(f'{name} as {role}...')
+                results.append(self.measure(name, role, spec, fixtures, options))
+
+        return {
+            'meta': {
+                'created_at': timezone.now().isoformat(),
+                'database': connection.vendor,
+                'django': django.get_version(),
+                'python': platform.python_version(),
+                'iterations': options['iterations'],
+                'page_cache': not options['no_page_cache'],
+                'scratch_database': not options['use_existing'],
+                'dataset': {
+                    'users': User.objects.count(),
+                    'events': Event.objects.count(),
+                    'bookings': Booking.objects.count(),
+                },
+            },
+            'results': results,
+            'skipped': skipped,
+        }
+
+    def measure(self, name, role, spec, fixtures, options):
+        method, path, data, *extra = spec
+        kwargs = extra[0] if extra else {}
+        send = getattr(client_for(role, fixtures), method)
+
+        for _ in range(options['warmup']):
+            send(path, data, **kwargs)
+
+        timings, query_counts, sizes = [], [], []
+        status = None
+        for _ in range(options['iterations']):
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                response = send(path, data, **kwargs)
+                if response.streaming:
+                    size = sum(len(chunk) for chunk in response.streaming_content)
+                else:
+                    size = len(response.content)
+                timings.append((time.perf_counter() - started) * 1000)
+            query_counts.append(len(queries.captured_queries))
+            sizes.append(size)
+            status = response.status_code
+
+        return {
+            'route': name,
+            'path': path,
+            'role': role,
+            'status': status,
+            'p50_ms': round(percentile(timings, 50), 3),
+            'p95_ms': round(percentile(timings, 95), 3),
+            'p99_ms': round(percentile(timings, 99), 3),
+            'queries_p50': percentile(query_counts, 50),
+            'queries_max': max(query_counts),
+            'bytes_p50': percentile(sizes, 50),
+        }
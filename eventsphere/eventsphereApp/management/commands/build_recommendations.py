@@ -0,0 +1,16 @@
+import time
+
+from django.core.management.base import BaseCommand
+from eventsphereApp.recommendations import rebuild_recommendations
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the "you may also like" table from bookings and bookmarks'
+
+    def handle(self, *args, **options):
+        self.stdout.write('Rebuilding recommendations...')
+        started = time.monotonic()
+        rows = rebuild_recommendations()
+        self.stdout.write(self.style.SUCCESS(
+            f'Wrote {rows} recommendations in {time.monotonic() - started:.1f}s'
+        ))
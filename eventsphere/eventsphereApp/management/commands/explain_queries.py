@@ -0,0 +1,164 @@
+import json
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+
+from eventsphereApp.profiling import ROLES, MissingData, client_for, iter_routes, pick_fixtures, route_requests
+
+SEQ_SCAN = 'seq_scan'
+SORT = 'sort'
+
+
+def _walk_postgres_plan(node, issues, min_rows):
+    node_type = node.get('Node Type')
+    rows = node.get('Plan Rows', 0)
+    if node_type == 'Seq Scan' and rows >= min_rows:
+        issues.append({
+            'kind': SEQ_SCAN, 'table': node.get('Relation Name'), 'rows': rows,
+            'detail': node.get('Filter', ''),
+        })
+    elif node_type in ('Sort', 'Incremental Sort') and rows >= min_rows:
+        issues.append({
+            'kind': SORT, 'table': None, 'rows': rows, 'detail': ', '.join(node.get('Sort Key', [])),
+        })
+    for child in node.get('Plans', []):
+        _walk_postgres_plan(child, issues, min_rows)
+
+
+def explain_postgres(cursor, sql, min_rows):
+    cursor.execute('EXPLAIN (FORMAT JSON) ' + sql)
+    plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    root = plan[0]['Plan']
+    issues = []
+    _walk_postgres_plan(root, issues, min_rows)
+    return {'cost': root.get('Total Cost'), 'issues': issues}
+
+
+def explain_sqlite(cursor, sql, min_rows, table_sizes):
+    cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+    details = [row[-1] for row in cursor.fetchall()]
+    sorts_in_plan = any(detail.startswith('USE TEMP B-TREE') for detail in details)
+    issues = []
+    for detail in details:
+        if detail.startswith('SCAN ') and ' USING ' not in detail and 'VIRTUAL TABLE' not in detail:
+            # With no sort step, a LIMIT query walks the table in rowid order and stops early
+            if ' LIMIT ' in sql and not sorts_in_plan:
+                continue
+            table = detail.split()[1]
+            if table not in table_sizes:
+                if table not in connection.introspection.table_names(cursor):
+                    # A subquery, CTE or constant row rather than a real table
+                    table_sizes[table] = 0
+                    continue
+                cursor.execute(f'SELECT COUNT(*) FROM {connection.ops.quote_name(table)}')
+                table_sizes[table] = cursor.fetchone()[0]
+            if table_sizes[table] >= min_rows:
+                issues.append({'kind': SEQ_SCAN, 'table': table, 'rows': table_sizes[table], 'detail': detail})
+        elif detail.startswith('USE TEMP B-TREE') and ' GROUP BY ' not in sql:
+            # SQLite gives no row estimates; sorting aggregated rows is expected, other sorts are not
+            issues.append({'kind': SORT, 'table': None, 'rows': None, 'detail': detail})
+    return {'cost': None, 'issues': issues}
+
+
+class Command(BaseCommand):
+    help = 'Run the SQL behind every route through EXPLAIN and flag sequential scans and sorts'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-rows',
+            type=int,
+            default=1000,
+            help='Ignore scans and sorts over fewer rows than this (table size on SQLite)',
+        )
+        parser.add_argument('--route', action='append', help='Only explain this url name (can be repeated)')
+        parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+        parser.add_argument(
+            '--fail-on-issues',
+            action='store_true',
+            help='Exit with an error if any query is flagged, for use in CI',
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor not in ('postgresql', 'sqlite'):
+            raise CommandError(f'EXPLAIN parsing is not implemented for {connection.vendor}')
+
+        try:
+            # Lets the test client through ALLOWED_HOSTS
+            setup_test_environment()
+            own_test_environment = True
+        except RuntimeError:
+            own_test_environment = False
+        try:
+            # Pages must render to run their queries, so the page cache is bypassed
+            with override_settings(PAGE_CACHE_ENABLED=False):
+                report = self.explain_routes(options)
+        finally:
+            if own_test_environment:
+                teardown_test_environment()
+
+        flagged = [entry for entry in report if entry['issues']]
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2, sort_keys=True))
+        else:
+            for entry in flagged:
+                self.stdout.write(self.style.WARNING(f"{entry['route']} ({', '.join(entry['roles'])})"))
+                for issue in entry['issues']:
+                    where = f" on {issue['table']}" if issue['table'] else ''
+                    rows = f", ~{issue['rows']} rows" if issue['rows'] is not None else ''
+                    self.stdout.write(f"  {issue['kind']}{where}{rows}: {issue['detail']}")
+                self.stdout.write(f"  {entry['sql'][:300]}")
+            summary = f'{len(report)} distinct queries explained, {len(flagged)} flagged'
+            self.stdout.write(self.style.SUCCESS(summary) if not flagged else self.style.WARNING(summary))
+
+        if flagged and options['fail_on_issues']:
+            raise CommandError(f'{len(flagged)} queries have sequential scans or sorts')
+
+    def explain_routes(self, options):
+        try:
+            fixtures = pick_fixtures()
+        except MissingData as e:
+            raise CommandError(str(e))
+        requests = route_requests(fixtures)
+        caches[settings.PAGE_CACHE_ALIAS].clear()
+
+        # Same SQL from several routes/roles is explained once
+        queries = {}
+        for name, spec, skip_reason in iter_routes(requests, only=options['route'], include_writes=False):
+            if skip_reason:
+                continue
+            method, path, data, *extra = spec
+            for role in ROLES:
+                with transaction.atomic():
+                    client = client_for(role, fixtures)
+                    with CaptureQueriesContext(connection) as captured:
+                        response = getattr(client, method)(path, data, **(extra[0] if extra else {}))
+                        # Streamed responses run their queries as the body is read
+                        if response.streaming:
+                            for _ in response.streaming_content:
+                                pass
+                    # Logging in and session saves write rows; leave the database as it was
+                    transaction.set_rollback(True)
+                for query in captured.captured_queries:
+                    sql = query['sql']
+                    if not sql.lstrip().upper().startswith('SELECT'):
+                        continue
+                    entry = queries.setdefault(sql, {'sql': sql, 'route': name, 'roles': []})
+                    if role not in entry['roles']:
+                        entry['roles'].append(role)
+
+        table_sizes = {}
+        report = []
+        with connection.cursor() as cursor:
+            for entry in queries.values():
+                if connection.vendor == 'postgresql':
+                    entry.update(explain_postgres(cursor, entry['sql'], options['min_rows']))
+                else:
+                    entry.update(explain_sqlite(cursor, entry['sql'], options['min_rows'], table_sizes))
+                report.append(entry)
+        return report
@@ -0,0 +1,47 @@
+import os
+
+from django.core.management.base import BaseCommand
+from eventsphereApp import thumbnails
+from eventsphereApp.models import Event
+
+
+class Command(BaseCommand):
+    help = 'Create thumbnails for events that have none for their current image, or whose files are gone'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Regenerate every event, not just those missing thumbnails',
+        )
+        parser.add_argument(
+            '--event',
+            type=int,
+            action='append',
+            help='Only the given event id (can be repeated)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=20,
+            help='Images fetched before their resizing is handed to the process pool',
+        )
+
+    def handle(self, *args, **options):
+        events = Event.objects.only('id', 'image', 'thumbnails').order_by('id')
+        if options['event']:
+            events = events.filter(id__in=options['event'])
+
+        todo = [
+            event for event in events.iterator(chunk_size=500)
+            if options['all']
+            or not thumbnails.srcset(event, 'jpeg')
+            or not os.path.isdir(thumbnails.set_path(event.thumbnails['key']))
+        ]
+        done = 0
+        for start in range(0, len(todo), options['batch_size']):
+            done += len(thumbnails.generate(todo[start:start + options['batch_size']]))
+
+        self.stdout.write(self.style.SUCCESS(f'Created thumbnails for {done} events'))
+        if len(todo) > done:
+            self.stdout.write(self.style.WARNING(f'{len(todo) - done} events were skipped; see the log for why'))
@@ -1,11 +1,65 @@
-from django.core.management.base import BaseCommand
-from django.contrib.auth.models import User
-from eventsphereApp.models import Event, Booking, Bookmark
-from datetime import datetime, timedelta
+import io
 import random
+from contextlib import contextmanager
+from datetime import timedelta
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.utils import timezone
+
+from eventsphereApp import conditional, page_cache
+from eventsphereApp.analytics import rebuild_daily_stats
+from eventsphereApp.counters import RECONCILE_CHUNK_SIZE, repair_counters
+from eventsphereApp.models import Booking, Bookmark, Event, EventDailyStats, Ticket
+
+FIRST_NAMES = ['Alice', 'Bob', 'Charlie', 'Diana', 'Eve', 'Frank', 'Grace', 'Hugo', 'Iris', 'Jules']
+LAST_NAMES = ['Johnson', 'Smith', 'Brown', 'Davis', 'Wilson', 'Martin', 'Bernard', 'Petit', 'Moreau', 'Laurent']
+CITIES = ['Paris', 'Lyon', 'Marseille', 'Bordeaux', 'Nantes', 'Toulouse', 'Lille', 'Nice', 'Strasbourg', 'Rennes']
+EVENT_TEMPLATES = [
+    {'title': 'Summer Music Festival', 'category': 'Music', 'price': 50},
+    {'title': 'Tech Conference', 'category': 'Conference', 'price': 100},
+    {'title': 'Football Championship', 'category': 'Sport', 'price': 30},
+    {'title': 'Shakespeare Night', 'category': 'Theatre', 'price': 40},
+    {'title': 'Photography Workshop', 'category': 'Workshop', 'price': 75},
+    {'title': 'Wine Tasting Festival', 'category': 'Festival', 'price': 60},
+    {'title': 'Jazz Evening', 'category': 'Music', 'price': 45},
+    {'title': 'Startup Pitch Day', 'category': 'Conference', 'price': 25},
+    {'title': 'City Marathon', 'category': 'Sport', 'price': 20},
+    {'title': 'Comedy Show', 'category': 'Theatre', 'price': 35},
+    {'title': 'Cooking Masterclass', 'category': 'Workshop', 'price': 80},
+    {'title': 'Street Food Festival', 'category': 'Festival', 'price': 15},
+]
+
+# Generated users share this domain so a re-run reuses them instead of failing
+USER_DOMAIN = 'loadtest.example.com'
+
+
+@contextmanager
+def keep_explicit_timestamps(*fields):
+    """Stop auto_now_add from overwriting the spread-out timestamps we generate"""
+    saved = [(field, field.auto_now_add) for field in fields]
+    for field, _ in saved:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now_add in saved:
+            field.auto_now_add = auto_now_add
+
+
+def zipf_cum_weights(count, skew, rng):
+    """Cumulative weights where the k-th most popular item gets 1 / k**skew, in random order"""
+    weights = [1 / (rank ** skew) for rank in range(1, count + 1)]
+    rng.shuffle(weights)
+    return list(accumulate(weights))
+
 
 class Command(BaseCommand):
-    help = 'Load test data for EventSphere application'
+    help = 'Load synthetic test data for EventSphere, from a handful of rows up to production scale'
 
     def add_arguments(self, parser):
         parser.add_argument(
@@ -13,121 +67,241 @@ class Command(BaseCommand):
             action='store_true',
             help='Clear existing test data before loading new data',
         )
+        parser.add_argument('--users', type=int, default=5, help='Number of users to create')
+        parser.add_argument('--events', type=int, default=12, help='Number of events to create')
+        parser.add_argument(
+            '--bookings-per-event',
+            type=float,
+            default=5,
+            help='Average number of bookings per event; popular events get far more',
+        )
+        parser.add_argument(
+            '--bookmarks-per-user',
+            type=float,
+            default=3,
+            help='Average number of bookmarks per user',
+        )
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=90,
+            help='Events start up to this many days either side of today, bookings trail them by as much',
+        )
+        parser.add_argument(
+            '--cancel-rate',
+            type=float,
+            default=0.05,
+            help='Fraction of bookings that are cancelled',
+        )
+        parser.add_argument(
+            '--skew',
+            type=float,
+            default=1.0,
+            help='Zipf exponent for event popularity and user activity; 0 spreads rows evenly',
+        )
+        parser.add_argument('--seed', type=int, default=None, help='Random seed, for reproducible data sets')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows written per INSERT or COPY')
 
     def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.now = timezone.now()
+
         if options['clear']:
             self.stdout.write('Clearing existing test data...')
-            # Don't delete superuser
-            User.objects.filter(is_superuser=False).delete()
-            Event.objects.all().delete()
-            Booking.objects.all().delete()
-            Bookmark.objects.all().delete()
+            self.clear()
             self.stdout.write(self.style.SUCCESS('Cleared existing data'))
 
         self.stdout.write('Creating test users...')
-        users = self.create_users()
-        
+        user_ids = self.create_users(options['users'])
+
         self.stdout.write('Creating test events...')
-        events = self.create_events(users)
-        
+        events = self.create_events(user_ids, options['events'], options['days'])
+        if not events:
+            self.stdout.write(self.style.SUCCESS('Successfully loaded test data!'))
+            self.stdout.write(f'Created {len(user_ids)} users, 0 events')
+            return
+
+        event_cum_weights = zipf_cum_weights(len(events), options['skew'], self.rng)
+        user_cum_weights = zipf_cum_weights(len(user_ids), options['skew'], self.rng)
+
         self.stdout.write('Creating test bookings...')
-        self.create_bookings(users, events)
-        
+        bookings = self.create_bookings(
+            user_ids, user_cum_weights, events, event_cum_weights,
+            round(len(events) * options['bookings_per_event']), options['days'], options['cancel_rate']
+        )
+
         self.stdout.write('Creating test bookmarks...')
-        self.create_bookmarks(users, events)
-        
+        bookmarks = self.create_bookmarks(
+            user_ids, user_cum_weights, events, event_cum_weights,
+            round(len(user_ids) * options['bookmarks_per_user']), options['days']
+        )
+
+        # Rows were bulk-inserted past the signal handlers, so derive the counters and rollup in one pass
+        self.stdout.write('Updating counters and analytics...')
+        event_ids = sorted(events)
+        for start in range(0, len(event_ids), RECONCILE_CHUNK_SIZE):
+            repair_counters(event_ids[start:start + RECONCILE_CHUNK_SIZE])
+        rebuild_daily_stats(Event.objects.filter(id__gte=event_ids[0], id__lte=event_ids[-1]))
+        conditional.bump_catalogue()
+        page_cache.purge(page_cache.CATALOGUE_TAG)
+
         self.stdout.write(self.style.SUCCESS('Successfully loaded test data!'))
-        self.stdout.write(f'Created {len(users)} users, {len(events)} events')
-
-    def create_users(self):
-        users = []
-        user_data = [
-            {'username': 'alice@example.com', 'email': 'alice@example.com', 'first_name': 'Alice', 'last_name': 'Johnson'},
-            {'username': 'bob@example.com', 'email': 'bob@example.com', 'first_name': 'Bob', 'last_name': 'Smith'},
-            {'username': 'charlie@example.com', 'email': 'charlie@example.com', 'first_name': 'Charlie', 'last_name': 'Brown'},
-            {'username': 'diana@example.com', 'email': 'diana@example.com', 'first_name': 'Diana', 'last_name': 'Davis'},
-            {'username': 'eve@example.com', 'email': 'eve@example.com', 'first_name': 'Eve', 'last_name': 'Wilson'},
-        ]
-        
-        for data in user_data:
-            user, created = User.objects.get_or_create(
-                username=data['username'],
-                defaults={
-                    'email': data['email'],
-                    'first_name': data['first_name'],
-                    'last_name': data['last_name']
-                }
+        self.stdout.write(
+            f'Created {len(user_ids)} users, {len(events)} events, {bookings} bookings, {bookmarks} bookmarks'
+        )
+
+    def clear(self):
+        # Deleting row by row runs every signal handler, which takes hours at scale
+        tables = [model._meta.db_table for model in (Booking, Bookmark, Ticket, EventDailyStats, Event)]
+        statements = connection.ops.sql_flush(no_style(), tables, allow_cascade=True)
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                for sql in statements:
+                    cursor.execute(sql)
+            # Don't delete superuser
+            User.objects.filter(is_superuser=False).delete()
+            conditional.bump_catalogue()
+        page_cache.purge(page_cache.CATALOGUE_TAG)
+
+    def create_users(self, count):
+        # Hashing is deliberately slow, so every generated user shares one hash
+        password = make_password('testpass123')
+        users = (
+            User(
+                username=f'user{i}@{USER_DOMAIN}',
+                email=f'user{i}@{USER_DOMAIN}',
+                first_name=self.rng.choice(FIRST_NAMES),
+                last_name=self.rng.choice(LAST_NAMES),
+                password=password,
             )
-            if created:
-                user.set_password('testpass123')
-                user.save()
-            users.append(user)
-        
-        return users
-
-    def create_events(self, users):
-        events = []
-        categories = ['Music', 'Conference', 'Sport', 'Theatre', 'Workshop', 'Festival']
-        cities = ['Paris', 'Lyon', 'Marseille', 'Bordeaux', 'Nantes', 'Toulouse']
-        
-        event_templates = [
-            {'title': 'Summer Music Festival', 'category': 'Music', 'price': 50},
-            {'title': 'Tech Conference 2025', 'category': 'Conference', 'price': 100},
-            {'title': 'Football Championship', 'category': 'Sport', 'price': 30},
-            {'title': 'Shakespeare Night', 'category': 'Theatre', 'price': 40},
-            {'title': 'Photography Workshop', 'category': 'Workshop', 'price': 75},
-            {'title': 'Wine Tasting Festival', 'category': 'Festival', 'price': 60},
-            {'title': 'Jazz Evening', 'category': 'Music', 'price': 45},
-            {'title': 'Startup Pitch Day', 'category': 'Conference', 'price': 25},
-            {'title': 'Marathon 2025', 'category': 'Sport', 'price': 20},
-            {'title': 'Comedy Show', 'category': 'Theatre', 'price': 35},
-            {'title': 'Cooking Masterclass', 'category': 'Workshop', 'price': 80},
-            {'title': 'Street Food Festival', 'category': 'Festival', 'price': 15},
-        ]
-        
-        for i, template in enumerate(event_templates):
-            starts_at = datetime.now() + timedelta(days=random.randint(10, 90))
-            ends_at = starts_at + timedelta(hours=random.randint(2, 8))
-            
-            event = Event.objects.create(
-                title=template['title'],
-                city=random.choice(cities),
-                user_id=users[i % len(users)],  # Distribute events among users
-                starts_at=starts_at,
-                ends_at=ends_at,
-                address=f"{random.randint(1, 100)} Main Street",
-                pincode=random.randint(10000, 99999),
-                category=template['category'],
-                description=f"An amazing {template['category'].lower()} event that you won't want to miss! Join us for an unforgettable experience.",
-                image=f"https://picsum.photos/400/300?random={i}",
-                ticket_price=template['price']
+            for i in range(count)
+        )
+        self.write_batches(users, lambda batch: User.objects.bulk_create(batch, ignore_conflicts=True))
+
+        usernames = [f'user{i}@{USER_DOMAIN}' for i in range(count)]
+        user_ids = []
+        for start in range(0, count, self.batch_size):
+            user_ids.extend(
+                User.objects.filter(username__in=usernames[start:start + self.batch_size])
+                .order_by('id').values_list('id', flat=True)
             )
-            events.append(event)
-        
-        return events
-
-    def create_bookings(self, users, events):
-        # Create random bookings
-        for event in events:
-            # Each event gets 0-10 random bookings
-            num_bookings = random.randint(0, 10)
-            random_users = random.sample(users, min(num_bookings, len(users)))
-            
-            for user in random_users:
-                Booking.objects.create(
-                    event_id=event,
-                    user_id=user
+        return user_ids
+
+    def create_events(self, user_ids, count, days):
+        if not user_ids or not count:
+            return {}
+
+        # Organizers are skewed too: a few users list most of the events
+        organizer_weights = zipf_cum_weights(len(user_ids), 1.0, self.rng)
+        last_id = Event.objects.order_by('-id').values_list('id', flat=True).first() or 0
+
+        def generate():
+            for i in range(count):
+                template = EVENT_TEMPLATES[i % len(EVENT_TEMPLATES)]
+                starts_at = self.now + timedelta(days=self.rng.uniform(-days, days))
+                yield Event(
+                    title=f"{template['title']} #{i + 1}",
+                    city=self.rng.choice(CITIES),
+                    user_id_id=self.rng.choices(user_ids, cum_weights=organizer_weights)[0],
+                    starts_at=starts_at,
+                    ends_at=starts_at + timedelta(hours=self.rng.randint(2, 8)),
+                    address=f"{self.rng.randint(1, 100)} Main Street",
+                    pincode=self.rng.randint(10000, 99999),
+                    category=template['category'],
+                    description=f"An amazing {template['category'].lower()} event that you won't want to miss! Join us for an unforgettable experience.",
+                    image=f"https://picsum.photos/400/300?random={i}",
+                    ticket_price=template['price'],
                 )
 
-    def create_bookmarks(self, users, events):
-        # Create random bookmarks
-        for user in users:
-            # Each user bookmarks 0-5 random events
-            num_bookmarks = random.randint(0, 5)
-            random_events = random.sample(events, min(num_bookmarks, len(events)))
-            
-            for event in random_events:
-                Bookmark.objects.get_or_create(
-                    user=user,
-                    event=event
-                )
\ No newline at end of file
+        self.write_batches(generate(), Event.objects.bulk_create)
+        return dict(Event.objects.filter(id__gt=last_id).values_list('id', 'starts_at'))
+
+    def booked_at(self, starts_at, days):
+        latest = min(starts_at, self.now)
+        return latest - timedelta(days=self.rng.uniform(0, days))
+
+    def create_bookings(self, user_ids, user_cum_weights, events, event_cum_weights, count, days, cancel_rate):
+        event_ids = list(events)
+
+        def generate():
+            remaining = count
+            while remaining > 0:
+                size = min(remaining, self.batch_size)
+                remaining -= size
+                chosen_events = self.rng.choices(event_ids, cum_weights=event_cum_weights, k=size)
+                chosen_users = self.rng.choices(user_ids, cum_weights=user_cum_weights, k=size)
+                for event_id, user_id in zip(chosen_events, chosen_users):
+                    booked_at = self.booked_at(events[event_id], days)
+                    cancelled_at = None
+                    if self.rng.random() < cancel_rate:
+                        cancelled_at = booked_at + (min(events[event_id], self.now) - booked_at) * self.rng.random()
+                    yield (event_id, user_id, booked_at, cancelled_at is not None, cancelled_at)
+
+        fields = [Booking._meta.get_field(name) for name in ('event_id', 'user_id', 'booked_at', 'is_cancelled', 'cancelled_at')]
+        return self.insert_rows(Booking, fields, generate())
+
+    def create_bookmarks(self, user_ids, user_cum_weights, events, event_cum_weights, count, days):
+        event_ids = list(events)
+        # A user can only bookmark an event once, so never ask for more pairs than exist
+        count = min(count, len(user_ids) * len(event_ids))
+
+        def generate():
+            seen = set()
+            attempts = 0
+            while len(seen) < count and attempts < count * 20:
+                size = min(count - len(seen), self.batch_size)
+                attempts += size
+                chosen_events = self.rng.choices(event_ids, cum_weights=event_cum_weights, k=size)
+                chosen_users = self.rng.choices(user_ids, cum_weights=user_cum_weights, k=size)
+                for event_id, user_id in zip(chosen_events, chosen_users):
+                    if (user_id, event_id) in seen:
+                        continue
+                    seen.add((user_id, event_id))
+                    yield (user_id, event_id, self.booked_at(events[event_id], days))
+
+        fields = [Bookmark._meta.get_field(name) for name in ('user', 'event', 'created_at')]
+        return self.insert_rows(Bookmark, fields, generate())
+
+    def insert_rows(self, model, fields, rows):
+        """Write row tuples with COPY on Postgres, or batched bulk_create elsewhere"""
+        if connection.vendor == 'postgresql':
+            return self.write_batches(rows, lambda batch: self.copy_rows(model, fields, batch))
+
+        names = [field.attname for field in fields]
+        instances = (model(**dict(zip(names, row))) for row in rows)
+        with keep_explicit_timestamps(*(field for field in fields if getattr(field, 'auto_now_add', False))):
+            return self.write_batches(instances, model.objects.bulk_create)
+
+    def copy_rows(self, model, fields, batch):
+        buffer = io.StringIO()
+        for row in batch:
+            buffer.write('\t'.join(
+                r'\N' if value is None else value.isoformat() if hasattr(value, 'isoformat') else str(value)
+                for value in row
+            ))
+            buffer.write('\n')
+        buffer.seek(0)
+
+        columns = ', '.join(connection.ops.quote_name(field.column) for field in fields)
+        with connection.cursor() as cursor:
+            cursor.copy_expert(
+                f'COPY {connection.ops.quote_name(model._meta.db_table)} ({columns}) FROM STDIN', buffer
+            )
+
+    def write_batches(self, items, write):
+        """Hand items to write() batch_size at a time, each batch in its own transaction"""
+        written = 0
+        batch = []
+        for item in items:
+            batch.append(item)
+            if len(batch) >= self.batch_size:
+                with transaction.atomic():
+                    write(batch)
+                written += len(batch)
+                batch = []
+        if batch:
+            with transaction.atomic():
+                write(batch)
+            written += len(batch)
+        return written
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from eventsphereApp.analytics import rebuild_daily_stats
+from eventsphereApp.models import Event
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the daily analytics rollup table from bookings and bookmarks'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--event',
+            type=int,
+            action='append',
+            help='Only rebuild the given event id (can be repeated)',
+        )
+
+    def handle(self, *args, **options):
+        events = Event.objects.all()
+        if options['event']:
+            events = events.filter(id__in=options['event'])
+
+        self.stdout.write('Rebuilding daily analytics...')
+        rows = rebuild_daily_stats(events)
+        self.stdout.write(self.style.SUCCESS(f'Wrote {rows} daily stats rows'))
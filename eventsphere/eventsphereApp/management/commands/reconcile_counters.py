@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+from eventsphereApp.counters import find_counter_drift, repair_counters
+from eventsphereApp.models import Event
+
+
+class Command(BaseCommand):
+    help = 'Detect and repair drift in the denormalized booking/bookmark counters on Event'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report drifted counters, do not fix them',
+        )
+        parser.add_argument(
+            '--event',
+            type=int,
+            action='append',
+            help='Only check the given event id (can be repeated)',
+        )
+
+    def handle(self, *args, **options):
+        events = Event.objects.all()
+        if options['event']:
+            events = events.filter(id__in=options['event'])
+
+        drifted_ids = []
+        for event, drift in find_counter_drift(events):
+            drifted_ids.append(event.id)
+            details = ', '.join(
+                f'{field} {stored} -> {actual}' for field, (stored, actual) in drift.items()
+            )
+            self.stdout.write(f'Event {event.id}: {details}')
+
+        if not drifted_ids:
+            self.stdout.write(self.style.SUCCESS('All counters are consistent'))
+            return
+
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING(f'{len(drifted_ids)} events have drifted counters'))
+            return
+
+        repaired = repair_counters(drifted_ids)
+        self.stdout.write(self.style.SUCCESS(f'Repaired counters on {repaired} events'))
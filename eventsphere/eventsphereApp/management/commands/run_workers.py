@@ -0,0 +1,77 @@
+import os
+import socket
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+from eventsphereApp.jobs import run_pending
+
+
+class Command(BaseCommand):
+    help = 'Run background job workers (event image uploads, ...)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Number of worker threads to run',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=10,
+            help='Jobs claimed per poll',
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=2.0,
+            help='Seconds to sleep when the queue is empty',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Drain the jobs that are currently due, then exit',
+        )
+
+    def handle(self, *args, **options):
+        prefix = f'{socket.gethostname()}:{os.getpid()}'
+        self.stop = threading.Event()
+
+        if options['workers'] == 1:
+            self.work(f'{prefix}:0', options)
+            return
+
+        threads = [
+            threading.Thread(target=self.work, args=(f'{prefix}:{i}', options), daemon=True)
+            for i in range(options['workers'])
+        ]
+        for thread in threads:
+            thread.start()
+        try:
+            while any(thread.is_alive() for thread in threads):
+                time.sleep(0.5)
+        except KeyboardInterrupt:
+            self.stdout.write('Stopping workers...')
+            self.stop.set()
+            for thread in threads:
+                thread.join()
+
+    def work(self, worker_id, options):
+        self.stdout.write(f'Worker {worker_id} started')
+        try:
+            while not self.stop.is_set():
+                close_old_connections()
+                ran = run_pending(worker_id, batch_size=options['batch_size'])
+                if ran:
+                    self.stdout.write(f'Worker {worker_id} ran {ran} jobs')
+                elif options['once']:
+                    break
+                else:
+                    self.stop.wait(options['poll_interval'])
+        finally:
+            if threading.current_thread() is not threading.main_thread():
+                connection.close()
+        self.stdout.write(self.style.SUCCESS(f'Worker {worker_id} stopped'))
@@ -0,0 +1,345 @@
+"""
+Request metrics in the Prometheus text format.
+
+MetricsMiddleware records, per URL name, the request count, a latency
+histogram, SQL queries per request, time spent in SQL and bytes sent. Each
+process aggregates in memory. gunicorn runs several worker processes, so when
+METRICS_DIR is set every worker also writes a snapshot there at most every
+METRICS_FLUSH_INTERVAL seconds, and /metrics sums the snapshots of all
+workers. Clear METRICS_DIR on deploy, like prometheus_client's multiprocess
+mode; files left by old workers otherwise keep counting.
+
+Database connection counts and pool usage come from db_pool and are added to
+every snapshot, so they are summed across workers the same way.
+
+SQL is timed by an execute wrapper installed on every connection as it is
+opened. It reports to the QueryTimer in a context variable. Django
+connections are per thread, and under ASGI the ORM runs in sync_to_async
+worker threads. Those threads inherit the request's context, so their queries
+are counted against the right request too.
+"""
+import hmac
+import json
+import os
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+
+from . import db_pool
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+UNRESOLVED_VIEW = '<unresolved>'
+
+COUNTERS = {
+    'requests': ('eventsphere_http_requests_total', 'Requests handled, by view, method and status'),
+    'db_seconds': ('eventsphere_db_query_seconds_total', 'Time spent running SQL queries, by view'),
+    'response_bytes': ('eventsphere_http_response_bytes_total', 'Response body bytes sent, by view'),
+}
+HISTOGRAMS = {
+    'duration': ('eventsphere_http_request_duration_seconds', 'Request latency, by view', DURATION_BUCKETS),
+    'queries': ('eventsphere_db_queries_per_request', 'SQL queries run per request, by view', QUERY_BUCKETS),
+}
+# db_pool.connection_stats() keys, exported per database alias
+CONNECTION_STATS = {
+    'opened': ('eventsphere_db_connections_opened_total', 'counter', 'Database connections opened'),
+    'checkouts': ('eventsphere_db_pool_checkouts_total', 'counter', 'Connections handed out by the pool'),
+    'reused': ('eventsphere_db_pool_reused_total', 'counter', 'Checkouts served by an idle pooled connection'),
+    'waits': ('eventsphere_db_pool_waits_total', 'counter', 'Checkouts that waited for a free connection'),
+    'wait_seconds': ('eventsphere_db_pool_wait_seconds_total', 'counter', 'Time spent waiting for a connection'),
+    'timeouts': ('eventsphere_db_pool_timeouts_total', 'counter', 'Checkouts that gave up waiting'),
+    'failed_checks': (
+        'eventsphere_db_pool_failed_checks_total', 'counter', 'Idle connections dropped by the health check'
+    ),
+    'in_use': ('eventsphere_db_pool_connections_in_use', 'gauge', 'Pooled connections checked out'),
+    'idle': ('eventsphere_db_pool_connections_idle', 'gauge', 'Pooled connections waiting to be reused'),
+    'max_size': ('eventsphere_db_pool_max_size', 'gauge', 'Pool size limit, summed over workers'),
+}
+LABELS = {
+    'requests': ('view', 'method', 'status'),
+    'db_seconds': ('view',),
+    'response_bytes': ('view',),
+    'duration': ('view',),
+    'queries': ('view',),
+}
+
+
+class Registry:
+    """Counters and histograms for one process, keyed by label values"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.series = {name: {} for name in LABELS}
+            self.last_flush = time.monotonic()
+
+    def record(self, view, method, status, duration, queries, db_seconds, response_bytes):
+        with self.lock:
+            requests = self.series['requests']
+            requests[(view, method, str(status))] = requests.get((view, method, str(status)), 0) + 1
+            self.series['db_seconds'][(view,)] = self.series['db_seconds'].get((view,), 0.0) + db_seconds
+            self.series['response_bytes'][(view,)] = self.series['response_bytes'].get((view,), 0) + response_bytes
+            self._observe('duration', view, duration)
+            self._observe('queries', view, queries)
+            should_flush = (
+                settings.METRICS_DIR
+                and time.monotonic() - self.last_flush >= settings.METRICS_FLUSH_INTERVAL
+            )
+        if should_flush:
+            self.flush()
+
+    def add_response_bytes(self, view, response_bytes):
+        """Count bytes of a streamed body, sent after its request was recorded"""
+        with self.lock:
+            self.series['response_bytes'][(view,)] = self.series['response_bytes'].get((view,), 0) + response_bytes
+
+    def _observe(self, name, view, value):
+        buckets = HISTOGRAMS[name][2]
+        # One slot per bucket plus +Inf, then sum; counts are made cumulative when rendered
+        histogram = self.series[name].setdefault((view,), [0] * (len(buckets) + 1) + [0.0])
+        histogram[bisect_left(buckets, value)] += 1
+        histogram[-1] += value
+
+    def snapshot(self):
+        with self.lock:
+            data = {
+                name: [[list(labels), value if not isinstance(value, list) else list(value)]
+                       for labels, value in series.items()]
+                for name, series in self.series.items()
+            }
+        data['db_connections'] = [
+            [[alias, stat], value]
+            for alias, stats in db_pool.connection_stats().items()
+            for stat, value in stats.items()
+        ]
+        return data
+
+    def flush(self):
+        """Write this process's snapshot to METRICS_DIR, atomically"""
+        directory = settings.METRICS_DIR
+        if not directory:
+            return
+        os.makedirs(directory, exist_ok=True)
+        data = self.snapshot()
+        with self.lock:
+            self.last_flush = time.monotonic()
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-', suffix='.json')
+        with os.fdopen(fd, 'w') as tmp_file:
+            json.dump(data, tmp_file)
+        os.replace(tmp_path, os.path.join(directory, f'{os.getpid()}.json'))
+
+
+registry = Registry()
+
+
+class QueryTimer:
+    """Queries run and seconds spent in them for one request"""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+
+_query_timer = ContextVar('query_timer', default=None)
+
+
+def _time_query(execute, sql, params, many, context):
+    timer = _query_timer.get()
+    if timer is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timer.count += 1
+        timer.seconds += time.perf_counter() - started
+
+
+def install_query_timer(sender, connection, **kwargs):
+    # A connection object is reopened after CONN_MAX_AGE; wrap it only once
+    if _time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_time_query)
+
+
+connection_created.connect(install_query_timer)
+
+
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not settings.METRICS_ENABLED:
+            return self.get_response(request)
+
+        timer = QueryTimer()
+        token = _query_timer.set(timer)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _query_timer.reset(token)
+        self._record(request, response, timer, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        if not settings.METRICS_ENABLED:
+            return await self.get_response(request)
+
+        timer = QueryTimer()
+        # sync_to_async copies the context, so the ORM's threads see the timer
+        token = _query_timer.set(timer)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _query_timer.reset(token)
+        self._record(request, response, timer, time.perf_counter() - started)
+        return response
+
+    def _record(self, request, response, timer, duration):
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else UNRESOLVED_VIEW
+        if not response.streaming:
+            response_bytes = len(response.content)
+        elif response.has_header('Content-Length'):
+            # Files; rewrapping them would rule out the server's sendfile
+            response_bytes = int(response['Content-Length'])
+        else:
+            response_bytes = 0
+            _count_streamed_bytes(response, view)
+        registry.record(
+            view=view,
+            method=request.method,
+            status=response.status_code,
+            duration=duration,
+            queries=timer.count,
+            db_seconds=timer.seconds,
+            response_bytes=response_bytes,
+        )
+
+
+def _count_streamed_bytes(response, view):
+    """Wrap a streamed body so its size is added once it has been sent"""
+    content = response.streaming_content
+    if response.is_async:
+        async def counted():
+            sent = 0
+            try:
+                async for chunk in content:
+                    sent += len(chunk)
+                    yield chunk
+            finally:
+                registry.add_response_bytes(view, sent)
+    else:
+        def counted():
+            sent = 0
+            try:
+                for chunk in content:
+                    sent += len(chunk)
+                    yield chunk
+            finally:
+                registry.add_response_bytes(view, sent)
+    response.streaming_content = counted()
+
+
+def is_authorized(request):
+    """Staff users, or a scraper presenting METRICS_TOKEN as a bearer token"""
+    if request.user.is_authenticated and request.user.is_staff:
+        return True
+    token = settings.METRICS_TOKEN
+    header = request.headers.get('Authorization', '')
+    return bool(token) and hmac.compare_digest(header, f'Bearer {token}')
+
+
+def collect():
+    """Series for this process, or summed over every worker when METRICS_DIR is set"""
+    if not settings.METRICS_DIR:
+        return registry.snapshot()
+
+    registry.flush()
+    merged = {name: {} for name in LABELS}
+    for filename in os.listdir(settings.METRICS_DIR):
+        if not filename.endswith('.json') or filename.startswith('.'):
+            continue
+        try:
+            with open(os.path.join(settings.METRICS_DIR, filename)) as snapshot_file:
+                snapshot = json.load(snapshot_file)
+        except (OSError, ValueError):
+            # A worker replaced or removed its file while we were reading
+            continue
+        for name, series in snapshot.items():
+            target = merged.setdefault(name, {})
+            for labels, value in series:
+                key = tuple(labels)
+                if isinstance(value, list):
+                    existing = target.setdefault(key, [0] * len(value))
+                    target[key] = [a + b for a, b in zip(existing, value)]
+                else:
+                    target[key] = target.get(key, 0) + value
+    return {name: [[list(labels), value] for labels, value in series.items()] for name, series in merged.items()}
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_bound(bound):
+    return '+Inf' if bound == float('inf') else repr(float(bound))
+
+
+def render(data=None):
+    """Prometheus text exposition of data (default: collect())"""
+    if data is None:
+        data = collect()
+    lines = []
+    for name, (metric, help_text) in COUNTERS.items():
+        lines.append(f'# HELP {metric} {help_text}')
+        lines.append(f'# TYPE {metric} counter')
+        for labels, value in sorted(data.get(name, [])):
+            lines.append(f'{metric}{_labels(LABELS[name], labels)} {value}')
+
+    for name, (metric, help_text, buckets) in HISTOGRAMS.items():
+        lines.append(f'# HELP {metric} {help_text}')
+        lines.append(f'# TYPE {metric} histogram')
+        for labels, value in sorted(data.get(name, [])):
+            counts, total = value[:-1], value[-1]
+            cumulative = 0
+            for bound, count in zip(list(buckets) + [float('inf')], counts):
+                cumulative += count
+                bucket_labels = _labels(LABELS[name], labels, [('le', _format_bound(bound))])
+                lines.append(f'{metric}_bucket{bucket_labels} {cumulative}')
+            lines.append(f'{metric}_sum{_labels(LABELS[name], labels)} {total}')
+            lines.append(f'{metric}_count{_labels(LABELS[name], labels)} {cumulative}')
+
+    for stat, (metric, metric_type, help_text) in CONNECTION_STATS.items():
+        series = sorted((labels[0], value) for labels, value in data.get('db_connections', []) if labels[1] == stat)
+        if not series:
+            continue
+        lines.append(f'# HELP {metric} {help_text}')
+        lines.append(f'# TYPE {metric} {metric_type}')
+        for alias, value in series:
+            lines.append(f'{metric}{_labels(("alias",), (alias,))} {value}')
+    return '\n'.join(lines) + '\n'
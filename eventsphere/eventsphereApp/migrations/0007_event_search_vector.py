@@ -0,0 +1,116 @@
+# Generated by Django 4.2.2 on 2026-10-18 05:17
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+FTS_TABLE = "eventsphereApp_event_fts"
+
+POSTGRES_FORWARD = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    """
+    CREATE OR REPLACE FUNCTION eventsphereapp_event_search_vector_update() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('english', coalesce(NEW.title, '')), 'A') ||
+            setweight(to_tsvector('simple', coalesce(NEW.city, '')), 'B') ||
+            setweight(to_tsvector('simple', coalesce(NEW.category, '')), 'B') ||
+            setweight(to_tsvector('english', coalesce(NEW.description, '')), 'C');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    # Only the searchable columns fire the trigger, so counter updates stay cheap
+    """
+    CREATE TRIGGER eventsphereapp_event_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF title, city, category, description
+    ON "{table}"
+    FOR EACH ROW EXECUTE FUNCTION eventsphereapp_event_search_vector_update()
+    """,
+    'UPDATE "{table}" SET title = title',
+    'CREATE INDEX IF NOT EXISTS event_search_vector_gin ON "{table}" USING gin (search_vector)',
+    'CREATE INDEX IF NOT EXISTS event_title_upper_trgm ON "{table}" USING gin (UPPER(title) gin_trgm_ops)',
+    'CREATE INDEX IF NOT EXISTS event_city_upper_trgm ON "{table}" USING gin (UPPER(city) gin_trgm_ops)',
+]
+
+POSTGRES_BACKWARD = [
+    "DROP INDEX IF EXISTS event_city_upper_trgm",
+    "DROP INDEX IF EXISTS event_title_upper_trgm",
+    "DROP INDEX IF EXISTS event_search_vector_gin",
+    'DROP TRIGGER IF EXISTS eventsphereapp_event_search_vector_trigger ON "{table}"',
+    "DROP FUNCTION IF EXISTS eventsphereapp_event_search_vector_update()",
+]
+
+# External-content FTS5 table kept in sync with triggers, as in the SQLite FTS5 docs
+SQLITE_FORWARD = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS "{fts}" USING fts5(
+        title, city, category, description,
+        content='{table}', content_rowid='id', tokenize='trigram'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS "{fts}_ai" AFTER INSERT ON "{table}" BEGIN
+        INSERT INTO "{fts}"(rowid, title, city, category, description)
+        VALUES (new.id, new.title, new.city, new.category, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS "{fts}_ad" AFTER DELETE ON "{table}" BEGIN
+        INSERT INTO "{fts}"("{fts}", rowid, title, city, category, description)
+        VALUES ('delete', old.id, old.title, old.city, old.category, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS "{fts}_au" AFTER UPDATE OF title, city, category, description ON "{table}" BEGIN
+        INSERT INTO "{fts}"("{fts}", rowid, title, city, category, description)
+        VALUES ('delete', old.id, old.title, old.city, old.category, old.description);
+        INSERT INTO "{fts}"(rowid, title, city, category, description)
+        VALUES (new.id, new.title, new.city, new.category, new.description);
+    END
+    """,
+    """INSERT INTO "{fts}"("{fts}") VALUES ('rebuild')""",
+]
+
+SQLITE_BACKWARD = [
+    'DROP TRIGGER IF EXISTS "{fts}_au"',
+    'DROP TRIGGER IF EXISTS "{fts}_ad"',
+    'DROP TRIGGER IF EXISTS "{fts}_ai"',
+    'DROP TABLE IF EXISTS "{fts}"',
+]
+
+
+def _run(apps, schema_editor, postgres_sql, sqlite_sql):
+    table = apps.get_model("eventsphereApp", "Event")._meta.db_table
+    vendor = schema_editor.connection.vendor
+    if vendor == "postgresql":
+        statements = postgres_sql
+    elif vendor == "sqlite":
+        statements = sqlite_sql
+    else:
+        return
+    for statement in statements:
+        schema_editor.execute(statement.format(table=table, fts=FTS_TABLE))
+
+
+def create_search_indexes(apps, schema_editor):
+    _run(apps, schema_editor, POSTGRES_FORWARD, SQLITE_FORWARD)
+
+
+def drop_search_indexes(apps, schema_editor):
+    _run(apps, schema_editor, POSTGRES_BACKWARD, SQLITE_BACKWARD)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("eventsphereApp", "0006_booking_cancelled_at_booking_is_cancelled"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="event",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
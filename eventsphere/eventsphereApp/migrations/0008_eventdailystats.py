@@ -0,0 +1,87 @@
+# Generated by Django 4.2.2 on 2026-10-18 05:19
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+
+def backfill_daily_stats(apps, schema_editor):
+    # Same aggregation as analytics.rebuild_daily_stats, against historical models
+    Event = apps.get_model("eventsphereApp", "Event")
+    Booking = apps.get_model("eventsphereApp", "Booking")
+    Bookmark = apps.get_model("eventsphereApp", "Bookmark")
+    EventDailyStats = apps.get_model("eventsphereApp", "EventDailyStats")
+
+    rows = {}
+    organizers = dict(Event.objects.values_list("id", "user_id"))
+    today = timezone.localdate()
+
+    def row(event_id, day):
+        return rows.setdefault(
+            (event_id, day or today),
+            {"bookings": 0, "cancellations": 0, "revenue": 0, "bookmarks": 0},
+        )
+
+    for r in (
+        Booking.objects.annotate(day=TruncDate("booked_at"))
+        .values("event_id", "day")
+        .annotate(count=Count("id"), revenue=Sum("event_id__ticket_price"))
+    ):
+        stats = row(r["event_id"], r["day"])
+        stats["bookings"] += r["count"]
+        stats["revenue"] += r["revenue"] or 0
+    for r in (
+        Booking.objects.filter(is_cancelled=True)
+        .annotate(day=TruncDate("cancelled_at"))
+        .values("event_id", "day")
+        .annotate(count=Count("id"))
+    ):
+        row(r["event_id"], r["day"])["cancellations"] += r["count"]
+    for r in (
+        Bookmark.objects.annotate(day=TruncDate("created_at"))
+        .values("event_id", "day")
+        .annotate(count=Count("id"))
+    ):
+        row(r["event_id"], r["day"])["bookmarks"] += r["count"]
+    for event_id in organizers.keys() - {event_id for event_id, _ in rows}:
+        row(event_id, today)
+
+    EventDailyStats.objects.bulk_create(
+        [
+            EventDailyStats(event_id=event_id, organizer_id=organizers[event_id], date=day, **stats)
+            for (event_id, day), stats in rows.items()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('eventsphereApp', '0007_event_search_vector'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('bookings', models.IntegerField(default=0)),
+                ('cancellations', models.IntegerField(default=0)),
+                ('revenue', models.BigIntegerField(default=0)),
+                ('bookmarks', models.IntegerField(default=0)),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='eventsphereApp.event')),
+                ('organizer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='event_daily_stats', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['organizer', 'date'], name='dailystats_organizer_date')],
+                'unique_together': {('event', 'date')},
+            },
+        ),
+        migrations.RunPython(backfill_daily_stats, migrations.RunPython.noop),
+    ]
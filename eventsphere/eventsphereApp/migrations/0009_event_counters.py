@@ -0,0 +1,59 @@
+# Generated by Django 4.2.2 on 2026-10-18 05:21
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_counters(apps, schema_editor):
+    Event = apps.get_model('eventsphereApp', 'Event')
+    Booking = apps.get_model('eventsphereApp', 'Booking')
+    Bookmark = apps.get_model('eventsphereApp', 'Bookmark')
+
+    def count(queryset, fk):
+        counts = (
+            queryset.filter(**{fk: OuterRef('pk')})
+            .order_by()
+            .values(fk)
+            .annotate(count=Count('pk'))
+            .values('count')
+        )
+        return Coalesce(Subquery(counts), Value(0))
+
+    Event.objects.update(
+        tickets_sold=count(Booking.objects.all(), 'event_id'),
+        active_tickets=count(Booking.objects.filter(is_cancelled=False), 'event_id'),
+        cancelled_tickets=count(Booking.objects.filter(is_cancelled=True), 'event_id'),
+        bookmarks_count=count(Bookmark.objects.all(), 'event'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('eventsphereApp', '0008_eventdailystats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='active_tickets',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='bookmarks_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='cancelled_tickets',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='tickets_sold',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.2 on 2026-10-18 05:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('eventsphereApp', '0010_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='capacity',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='event',
+            constraint=models.CheckConstraint(check=models.Q(('capacity__isnull', True), ('active_tickets__lte', models.F('capacity')), _connector='OR'), name='event_active_tickets_within_capacity'),
+        ),
+    ]
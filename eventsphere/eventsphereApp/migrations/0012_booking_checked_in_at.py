@@ -0,0 +1,18 @@
+# Generated by Django 4.2.2 on 2026-10-18 05:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('eventsphereApp', '0011_event_capacity'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='booking',
+            name='checked_in_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
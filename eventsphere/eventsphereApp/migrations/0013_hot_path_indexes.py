@@ -0,0 +1,45 @@
+# Generated by Django 4.2.2 on 2026-10-18 05:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('eventsphereApp', '0012_booking_checked_in_at'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['user_id', 'event_id'], name='booking_user_event'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['user_id', 'booked_at'], name='booking_user_booked_at'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['event_id', 'is_cancelled'], name='booking_event_cancelled'),
+        ),
+        migrations.AddIndex(
+            model_name='bookmark',
+            index=models.Index(fields=['user', '-created_at'], name='bookmark_user_newest'),
+        ),
+        migrations.AddIndex(
+            model_name='bookmark',
+            index=models.Index(fields=['event', '-created_at'], name='bookmark_event_newest'),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['user_id', '-id'], name='event_user_newest'),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['starts_at'], name='event_starts_at'),
+        ),
+        migrations.AddIndex(
+            model_name='job',
+            index=models.Index(condition=models.Q(('status', 'running')), fields=['locked_at'], name='job_running_locked_at'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.2 on 2026-10-18 06:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('eventsphereApp', '0014_event_updated_at_contentversion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='thumbnails',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
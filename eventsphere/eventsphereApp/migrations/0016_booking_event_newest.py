@@ -0,0 +1,17 @@
+# Generated by Django 4.2.2 on 2026-10-18 06:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('eventsphereApp', '0015_event_thumbnails'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['event_id', '-id'], name='booking_event_newest'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.2 on 2026-10-18 06:39
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('eventsphereApp', '0016_booking_event_newest'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventRecommendation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('score', models.FloatField()),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recommendations', to='eventsphereApp.event')),
+                ('recommended', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recommended_for', to='eventsphereApp.event')),
+            ],
+            options={
+                'unique_together': {('event', 'rank')},
+            },
+        ),
+    ]
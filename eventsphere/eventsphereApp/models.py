@@ -1,5 +1,10 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.contrib.postgres.search import SearchVectorField
+from django.utils import timezone
+
+# Bookings can be cancelled until this many days before the event starts
+CANCELLATION_NOTICE_DAYS = 5
 
 class Event(models.Model):
     title = models.CharField(max_length=100)
@@ -13,6 +18,49 @@ class Event(models.Model):
     description = models.TextField()
     image = models.CharField(max_length=5000)
     ticket_price = models.IntegerField()
+    # Maintained by a database trigger on Postgres (see migration 0007), unused on SQLite
+    search_vector = SearchVectorField(null=True, editable=False)
+    # Denormalized counters, kept in step by eventsphereApp.counters
+    tickets_sold = models.IntegerField(default=0)
+    active_tickets = models.IntegerField(default=0)
+    cancelled_tickets = models.IntegerField(default=0)
+    bookmarks_count = models.IntegerField(default=0)
+    # None means unlimited seats; enforced by eventsphereApp.bookings
+    capacity = models.PositiveIntegerField(null=True, blank=True)
+    # Bumped by every save() but not by the counter updates; ETags for the event page
+    updated_at = models.DateTimeField(auto_now=True)
+    # Resized copies of image under MEDIA_ROOT; written by eventsphereApp.thumbnails
+    thumbnails = models.JSONField(default=dict, blank=True)
+
+    class Meta:
+        constraints = [
+            models.CheckConstraint(
+                check=models.Q(capacity__isnull=True) | models.Q(active_tickets__lte=models.F('capacity')),
+                name='event_active_tickets_within_capacity'
+            ),
+        ]
+        indexes = [
+            # my_listed_events and the organizer lookups: one organizer's events, newest first
+            models.Index(fields=['user_id', '-id'], name='event_user_newest'),
+            # Date filter in searchResults
+            models.Index(fields=['starts_at'], name='event_starts_at'),
+        ]
+
+    def save(self, *args, update_fields=None, **kwargs):
+        # auto_now is only written when it is among update_fields
+        if update_fields is not None and 'updated_at' not in update_fields:
+            update_fields = [*update_fields, 'updated_at']
+        super().save(*args, update_fields=update_fields, **kwargs)
+
+    @property
+    def seats_left(self):
+        if self.capacity is None:
+            return None
+        return max(self.capacity - self.active_tickets, 0)
+
+    @property
+    def is_sold_out(self):
+        return self.capacity is not None and self.active_tickets >= self.capacity
 
 class Booking(models.Model):
     event_id = models.ForeignKey(Event, on_delete=models.CASCADE)
@@ -20,6 +68,20 @@ class Booking(models.Model):
     booked_at = models.DateTimeField(auto_now_add=True)  # ADD THIS LINE
     is_cancelled = models.BooleanField(default=False)
     cancelled_at = models.DateTimeField(null=True, blank=True)
+    # Set by eventsphereApp.checkin when the ticket is scanned at the gate
+    checked_in_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # My Tickets groups a user's bookings by event, and expands one group at a time
+            models.Index(fields=['user_id', 'event_id'], name='booking_user_event'),
+            # A user's bookings in booking order
+            models.Index(fields=['user_id', 'booked_at'], name='booking_user_booked_at'),
+            # Active/cancelled counts per event (counter reconciliation, analytics rebuild)
+            models.Index(fields=['event_id', 'is_cancelled'], name='booking_event_cancelled'),
+            # Attendee list and export: one event's bookings in id order
+            models.Index(fields=['event_id', '-id'], name='booking_event_newest'),
+        ]
     
     def can_cancel(self):
         """Check if booking can be cancelled (5+ days before event)"""
@@ -27,7 +89,7 @@ class Booking(models.Model):
         if self.is_cancelled:
             return False
         days_until_event = (self.event_id.starts_at - timezone.now()).days
-        return days_until_event >= 5
+        return days_until_event >= CANCELLATION_NOTICE_DAYS
 
 class Ticket(models.Model):
     event = models.ForeignKey('Event', on_delete=models.CASCADE)
@@ -46,6 +108,95 @@ class Bookmark(models.Model):
     class Meta:
         unique_together = ('user', 'event')
         ordering = ['-created_at']
+        indexes = [
+            # Bookmarks page and the organizer's list read these newest first
+            models.Index(fields=['user', '-created_at'], name='bookmark_user_newest'),
+            models.Index(fields=['event', '-created_at'], name='bookmark_event_newest'),
+        ]
     
     def __str__(self):
-        return f"{self.user.username} - {self.event.title}"
\ No newline at end of file
+        return f"{self.user.username} - {self.event.title}"
+
+class EventDailyStats(models.Model):
+    """Per-event, per-day rollup kept current by eventsphereApp.analytics"""
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='daily_stats')
+    organizer = models.ForeignKey(User, on_delete=models.CASCADE, related_name='event_daily_stats')
+    date = models.DateField()
+    bookings = models.IntegerField(default=0)
+    cancellations = models.IntegerField(default=0)
+    revenue = models.BigIntegerField(default=0)
+    bookmarks = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('event', 'date')
+        indexes = [
+            models.Index(fields=['organizer', 'date'], name='dailystats_organizer_date'),
+        ]
+
+    def __str__(self):
+        return f"{self.event.title} - {self.date}"
+
+
+
+class EventRecommendation(models.Model):
+    """An event similar to another, from people who booked or bookmarked both; see eventsphereApp.recommendations"""
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='recommendations')
+    recommended = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='recommended_for')
+    # 1 is the most similar
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+
+    class Meta:
+        # Also the index the event page reads its recommendations from
+        unique_together = ('event', 'rank')
+
+    def __str__(self):
+        return f"{self.event_id} -> {self.recommended_id} (#{self.rank})"
+
+class ContentVersion(models.Model):
+    """A version number bumped whenever a set of pages changes; see eventsphereApp.conditional"""
+    name = models.CharField(max_length=50, primary_key=True)
+    version = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.name} v{self.version}"
+
+
+class Job(models.Model):
+    """A unit of background work, run by the run_workers management command"""
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    kind = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.IntegerField(default=0)
+    max_attempts = models.IntegerField(default=5)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_after'], name='job_status_run_after'),
+            # claim_jobs also sweeps running jobs whose worker died; only those rows are indexed
+            models.Index(
+                fields=['locked_at'], name='job_running_locked_at',
+                condition=models.Q(status='running')
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} #{self.id} ({self.status})"
@@ -0,0 +1,185 @@
+"""
+Full-page cache for the public catalogue pages.
+
+Pages are cached per variant (anonymous, or one variant per logged-in user
+for the navbar), path and normalised query string. Every entry is stamped with
+the current version of the tags it depends on: 'catalogue' for listings,
+'prices' for pages that count events by price, 'event:<id>' for an event
+page and 'recommendations' for pages listing similar events. Purging a tag
+bumps its version, so stale entries are never read again and expire on their
+own. Bits that change per click, such as bookmark hearts and seats left, are
+not baked into the page.
+The page_state JSON endpoint layers them on in the browser.
+
+With read replicas, a page missed within REPLICA_LAG_WINDOW of a purge is
+rendered from the primary, so a lagging replica can't refill the cache with
+the data the purge was meant to drop.
+"""
+import hashlib
+from contextlib import nullcontext
+from functools import wraps
+from urllib.parse import urlencode
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+
+from .db_router import use_primary
+
+CATALOGUE_TAG = 'catalogue'
+PRICES_TAG = 'prices'
+RECOMMENDATIONS_TAG = 'recommendations'
+
+# Query parameters that never change what a page renders
+IGNORED_QUERY_PARAMS = {'fbclid', 'gclid'}
+
+
+def _cache():
+    return caches[settings.PAGE_CACHE_ALIAS]
+
+
+def event_tag(event_id):
+    return f'event:{event_id}'
+
+
+def normalise_query_string(query_dict):
+    """Sort parameters, drop empty values and tracking parameters"""
+    items = []
+    for key in sorted(query_dict.keys()):
+        if key in IGNORED_QUERY_PARAMS or key.startswith('utm_'):
+            continue
+        for value in query_dict.getlist(key):
+            value = value.strip()
+            if value:
+                items.append((key, value))
+    return urlencode(items)
+
+
+def tag_versions(tags):
+    keys = [f'page-cache:tag:{tag}' for tag in tags]
+    versions = _cache().get_many(keys)
+    return [str(versions.get(key, 0)) for key in keys]
+
+
+def purge(*tags):
+    """Invalidate every cached page that depends on any of tags"""
+    cache = _cache()
+    for tag in tags:
+        key = f'page-cache:tag:{tag}'
+        # add() is a no-op if the key exists; incr() is atomic on shared backends
+        cache.add(key, 0, timeout=None)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, timeout=None)
+    if settings.DATABASE_REPLICAS:
+        cache.set_many({f'page-cache:purged:{tag}': 1 for tag in tags}, timeout=settings.REPLICA_LAG_WINDOW)
+
+
+def recently_purged(tags):
+    if not settings.DATABASE_REPLICAS or not tags:
+        return False
+    return bool(_cache().get_many([f'page-cache:purged:{tag}' for tag in tags]))
+
+
+def purge_event(event_id):
+    purge(CATALOGUE_TAG, event_tag(event_id))
+
+
+def _variant(request):
+    if request.user.is_authenticated:
+        return f'user:{request.user.pk}'
+    return 'anon'
+
+
+def has_pending_messages(request):
+    return bool(request.COOKIES.get('messages')) or '_messages' in request.session
+
+
+def _cache_key(request, tags):
+    raw = '|'.join([
+        _variant(request),
+        request.path,
+        normalise_query_string(request.GET),
+        *tag_versions(tags),
+    ])
+    return 'page-cache:page:' + hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def _lookup(request, tags):
+    """
+    (key, from_primary, cached response) for a request the cache may serve,
+    or None when it must always reach the view
+    """
+    if (
+        not settings.PAGE_CACHE_ENABLED
+        or request.method not in ('GET', 'HEAD')
+        or has_pending_messages(request)
+    ):
+        return None
+
+    page_tags = tags(request) if callable(tags) else tags
+    key = _cache_key(request, page_tags)
+    cached = _cache().get(key)
+    if cached is None:
+        return key, recently_purged(page_tags), None
+    content, content_type = cached
+    response = HttpResponse(content, content_type=content_type)
+    response['X-Page-Cache'] = 'HIT'
+    return key, False, response
+
+
+def _store(request, key, response):
+    if (
+        response.status_code == 200
+        and not response.streaming
+        and not response.cookies
+        and not request.META.get('CSRF_COOKIE_NEEDS_UPDATE')
+    ):
+        if hasattr(response, 'render') and callable(response.render):
+            response.render()
+        _cache().set(key, (response.content, response['Content-Type']), settings.PAGE_CACHE_TIMEOUT)
+        response['X-Page-Cache'] = 'MISS'
+
+
+def cached_page(tags=()):
+    """
+    Serve GET requests from the page cache.
+
+    tags is a list of tags or a callable taking the request and returning one.
+    Only 200 responses that set no cookies and did not render a CSRF token are
+    stored, and requests with flash messages waiting always hit the view.
+    Works on sync and async views; for async ones the cache and session are
+    read in a worker thread.
+    """
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                lookup = await sync_to_async(_lookup)(request, tags)
+                if lookup is None:
+                    return await view(request, *args, **kwargs)
+                key, from_primary, cached = lookup
+                if cached is not None:
+                    return cached
+                with use_primary() if from_primary else nullcontext():
+                    response = await view(request, *args, **kwargs)
+                await sync_to_async(_store)(request, key, response)
+                return response
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            lookup = _lookup(request, tags)
+            if lookup is None:
+                return view(request, *args, **kwargs)
+            key, from_primary, cached = lookup
+            if cached is not None:
+                return cached
+            with use_primary() if from_primary else nullcontext():
+                response = view(request, *args, **kwargs)
+            _store(request, key, response)
+            return response
+        return wrapper
+    return decorator
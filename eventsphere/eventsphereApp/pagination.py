@@ -0,0 +1,87 @@
+import base64
+import binascii
+
+from django.conf import settings
+
+
+def encode_cursor(last_id):
+    """Turn the last id shown on a page into an opaque ?after= token"""
+    raw = str(last_id).encode('ascii')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token):
+    """Return the id encoded in an ?after= token, or None if it is missing or invalid"""
+    if not token:
+        return None
+    padded = token + '=' * (-len(token) % 4)
+    try:
+        last_id = int(base64.urlsafe_b64decode(padded.encode('ascii')).decode('ascii'))
+    except (binascii.Error, UnicodeError, ValueError):
+        return None
+    return last_id if last_id > 0 else None
+
+
+def get_page_size(request, default=None):
+    """Read ?page_size= from the request, clamped to EVENTS_PAGE_SIZE_MAX"""
+    if default is None:
+        default = settings.EVENTS_PAGE_SIZE
+    try:
+        page_size = int(request.GET.get('page_size', default))
+    except (TypeError, ValueError):
+        page_size = default
+    return max(1, min(page_size, settings.EVENTS_PAGE_SIZE_MAX))
+
+
+class KeysetPage:
+    """One page of rows ordered by -id plus the token for the next page"""
+
+    def __init__(self, object_list, next_cursor, page_size):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.page_size = page_size
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+def _page_query(queryset, after, page_size):
+    queryset = queryset.order_by('-id')
+    last_id = decode_cursor(after)
+    if last_id is not None:
+        queryset = queryset.filter(id__lt=last_id)
+    return queryset[:page_size + 1]
+
+
+def _make_page(rows, page_size):
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = encode_cursor(rows[-1].id)
+    return KeysetPage(rows, next_cursor, page_size)
+
+
+def keyset_paginate(queryset, after=None, page_size=None):
+    """
+    Slice a queryset newest-first using the id of the last row seen.
+
+    Only page_size + 1 rows are fetched, so the cost of a page does not depend
+    on how many rows the table holds or how deep the visitor has paged.
+    """
+    if page_size is None:
+        page_size = settings.EVENTS_PAGE_SIZE
+    return _make_page(list(_page_query(queryset, after, page_size)), page_size)
+
+
+async def akeyset_paginate(queryset, after=None, page_size=None):
+    """keyset_paginate() for async views"""
+    if page_size is None:
+        page_size = settings.EVENTS_PAGE_SIZE
+    return _make_page([row async for row in _page_query(queryset, after, page_size)], page_size)
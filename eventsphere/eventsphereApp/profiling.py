@@ -0,0 +1,151 @@
+"""
+Shared setup for the benchmark and explain commands: which users to act as,
+one representative request for every named route, and percentiles.
+"""
+import json
+import math
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db.models import Count, Q
+from django.test import Client
+from django.urls import URLPattern, get_resolver, reverse
+
+from . import imaging, thumbnails
+from .checkin import ticket_token
+from .models import Booking, Event
+
+ROLES = ('anonymous', 'attendee', 'organizer')
+
+# Routes that can't be exercised repeatedly, with the reason shown in the report
+SKIPPED_ROUTES = {
+    'Logout': 'ends the session the other requests depend on',
+    'cancel_ticket': 'each booking can only be cancelled once',
+    'delete_event': 'destroys the data being measured',
+}
+
+# Routes that write rows; only run on the scratch database
+WRITE_ROUTES = {'BuyTicket', 'toggle_bookmark', 'checkin_scan'}
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    ordered = sorted(samples)
+    rank = max(math.ceil(pct / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+class MissingData(Exception):
+    """The database has nothing to build representative requests from"""
+
+
+def pick_fixtures():
+    """Pick the heaviest organizer and attendee, since they show scaling problems first"""
+    organizer = (
+        User.objects.annotate(listed=Count('event')).filter(listed__gt=0)
+        .order_by('-listed', 'id').first()
+    )
+    attendee = (
+        User.objects.annotate(booked=Count('booking', filter=Q(booking__is_cancelled=False)))
+        .filter(booked__gt=0).order_by('-booked', 'id').first()
+    )
+    if organizer is None or attendee is None:
+        raise MissingData('Need at least one event and one booking; run load_test_data first')
+
+    event = Event.objects.filter(user_id=organizer).order_by('-tickets_sold', 'id').first()
+    booking_id, booked_event_id = (
+        Booking.objects.filter(user_id=attendee).order_by('id').values_list('id', 'event_id').first()
+    )
+    tokens = [ticket_token(booking) for booking in Booking.objects.filter(event_id=event).order_by('id')[:100]]
+    page_ids = Event.objects.order_by('-id').values_list('id', flat=True)[:settings.EVENTS_PAGE_SIZE]
+    # The widest thumbnail of any event that has a set; None if none has been made yet
+    thumbnail = Event.objects.exclude(thumbnails={}).order_by('id').values_list('thumbnails', flat=True).first()
+    return {
+        'users': {'organizer': organizer, 'attendee': attendee},
+        'event': event,
+        'booking_id': booking_id,
+        'booked_event_id': booked_event_id,
+        'tokens': tokens,
+        'page_ids': ','.join(str(i) for i in page_ids),
+        'thumbnail': thumbnail and reverse(
+            'thumbnail', args=[thumbnail['key'], thumbnails.file_name(thumbnail['widths'][-1], imaging.FORMATS[0])]
+        ),
+    }
+
+
+def route_requests(fixtures):
+    """Map each url name to the (method, path, data[, client kwargs]) used to exercise it"""
+    event = fixtures['event']
+    requests = {
+        'Home': ('get', '/', None),
+        'Login': ('get', '/login/', None),
+        'Signup': ('get', '/signup/', None),
+        'Profile': ('get', '/profile/', None),
+        'SearchResults': ('get', '/search/', {'query': 'Festival'}),
+        'EventsPage': ('get', '/events/', None),
+        'toggle_bookmark': ('post', f'/bookmark/{event.id}/', None),
+        'bookmarked_events': ('get', '/bookmarks/', None),
+        'page_state': ('get', '/page-state/', {'ids': fixtures['page_ids'], 'availability': '1'}),
+        'my_listed_events': ('get', '/my-listed-events/', None),
+        'analytics_dashboard': ('get', '/analytics-dashboard/', None),
+        'event_attendees': ('get', f'/event-attendees/{event.id}/', None),
+        'event_attendees_export': ('get', f'/event-attendees/{event.id}/export/', {'format': 'csv'}),
+        'event_bookmarks_list': ('get', f'/event-bookmarks/{event.id}/', None),
+        'edit_ticket_price': ('get', f'/edit-ticket-price/{event.id}/', None),
+        'ViewEvent': ('get', '/view-event/', {'id': event.id}),
+        'CreateEvent': ('get', '/create-event/', None),
+        'BuyTicket': ('get', '/buy-ticket/', {'id': event.id}),
+        'MyTickets': ('get', '/my-tickets/', None),
+        'my_event_tickets': ('get', f"/my-tickets/{fixtures['booked_event_id']}/", None),
+        'Ticket': ('get', '/ticket/', {'id': fixtures['booking_id']}),
+        'checkin_scan': (
+            'post', f'/check-in/{event.id}/', json.dumps({'tokens': fixtures['tokens']}),
+            {'content_type': 'application/json'}
+        ),
+        'checkin_manifest': ('get', f'/check-in/{event.id}/manifest/', None),
+        'About': ('get', '/about/', None),
+        # Scraped with the token when one is set, as Prometheus would
+        'metrics': (
+            'get', '/metrics', None,
+            {'HTTP_AUTHORIZATION': f'Bearer {settings.METRICS_TOKEN}'} if settings.METRICS_TOKEN else {}
+        ),
+        'api_events': ('get', '/api/v1/events/', None),
+        'api_event_detail': ('get', f'/api/v1/events/{event.id}/', {'fields': 'id,title,seats_left,thumbnails'}),
+        'api_event_availability': ('get', f'/api/v1/events/{event.id}/availability/', None),
+        'api_my_tickets': ('get', '/api/v1/me/tickets/', {'fields': 'id,event_id,token'}),
+        'api_my_bookmarks': ('get', '/api/v1/me/bookmarks/', None),
+    }
+    if fixtures['thumbnail']:
+        requests['thumbnail'] = ('get', fixtures['thumbnail'], None)
+    return requests
+
+
+def iter_routes(requests, only=None, include_writes=True):
+    """
+    Yield (url name, request spec, skip reason) for every named route in the
+    URLconf. Exactly one of spec and skip reason is set.
+    """
+    for pattern in get_resolver().url_patterns:
+        # admin/ and static files are included URLconfs, not app routes
+        if not isinstance(pattern, URLPattern) or not pattern.name:
+            continue
+        name = pattern.name
+        if only and name not in only:
+            continue
+        if name in SKIPPED_ROUTES:
+            yield name, None, SKIPPED_ROUTES[name]
+        elif name in WRITE_ROUTES and not include_writes:
+            yield name, None, 'writes rows, only run on the scratch database'
+        elif name not in requests:
+            yield name, None, 'no representative request defined in eventsphereApp.profiling'
+        else:
+            yield name, requests[name], None
+
+
+def client_for(role, fixtures):
+    """A test client logged in as role"""
+    # A view that raises is reported with its 500 rather than aborting the run
+    client = Client(raise_request_exception=False)
+    if role != 'anonymous':
+        client.force_login(fixtures['users'][role])
+    return client
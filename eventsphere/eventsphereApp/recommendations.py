@@ -0,0 +1,143 @@
+"""
+"You may also like" recommendations from bookings and bookmarks.
+
+Every active booking or bookmark is one interaction between a user and an
+event. rebuild_recommendations() streams all of them once, ordered by user,
+and counts for each pair of events how many users interacted with both: a
+sparse item-item co-occurrence matrix, kept as one Counter row per event.
+Counter.update() counts a user's whole history in C, so the cost is the
+number of co-occurring pairs rather than Python-level loops over them. Each
+user contributes at most RECOMMENDATION_HISTORY_LIMIT of their newest
+events, which bounds the pairs a heavy user adds.
+
+Pairs are scored by cosine similarity, shared users / sqrt(users of a *
+users of b), and the top RECOMMENDATIONS_PER_EVENT upcoming events per event
+are written to EventRecommendation in one transaction. The event page and
+the profile then read them with one indexed query each; see similar_events()
+and for_user(). The table is rebuilt by the build_recommendations command.
+"""
+import heapq
+import logging
+import math
+from collections import Counter, defaultdict
+from itertools import groupby
+from operator import itemgetter
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q, Sum
+from django.utils import timezone
+
+from . import page_cache
+from .conditional import RECOMMENDATIONS, bump
+from .models import Booking, Bookmark, Event, EventRecommendation
+
+logger = logging.getLogger(__name__)
+
+# Pairs seen together by fewer users are noise, however high their cosine
+MIN_SHARED_USERS = 2
+# Recommendations shown on the event page and the profile
+SHOWN = 4
+READ_CHUNK_SIZE = 10000
+WRITE_BATCH_SIZE = 1000
+
+
+def _interactions():
+    """(user id, event id) for every active booking and bookmark, newest events first within each user"""
+    bookings = (
+        Booking.objects.filter(is_cancelled=False)
+        .order_by('-user_id', '-event_id')
+        .values_list('user_id', 'event_id')
+        .iterator(chunk_size=READ_CHUNK_SIZE)
+    )
+    bookmarks = (
+        Bookmark.objects.order_by('-user_id', '-event_id')
+        .values_list('user_id', 'event_id')
+        .iterator(chunk_size=READ_CHUNK_SIZE)
+    )
+    # Both are read in (user, event) index order, so merging them keeps it
+    return heapq.merge(bookings, bookmarks, reverse=True)
+
+
+def histories(interactions, limit):
+    """Each user's distinct events, at most limit of them, from interactions grouped by user"""
+    for _, rows in groupby(interactions, key=itemgetter(0)):
+        yield list(dict.fromkeys(event_id for _, event_id in rows))[:limit]
+
+
+def similarities(user_histories, candidates, per_event):
+    """
+    {event id: [(score, similar event id)]}, best first, from per-user event lists.
+
+    Only events in candidates are recommended; every event can have
+    recommendations.
+    """
+    users = Counter()
+    shared = defaultdict(Counter)
+    for events in user_histories:
+        users.update(events)
+        if len(events) > 1:
+            for event_id in events:
+                shared[event_id].update(events)
+
+    result = {}
+    for event_id, row in shared.items():
+        scored = [
+            (count / math.sqrt(users[event_id] * users[other]), other)
+            for other, count in row.items()
+            if count >= MIN_SHARED_USERS and other != event_id and other in candidates
+        ]
+        if scored:
+            result[event_id] = heapq.nlargest(per_event, scored)
+    return result
+
+
+def rebuild_recommendations():
+    """Recompute EventRecommendation from all bookings and bookmarks; returns the number of rows written"""
+    candidates = set(Event.objects.filter(starts_at__gte=timezone.now()).values_list('id', flat=True))
+    similar = similarities(
+        histories(_interactions(), settings.RECOMMENDATION_HISTORY_LIMIT),
+        candidates,
+        settings.RECOMMENDATIONS_PER_EVENT,
+    )
+
+    with transaction.atomic():
+        EventRecommendation.objects.all().delete()
+        EventRecommendation.objects.bulk_create(
+            (
+                EventRecommendation(event_id=event_id, recommended_id=other, rank=rank, score=score)
+                for event_id, top in similar.items()
+                for rank, (score, other) in enumerate(top, start=1)
+            ),
+            batch_size=WRITE_BATCH_SIZE
+        )
+        bump(RECOMMENDATIONS)
+        transaction.on_commit(lambda: page_cache.purge(page_cache.RECOMMENDATIONS_TAG))
+
+    rows = sum(len(top) for top in similar.values())
+    logger.info('Rebuilt recommendations', extra={'events': len(similar), 'rows': rows})
+    return rows
+
+
+def similar_events(event_id, limit=SHOWN):
+    """Upcoming events most like event_id, best first"""
+    return Event.objects.filter(
+        recommended_for__event_id=event_id, starts_at__gte=timezone.now()
+    ).order_by('recommended_for__rank')[:limit]
+
+
+def for_user(user, limit=SHOWN):
+    """Upcoming events most like those user booked or bookmarked, leaving out those"""
+    booked = Booking.objects.filter(user_id=user, is_cancelled=False).values('event_id')
+    bookmarked = Bookmark.objects.filter(user=user).values('event_id')
+    return (
+        Event.objects.filter(
+            Q(recommended_for__event__in=booked) | Q(recommended_for__event__in=bookmarked),
+            starts_at__gte=timezone.now(),
+        )
+        .exclude(id__in=booked)
+        .exclude(id__in=bookmarked)
+        # Events similar to several of the user's add up
+        .annotate(similarity=Sum('recommended_for__score'))
+        .order_by('-similarity', 'id')[:limit]
+    )
@@ -0,0 +1,138 @@
+"""
+Ranked event search.
+
+Postgres keeps ``Event.search_vector`` up to date with a trigger and indexes it
+with GIN, and title/city carry trigram indexes so substring lookups stop
+scanning the whole table. SQLite mirrors that with an FTS5 table using the
+trigram tokenizer. Both are created in migration 0007.
+"""
+from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramSimilarity
+from django.db import connection, connections
+from django.db.models import F, FloatField, Q
+from django.db.models.expressions import RawSQL
+
+from .models import Event
+
+# Column used by each search-type; anything else searches every indexed column
+SEARCH_TYPE_FIELDS = {
+    'name': 'title',
+    'location': 'city',
+}
+
+FTS_TABLE = 'eventsphereApp_event_fts'
+
+# bm25 column weights for title, city, category, description
+FTS_WEIGHTS = (10.0, 5.0, 5.0, 1.0)
+
+# The trigram tokenizer cannot match anything shorter than this
+FTS_MIN_QUERY_LENGTH = 3
+
+# SQLite drops these whenever a migration rebuilds the Event table, so
+# ensure_sqlite_fts_triggers() recreates them after every migrate
+FTS_TRIGGERS = {
+    f'{FTS_TABLE}_ai': """
+        CREATE TRIGGER IF NOT EXISTS "{fts}_ai" AFTER INSERT ON "{table}" BEGIN
+            INSERT INTO "{fts}"(rowid, title, city, category, description)
+            VALUES (new.id, new.title, new.city, new.category, new.description);
+        END
+    """,
+    f'{FTS_TABLE}_ad': """
+        CREATE TRIGGER IF NOT EXISTS "{fts}_ad" AFTER DELETE ON "{table}" BEGIN
+            INSERT INTO "{fts}"("{fts}", rowid, title, city, category, description)
+            VALUES ('delete', old.id, old.title, old.city, old.category, old.description);
+        END
+    """,
+    f'{FTS_TABLE}_au': """
+        CREATE TRIGGER IF NOT EXISTS "{fts}_au" AFTER UPDATE OF title, city, category, description ON "{table}" BEGIN
+            INSERT INTO "{fts}"("{fts}", rowid, title, city, category, description)
+            VALUES ('delete', old.id, old.title, old.city, old.category, old.description);
+            INSERT INTO "{fts}"(rowid, title, city, category, description)
+            VALUES (new.id, new.title, new.city, new.category, new.description);
+        END
+    """,
+}
+
+
+def search_events(search_query, search_type='', queryset=None):
+    """Return events matching search_query, best match first"""
+    if queryset is None:
+        queryset = Event.objects.all()
+
+    if connection.vendor == 'postgresql':
+        return _postgres_search(queryset, search_query, search_type)
+    if connection.vendor == 'sqlite' and len(search_query) >= FTS_MIN_QUERY_LENGTH:
+        return _sqlite_search(queryset, search_query, search_type)
+    return _fallback_search(queryset, search_query, search_type)
+
+
+def _postgres_search(queryset, search_query, search_type):
+    field = SEARCH_TYPE_FIELDS.get(search_type)
+    if field:
+        # icontains compiles to UPPER(col) LIKE, which the UPPER(col) gin_trgm_ops index serves
+        return queryset.filter(**{f'{field}__icontains': search_query}).annotate(
+            search_rank=TrigramSimilarity(field, search_query)
+        ).order_by('-search_rank', '-id')
+
+    query = SearchQuery(search_query, search_type='websearch', config='english')
+    return queryset.filter(
+        Q(search_vector=query) | Q(title__icontains=search_query) | Q(city__icontains=search_query)
+    ).annotate(
+        search_rank=SearchRank(F('search_vector'), query) + TrigramSimilarity('title', search_query)
+    ).order_by('-search_rank', '-id')
+
+
+def _fts_match_expression(search_query, field=None):
+    # Quote the input as a single FTS5 phrase so user text can't inject operators
+    phrase = '"%s"' % search_query.replace('"', '""')
+    if field:
+        return '{%s} : %s' % (field, phrase)
+    return phrase
+
+
+def _sqlite_search(queryset, search_query, search_type):
+    match = _fts_match_expression(search_query, SEARCH_TYPE_FIELDS.get(search_type))
+    event_table = Event._meta.db_table
+    weights = ', '.join(str(weight) for weight in FTS_WEIGHTS)
+
+    matching_ids = RawSQL(f'SELECT rowid FROM "{FTS_TABLE}" WHERE "{FTS_TABLE}" MATCH %s', (match,))
+    # bm25() is lower-is-better, so negate it to sort like the Postgres rank
+    rank = RawSQL(
+        f'SELECT -bm25("{FTS_TABLE}", {weights}) FROM "{FTS_TABLE}" '
+        f'WHERE "{FTS_TABLE}" MATCH %s AND rowid = "{event_table}"."id"',
+        (match,),
+        output_field=FloatField()
+    )
+    return queryset.filter(id__in=matching_ids).annotate(search_rank=rank).order_by('-search_rank', '-id')
+
+
+def _fallback_search(queryset, search_query, search_type):
+    field = SEARCH_TYPE_FIELDS.get(search_type)
+    if field:
+        return queryset.filter(**{f'{field}__icontains': search_query}).order_by('-id')
+
+    query = Q(title__icontains=search_query)
+    for other_field in ('city', 'category', 'description'):
+        query |= Q(**{f'{other_field}__icontains': search_query})
+    return queryset.filter(query).order_by('-id')
+
+
+def ensure_sqlite_fts_triggers(using='default'):
+    """Recreate missing FTS5 sync triggers and reindex; returns the names recreated"""
+    db = connections[using]
+    if db.vendor != 'sqlite':
+        return []
+
+    with db.cursor() as cursor:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE])
+        if cursor.fetchone() is None:
+            # Migration 0007 has not run on this database yet
+            return []
+
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")
+        existing = {row[0] for row in cursor.fetchall()}
+        missing = [name for name in FTS_TRIGGERS if name not in existing]
+        for name in missing:
+            cursor.execute(FTS_TRIGGERS[name].format(fts=FTS_TABLE, table=Event._meta.db_table))
+        if missing:
+            cursor.execute(f'INSERT INTO "{FTS_TABLE}"("{FTS_TABLE}") VALUES (\'rebuild\')')
+    return missing
@@ -0,0 +1,101 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_migrate, post_save, pre_save
+from django.dispatch import receiver
+
+from . import analytics, bookmark_cache, conditional, counters, page_cache
+from .models import Booking, Bookmark, Event
+from .search import ensure_sqlite_fts_triggers
+
+# _was_cancelled of a Booking loaded without is_cancelled (.only()/.defer())
+UNKNOWN = object()
+
+
+@receiver(post_migrate)
+def restore_search_triggers(sender, using='default', **kwargs):
+    if sender.name == 'eventsphereApp':
+        ensure_sqlite_fts_triggers(using)
+
+
+@receiver(post_save, sender=Event)
+def event_saved(sender, instance, created, update_fields=None, **kwargs):
+    if created:
+        analytics.record_event_created(instance)
+        conditional.bump_catalogue()
+        transaction.on_commit(lambda: page_cache.purge(page_cache.CATALOGUE_TAG))
+    elif update_fields and set(update_fields) <= {'ticket_price', 'capacity', 'updated_at'}:
+        # Listing cards don't show these, so only the event's own page and the price facets go stale
+        transaction.on_commit(lambda: page_cache.purge(page_cache.event_tag(instance.id), page_cache.PRICES_TAG))
+    else:
+        conditional.bump_catalogue()
+        transaction.on_commit(lambda: page_cache.purge_event(instance.id))
+
+
+@receiver(post_delete, sender=Event)
+def event_deleted(sender, instance, **kwargs):
+    event_id = instance.id
+    conditional.bump_catalogue()
+    transaction.on_commit(lambda: page_cache.purge_event(event_id))
+
+
+@receiver(post_init, sender=Booking)
+def booking_loaded(sender, instance, **kwargs):
+    # Remember the loaded state so post_save can tell a cancellation from any other save.
+    # Reading a deferred field here would cost a query per row loaded.
+    if 'is_cancelled' in instance.get_deferred_fields():
+        instance._was_cancelled = UNKNOWN
+    else:
+        instance._was_cancelled = instance.is_cancelled
+
+
+@receiver(pre_save, sender=Booking)
+def booking_saving(sender, instance, **kwargs):
+    if instance._was_cancelled is UNKNOWN:
+        # Only instances that are actually saved pay for the lookup
+        instance._was_cancelled = bool(
+            not instance._state.adding
+            and Booking.objects.filter(pk=instance.pk).values_list('is_cancelled', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Booking)
+def booking_saved(sender, instance, created, **kwargs):
+    if created:
+        counters.booking_created(instance)
+        analytics.record_booking(instance)
+        if instance.is_cancelled:
+            analytics.record_cancellation(instance)
+    elif instance.is_cancelled and not instance._was_cancelled:
+        counters.booking_cancelled(instance)
+        analytics.record_cancellation(instance)
+    elif instance._was_cancelled and not instance.is_cancelled:
+        counters.booking_uncancelled(instance)
+        analytics.record_uncancellation(instance)
+    instance._was_cancelled = instance.is_cancelled
+
+
+@receiver(post_delete, sender=Booking)
+def booking_deleted(sender, instance, origin=None, **kwargs):
+    # When the whole event is deleted its counters and rollup rows go with it
+    if isinstance(origin, Event):
+        return
+    counters.booking_deleted(instance)
+    analytics.record_booking_deleted(instance)
+
+
+@receiver(post_save, sender=Bookmark)
+def bookmark_saved(sender, instance, created, **kwargs):
+    if created:
+        counters.bookmark_created(instance)
+        analytics.record_bookmark(instance)
+        user_id = instance.user_id
+        transaction.on_commit(lambda: bookmark_cache.invalidate(user_id))
+
+
+@receiver(post_delete, sender=Bookmark)
+def bookmark_deleted(sender, instance, origin=None, **kwargs):
+    user_id = instance.user_id
+    transaction.on_commit(lambda: bookmark_cache.invalidate(user_id))
+    if isinstance(origin, Event):
+        return
+    counters.bookmark_deleted(instance)
+    analytics.record_bookmark_deleted(instance)
@@ -0,0 +1,54 @@
+import logging
+import os
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.storage import default_storage
+from django.utils import timezone
+
+from . import thumbnails
+from .image_hosts import get_image_host
+from .conditional import bump_catalogue
+from .jobs import PermanentJobError, job_handler
+from .models import Event
+from .page_cache import purge_event
+
+logger = logging.getLogger(__name__)
+
+
+@job_handler('upload_event_image')
+def upload_event_image(payload):
+    """Push a locally stored upload to the image host and point the event at it"""
+    path = payload['path']
+    if not default_storage.exists(path):
+        raise PermanentJobError(f'Upload {path} is no longer in storage')
+
+    try:
+        host = get_image_host()
+    except ImproperlyConfigured as e:
+        raise PermanentJobError(str(e)) from e
+
+    with default_storage.open(path, 'rb') as image_file:
+        image_url = host.upload(os.path.basename(path), image_file, payload.get('content_type'))
+
+    Event.objects.filter(pk=payload['event_id']).update(image=image_url, updated_at=timezone.now())
+    bump_catalogue()
+    purge_event(payload['event_id'])
+
+    # The upload is still at hand, so the thumbnails don't have to fetch it back
+    event = Event.objects.filter(pk=payload['event_id']).first()
+    if event is not None:
+        with default_storage.open(path, 'rb') as image_file:
+            thumbnails.generate([event], sources={event.id: image_file.read()})
+    default_storage.delete(path)
+
+
+@job_handler('generate_thumbnails')
+def generate_thumbnails(payload):
+    """Fetch an event's image and store its thumbnails"""
+    event = Event.objects.filter(pk=payload['event_id']).first()
+    if event is None:
+        raise PermanentJobError(f"Event {payload['event_id']} no longer exists")
+    # Fetch failures raise ThumbnailError, which is retried
+    data = thumbnails.fetch(event.image)
+    if not thumbnails.generate([event], sources={event.id: data}):
+        raise PermanentJobError(f'Cannot make thumbnails from {event.image}')
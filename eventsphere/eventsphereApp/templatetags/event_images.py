@@ -0,0 +1,28 @@
+from django import template
+from django.urls import reverse
+from django.utils.html import format_html
+
+from eventsphereApp import thumbnails
+
+register = template.Library()
+
+# Card grids: one column on phones, two from sm, three from md
+CARD_SIZES = '(min-width: 768px) 33vw, (min-width: 576px) 50vw, 100vw'
+
+
+@register.simple_tag
+def event_image(event, css_class='card-img-top', alt='Card image', sizes=CARD_SIZES):
+    """The event's image as a <picture> of its thumbnails, or the original when it has none"""
+    webp = thumbnails.srcset(event, 'webp')
+    jpeg = thumbnails.srcset(event, 'jpeg')
+    if not jpeg:
+        return format_html('<img class="{}" src="{}" alt="{}" loading="lazy">', css_class, event.image, alt)
+
+    entry = event.thumbnails
+    fallback = reverse('thumbnail', args=[entry['key'], thumbnails.file_name(entry['widths'][-1], 'jpeg')])
+    webp_source = format_html('<source type="image/webp" srcset="{}" sizes="{}">', webp, sizes) if webp else ''
+    return format_html(
+        '<picture>{}<img class="{} h-auto" src="{}" srcset="{}" sizes="{}" width="{}" height="{}" alt="{}"'
+        ' loading="lazy" decoding="async"></picture>',
+        webp_source, css_class, fallback, jpeg, sizes, entry['width'], entry['height'], alt
+    )
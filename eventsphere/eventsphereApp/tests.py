@@ -1,10 +1,43 @@
-from django.test import TestCase, Client
+from django.test import TestCase, Client, override_settings
+from django.http import QueryDict
 from django.contrib.auth.models import User
-from eventpassApp.models import Event, Booking, Bookmark
+from eventsphereApp import metrics as request_metrics
+from eventsphereApp import views
+from eventsphereApp.bookings import release_seats
+from eventsphereApp.checkin import event_key, parse_token, ticket_token
+from eventsphereApp.db_pool import ConnectionPool, PoolTimeout
+from eventsphereApp.db_router import PIN_COOKIE, ReplicaRouter, use_primary, use_replica
+from eventsphereApp import bookmark_cache, facets, recommendations, thumbnails
+from eventsphereApp.page_cache import purge_event
+from eventsphereApp.logs import JsonFormatter, QueueHandler, RequestIdFilter, SamplingFilter
+from eventpassApp.models import Event, Booking, Bookmark, EventDailyStats, EventRecommendation, Job, Ticket
 from datetime import timedelta
+from io import StringIO
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.conf import settings
+from django.db import connection
+from django.db.models import Sum
+from django.test.utils import CaptureQueriesContext
+from django.core.files.storage import default_storage
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from asgiref.sync import sync_to_async
+import asyncio
+import logging
+import shutil
+import sqlite3
+import tempfile
+import unittest
 from django.urls import reverse
 from django.utils import timezone
+import base64
+import csv
+import io
 import json
+import os
+from PIL import Image
 
 
 class EventPassTestCase(TestCase):
@@ -13,6 +46,7 @@ class EventPassTestCase(TestCase):
     def setUp(self):
         """Set up test data for all tests"""
         self.client = Client()
+        cache.clear()
         
         # Create test users
         self.organizer = User.objects.create_user(
@@ -90,6 +124,32 @@ class EventTests(EventPassTestCase):
         self.assertContains(response, 'Test Music Concert')
         self.assertContains(response, 'Test Tech Conference')
     
+    def test_delete_button_needs_no_organizer_queries(self):
+        """Test that the organizer's delete buttons don't load each card's organizer"""
+        self.client.login(username='organizer@test.com', password='testpass123')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/events/')
+        self.assertContains(response, f'/delete-event/{self.event1.id}/')
+        user_queries = [q for q in queries.captured_queries if 'FROM "auth_user"' in q['sql']]
+        # Only the session's user
+        self.assertEqual(len(user_queries), 1)
+    
+    def test_event_can_be_deleted_once_every_booking_is_cancelled(self):
+        """Test that only active bookings block deleting an event"""
+        self.client.login(username='attendee@test.com', password='testpass123')
+        self.client.get(f'/buy-ticket/?id={self.event1.id}&quantity=2')
+        booking = Booking.objects.filter(event_id=self.event1).first()
+        
+        self.client.login(username='organizer@test.com', password='testpass123')
+        self.client.get(f'/delete-event/{self.event1.id}/')
+        self.assertTrue(Event.objects.filter(id=self.event1.id).exists())
+        
+        self.client.login(username='attendee@test.com', password='testpass123')
+        self.client.post(f'/cancel-ticket/{booking.id}/', {'quantity': 2})
+        self.client.login(username='organizer@test.com', password='testpass123')
+        self.client.get(f'/delete-event/{self.event1.id}/')
+        self.assertFalse(Event.objects.filter(id=self.event1.id).exists())
+    
     def test_event_detail_page_loads(self):
         """Test that event detail page loads with correct data"""
         response = self.client.get(f'/view-event/?id={self.event1.id}')
@@ -104,6 +164,535 @@ class EventTests(EventPassTestCase):
         self.assertEqual(events.count(), 2)
 
 
+class EventPaginationTests(EventPassTestCase):
+    """Test keyset pagination on the events listing"""
+    
+    def test_first_page_is_newest_first(self):
+        """Test that the first page holds only the newest event"""
+        response = self.client.get('/events/?page_size=1')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context['event_records']), [self.event2])
+        self.assertTrue(response.context['page'].has_next)
+    
+    def test_after_cursor_returns_next_page(self):
+        """Test that following the ?after= token returns the older event"""
+        response = self.client.get('/events/?page_size=1')
+        cursor = response.context['page'].next_cursor
+        
+        response = self.client.get(f'/events/?page_size=1&after={cursor}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context['event_records']), [self.event1])
+        self.assertFalse(response.context['page'].has_next)
+    
+    def test_invalid_cursor_falls_back_to_first_page(self):
+        """Test that a garbage cursor is ignored instead of erroring"""
+        response = self.client.get('/events/?after=not-a-cursor')
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Test Tech Conference')
+    
+    def test_home_page_uses_keyset_pagination(self):
+        """Test that the home page shows the latest events first"""
+        response = self.client.get('/?page_size=1')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context['event_records']), [self.event2])
+        self.assertContains(response, 'See more events')
+
+
+class SearchTests(EventPassTestCase):
+    """Test ranked event search"""
+    
+    def test_search_by_name(self):
+        """Test that name search only matches titles"""
+        response = self.client.get('/search/?query=Concert&search-type=name')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context['event_records']), [self.event1])
+    
+    def test_search_by_location(self):
+        """Test that location search only matches cities"""
+        response = self.client.get('/search/?query=lyon&search-type=location')
+        self.assertEqual(list(response.context['event_records']), [self.event2])
+        
+        response = self.client.get('/search/?query=Concert&search-type=location')
+        self.assertEqual(list(response.context['event_records']), [])
+    
+    def test_search_ranks_title_matches_first(self):
+        """Test that a title match outranks a description-only match"""
+        self.event1.description = 'Doors open before the conference keynote'
+        self.event1.save()
+        
+        response = self.client.get('/search/?query=conference')
+        self.assertEqual(list(response.context['event_records']), [self.event2, self.event1])
+    
+    def test_search_index_follows_edits(self):
+        """Test that renamed and deleted events are reindexed"""
+        with self.captureOnCommitCallbacks(execute=True):
+            self.event1.title = 'Renamed Opera Night'
+            self.event1.save()
+        response = self.client.get('/search/?query=opera')
+        self.assertEqual(list(response.context['event_records']), [self.event1])
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            self.event1.delete()
+        response = self.client.get('/search/?query=opera')
+        self.assertEqual(list(response.context['event_records']), [])
+    
+    def test_short_query_falls_back_to_substring(self):
+        """Test that queries shorter than a trigram still match"""
+        response = self.client.get('/search/?query=ly&search-type=location')
+        self.assertEqual(list(response.context['event_records']), [self.event2])
+
+
+
+class FacetedSearchTests(EventPassTestCase):
+    """Test facet filters and counts on the search page"""
+    
+    def setUp(self):
+        super().setUp()
+        self.event3 = Event.objects.create(
+            title='Paris Jazz Night', city='Paris', user_id=self.organizer,
+            starts_at=self.event1.starts_at + timedelta(days=1), ends_at=self.event1.ends_at + timedelta(days=1),
+            address='5 Rue Test', pincode=75002, category='Music', description='Jazz', ticket_price=0
+        )
+    
+    def facet(self, response, name):
+        group = next(group for group in response.context['facets'] if group['name'] == name)
+        return {value['label']: value['count'] for value in group['values']}
+    
+    def test_filters_by_category_and_city(self):
+        """Test that facet selections narrow the results, soonest first"""
+        response = self.client.get('/search/?category=Music&city=Paris')
+        self.assertEqual(list(response.context['event_records']), [self.event1, self.event3])
+        self.assertEqual(response.context['total_results'], 2)
+        self.assertContains(response, '2 events found')
+    
+    def test_counts_ignore_their_own_selection(self):
+        """Test that picking a category still counts the other categories"""
+        response = self.client.get('/search/?category=Music')
+        self.assertEqual(self.facet(response, 'category'), {'Music': 2, 'Conference': 1})
+        self.assertEqual(self.facet(response, 'city'), {'Paris': 2})
+        self.assertEqual(self.facet(response, 'price'), {'Free': 1, '$26 to $50': 1})
+    
+    def test_price_and_date_ranges(self):
+        """Test that price and date ranges filter, and facet links set them"""
+        response = self.client.get('/search/?price_min=1&price_max=60')
+        self.assertEqual(set(response.context['event_records']), {self.event1})
+        
+        day = self.event2.starts_at.date()
+        response = self.client.get(f'/search/?date_from={day}&date_to={day}')
+        self.assertEqual(list(response.context['event_records']), [self.event2])
+        
+        month = next(group for group in response.context['facets'] if group['name'] == 'month')['values'][0]
+        self.assertIn(f'date_from={day.replace(day=1)}', month['url'])
+    
+    def test_free_band_alone_is_a_search(self):
+        """Test that a search for free events only is not treated as empty"""
+        response = self.client.get('/search/?price_min=0&price_max=0')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context['event_records']), [self.event3])
+    
+    def test_counts_use_one_grouped_query_and_are_cached(self):
+        """Test that a miss runs one facet query plus the results, and a hit only loads the events"""
+        filters, _ = facets.parse_filters(QueryDict('category=Music&city=Paris'))
+        with self.assertNumQueries(2):
+            events, total, groups = facets.search(filters)
+        with self.assertNumQueries(1):
+            self.assertEqual(facets.search(filters)[:2], (events, total))
+    
+    def test_price_edit_refreshes_price_counts(self):
+        """Test that a price-only edit invalidates cached facet counts"""
+        self.assertEqual(self.facet(self.client.get('/search/?city=Paris'), 'price'), {'Free': 1, '$26 to $50': 1})
+        self.event3.ticket_price = 200
+        with self.captureOnCommitCallbacks(execute=True):
+            self.event3.save(update_fields=['ticket_price'])
+        self.assertEqual(
+            self.facet(self.client.get('/search/?city=Paris'), 'price'), {'$26 to $50': 1, 'Over $100': 1}
+        )
+    
+    def test_text_query_combines_with_facets(self):
+        """Test that ranked text search is narrowed by the facets"""
+        response = self.client.get('/search/?query=Test&city=Lyon')
+        self.assertEqual(list(response.context['event_records']), [self.event2])
+        self.assertEqual(self.facet(response, 'city'), {'Paris': 1, 'Lyon': 1})
+
+class FailingImageHost:
+    """Image host stand-in that always fails, for retry tests"""
+    
+    def upload(self, name, file, content_type):
+        from eventsphereApp.image_hosts import ImageHostError
+        raise ImageHostError('host is down')
+
+
+class EventImageUploadTests(EventPassTestCase):
+    """Test that image uploads go through the background job queue"""
+    
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        media = override_settings(
+            MEDIA_ROOT=self.media_root,
+            IMAGE_HOST_BACKEND='eventsphereApp.image_hosts.LocalImageHost'
+        )
+        media.enable()
+        self.addCleanup(media.disable)
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+    
+    def create_event_with_image(self):
+        self.client.login(username='organizer@test.com', password='testpass123')
+        return self.client.post('/create-event/', {
+            'event-title': 'Upload Test Gala',
+            'event-type': 'Music',
+            'location-address': '1 Gala Street',
+            'location-city': 'Nice',
+            'location-pincode': '06000',
+            'start-date-time': '2030-05-01T19:00',
+            'end-date-time': '2030-05-01T23:00',
+            'event-description': 'Gala with an uploaded poster',
+            'ticket-price': '20',
+            'image-upload': SimpleUploadedFile('poster.png', b'fake-image-bytes', content_type='image/png'),
+        })
+    
+    def test_create_event_queues_upload_and_uses_default_image(self):
+        """Test that createEvent returns before the image is uploaded"""
+        response = self.create_event_with_image()
+        self.assertEqual(response.status_code, 302)
+        
+        event = Event.objects.get(title='Upload Test Gala')
+        self.assertIn('goodmedicinemusic', event.image)
+        job = Job.objects.get(kind='upload_event_image')
+        self.assertEqual(job.status, Job.PENDING)
+        self.assertEqual(job.payload['event_id'], event.id)
+        self.assertTrue(default_storage.exists(job.payload['path']))
+    
+    def test_worker_uploads_image_and_swaps_it_in(self):
+        """Test that run_workers uploads the file and updates Event.image"""
+        self.create_event_with_image()
+        job = Job.objects.get(kind='upload_event_image')
+        
+        call_command('run_workers', '--once', stdout=StringIO())
+        
+        job.refresh_from_db()
+        event = Event.objects.get(title='Upload Test Gala')
+        self.assertEqual(job.status, Job.DONE)
+        self.assertTrue(event.image.startswith('/media/event_images/'))
+        self.assertFalse(default_storage.exists(job.payload['path']))
+    
+    @override_settings(IMAGE_HOST_BACKEND='eventsphereApp.tests.FailingImageHost', JOB_MAX_ATTEMPTS=2)
+    def test_failed_upload_is_retried_with_backoff_then_fails(self):
+        """Test that a failing upload is rescheduled, then marked failed"""
+        self.create_event_with_image()
+        job = Job.objects.get(kind='upload_event_image')
+        
+        call_command('run_workers', '--once', stdout=StringIO())
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.PENDING)
+        self.assertEqual(job.attempts, 1)
+        self.assertGreater(job.run_after, timezone.now())
+        self.assertIn('host is down', job.last_error)
+        
+        Job.objects.filter(pk=job.pk).update(run_after=timezone.now())
+        call_command('run_workers', '--once', stdout=StringIO())
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertEqual(job.attempts, 2)
+
+
+
+def image_bytes(width, height, image_format='JPEG'):
+    buffer = io.BytesIO()
+    Image.new('RGB', (width, height), 'teal').save(buffer, image_format)
+    return buffer.getvalue()
+
+
+@override_settings(THUMBNAIL_WORKERS=0, THUMBNAIL_WIDTHS=[320, 640, 960])
+class ThumbnailTests(EventPassTestCase):
+    """Test the event image thumbnail pipeline"""
+    
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        media = override_settings(
+            MEDIA_ROOT=self.media_root,
+            IMAGE_HOST_BACKEND='eventsphereApp.image_hosts.LocalImageHost'
+        )
+        media.enable()
+        self.addCleanup(media.disable)
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+    
+    def use_local_image(self, event, width=1600, height=1000):
+        path = default_storage.save(f'sources/{event.id}.jpg', ContentFile(image_bytes(width, height)))
+        event.image = default_storage.url(path)
+        event.save()
+    
+    def test_generate_stores_every_size_and_format(self):
+        """Test that each width is stored as WebP and JPEG and recorded on the event"""
+        self.use_local_image(self.event1)
+        stored = thumbnails.generate([self.event1])
+        
+        self.event1.refresh_from_db()
+        entry = self.event1.thumbnails
+        self.assertEqual(stored, {self.event1.id: entry})
+        self.assertEqual(entry['widths'], [320, 640, 960])
+        self.assertEqual((entry['width'], entry['height']), (960, 600))
+        self.assertEqual(
+            sorted(os.listdir(thumbnails.set_path(entry['key']))),
+            ['320.jpg', '320.webp', '640.jpg', '640.webp', '960.jpg', '960.webp']
+        )
+    
+    def test_small_images_are_not_upscaled(self):
+        """Test that a source narrower than every width keeps its own size"""
+        self.use_local_image(self.event1, width=200, height=100)
+        entry = thumbnails.generate([self.event1])[self.event1.id]
+        self.assertEqual(entry['widths'], [200])
+    
+    def test_cards_use_srcset_once_generated(self):
+        """Test that listing cards switch from the original to the thumbnails"""
+        self.use_local_image(self.event1)
+        self.assertNotContains(self.client.get('/events/'), 'srcset')
+        
+        thumbnails.generate([self.event1])
+        response = self.client.get('/events/')
+        self.assertContains(response, '<source type="image/webp"')
+        self.assertContains(response, ' 640w')
+        self.assertContains(response, self.event2.image)
+    
+    def test_changed_image_falls_back_to_original(self):
+        """Test that thumbnails of a replaced image are not shown"""
+        self.use_local_image(self.event1)
+        thumbnails.generate([self.event1])
+        self.event1.refresh_from_db()
+        self.event1.image = 'https://example.com/new.jpg'
+        self.event1.save()
+        self.assertEqual(thumbnails.srcset(self.event1, 'jpeg'), '')
+    
+    def test_thumbnail_view_serves_immutable_files(self):
+        """Test that stored files are served with a long-lived cache header"""
+        self.use_local_image(self.event1)
+        key = thumbnails.generate([self.event1])[self.event1.id]['key']
+        
+        response = self.client.get(f'/thumbnails/{key}/320.webp')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/webp')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(Image.open(io.BytesIO(b''.join(response.streaming_content))).width, 320)
+        self.assertEqual(self.client.get(f'/thumbnails/{key}/321.webp').status_code, 404)
+        self.assertEqual(self.client.get('/thumbnails/..%2F..%2Fsettings/320.jpg').status_code, 404)
+    
+    def test_lost_set_redirects_to_original_and_is_queued(self):
+        """Test that a set deleted from disk falls back and is regenerated once"""
+        self.use_local_image(self.event1)
+        key = thumbnails.generate([self.event1])[self.event1.id]['key']
+        shutil.rmtree(thumbnails.set_path(key))
+        
+        response = self.client.get(f'/thumbnails/{key}/320.jpg')
+        self.assertRedirects(response, self.event1.image, fetch_redirect_response=False)
+        self.client.get(f'/thumbnails/{key}/640.jpg')
+        self.assertEqual(Job.objects.filter(kind='generate_thumbnails').count(), 1)
+        
+        call_command('run_workers', '--once', stdout=StringIO())
+        self.assertEqual(self.client.get(f'/thumbnails/{key}/320.jpg').status_code, 200)
+    
+    def test_least_recently_used_sets_are_evicted(self):
+        """Test that going over the disk budget drops the oldest set and clears its event"""
+        self.use_local_image(self.event1)
+        old_key = thumbnails.generate([self.event1])[self.event1.id]['key']
+        os.utime(thumbnails.set_path(old_key), (0, 0))
+        
+        self.use_local_image(self.event2, width=1700)
+        with override_settings(THUMBNAIL_DISK_BUDGET=1):
+            new_key = thumbnails.generate([self.event2])[self.event2.id]['key']
+        
+        self.assertFalse(os.path.exists(thumbnails.set_path(old_key)))
+        self.assertTrue(os.path.exists(thumbnails.set_path(new_key)))
+        self.event1.refresh_from_db()
+        self.assertEqual(self.event1.thumbnails, {})
+    
+    def test_generate_command_backfills_missing_thumbnails(self):
+        """Test that generate_thumbnails only processes events without a current set"""
+        self.use_local_image(self.event1)
+        self.use_local_image(self.event2)
+        thumbnails.generate([self.event1])
+        
+        out = StringIO()
+        call_command('generate_thumbnails', stdout=out)
+        self.assertIn('Created thumbnails for 1 events', out.getvalue())
+        self.event2.refresh_from_db()
+        self.assertEqual(self.event2.thumbnails['widths'], [320, 640, 960])
+    
+    def test_upload_job_makes_thumbnails_from_the_upload(self):
+        """Test that upload_event_image resizes the uploaded file before deleting it"""
+        self.client.login(username='organizer@test.com', password='testpass123')
+        self.client.post('/create-event/', {
+            'event-title': 'Poster Night',
+            'event-type': 'Music',
+            'location-address': '1 Gala Street',
+            'location-city': 'Nice',
+            'location-pincode': '06000',
+            'start-date-time': '2030-05-01T19:00',
+            'end-date-time': '2030-05-01T23:00',
+            'event-description': 'Gala with an uploaded poster',
+            'ticket-price': '20',
+            'image-upload': SimpleUploadedFile('poster.png', image_bytes(800, 400, 'PNG'), content_type='image/png'),
+        })
+        call_command('run_workers', '--once', stdout=StringIO())
+        
+        event = Event.objects.get(title='Poster Night')
+        self.assertEqual(event.thumbnails['widths'], [320, 640])
+        self.assertEqual(event.thumbnails['source'], event.image)
+    
+    @override_settings(THUMBNAIL_WORKERS=1)
+    def test_resizing_runs_in_process_pool(self):
+        """Test that the process pool produces the same set as resizing inline"""
+        self.use_local_image(self.event1)
+        entry = thumbnails.generate([self.event1])[self.event1.id]
+        self.assertEqual(entry['widths'], [320, 640, 960])
+
+class PageCacheTests(EventPassTestCase):
+    """Test the full-page cache and its purges"""
+    
+    def test_anonymous_pages_are_served_from_cache(self):
+        """Test that a repeat visit is a cache hit with no queries"""
+        first = self.client.get('/events/')
+        self.assertEqual(first['X-Page-Cache'], 'MISS')
+        
+        with self.assertNumQueries(0):
+            second = self.client.get('/events/')
+        self.assertEqual(second['X-Page-Cache'], 'HIT')
+        self.assertEqual(second.content, first.content)
+    
+    def test_query_string_is_normalised(self):
+        """Test that parameter order, blanks and utm_ tags share one entry"""
+        self.client.get('/search/?query=Concert&search-type=name')
+        response = self.client.get('/search/?search-type=name&date=&query=Concert&utm_source=mail')
+        self.assertEqual(response['X-Page-Cache'], 'HIT')
+    
+    def test_logged_in_users_get_their_own_variant(self):
+        """Test that cached pages never leak another user's navbar"""
+        self.client.get('/events/')
+        self.client.login(username='attendee@test.com', password='testpass123')
+        response = self.client.get('/events/')
+        self.assertEqual(response['X-Page-Cache'], 'MISS')
+        self.assertContains(response, 'Jane')
+    
+    def test_creating_and_deleting_events_purges_listings(self):
+        """Test that catalogue pages are purged on create and delete"""
+        self.client.get('/events/')
+        with self.captureOnCommitCallbacks(execute=True):
+            new_event = Event.objects.create(
+                title='Freshly Added Event', city='Paris', user_id=self.organizer,
+                starts_at=timezone.now() + timedelta(days=10), ends_at=timezone.now() + timedelta(days=11),
+                address='1 Street', pincode=75001, category='Music', description='New',
+                image='https://picsum.photos/400/300', ticket_price=10
+            )
+        self.assertContains(self.client.get('/events/'), 'Freshly Added Event')
+        
+        self.client.login(username='organizer@test.com', password='testpass123')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.get(f'/delete-event/{new_event.id}/')
+        self.client.logout()
+        self.assertNotContains(self.client.get('/events/'), 'Freshly Added Event')
+    
+    def test_price_edit_purges_only_that_event(self):
+        """Test that edit_ticket_price purges the event page but not listings"""
+        self.client.get(f'/view-event/?id={self.event1.id}')
+        self.client.get(f'/view-event/?id={self.event2.id}')
+        self.client.get('/events/')
+        
+        self.client.login(username='organizer@test.com', password='testpass123')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/edit-ticket-price/{self.event1.id}/', {'ticket_price': '99'})
+        self.client.logout()
+        
+        response = self.client.get(f'/view-event/?id={self.event1.id}')
+        self.assertEqual(response['X-Page-Cache'], 'MISS')
+        self.assertContains(response, '99')
+        self.assertEqual(self.client.get(f'/view-event/?id={self.event2.id}')['X-Page-Cache'], 'HIT')
+        self.assertEqual(self.client.get('/events/')['X-Page-Cache'], 'HIT')
+    
+    def test_page_state_reports_bookmarks_and_availability(self):
+        """Test that page_state layers per-user bits on cached pages"""
+        Bookmark.objects.create(user=self.attendee, event=self.event1)
+        self.event2.capacity = 10
+        self.event2.save()
+        
+        self.client.login(username='attendee@test.com', password='testpass123')
+        response = self.client.get(f'/page-state/?availability=1&ids={self.event1.id},{self.event2.id}')
+        data = json.loads(response.content)
+        self.assertEqual(data['bookmarked'], [self.event1.id])
+        self.assertEqual(data['availability'][str(self.event2.id)]['seats_left'], 10)
+        self.assertIsNone(data['availability'][str(self.event1.id)]['seats_left'])
+
+
+
+class ConditionalGetTests(EventPassTestCase):
+    """Test ETag and Last-Modified revalidation of event pages"""
+    
+    def test_matching_etag_is_answered_with_one_query(self):
+        """Test that a revalidated event page is a 304 after a single lookup"""
+        url = f'/view-event/?id={self.event1.id}'
+        first = self.client.get(url)
+        self.assertIn('ETag', first)
+        self.assertIn('Last-Modified', first)
+        
+        with self.assertNumQueries(1):
+            second = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(second.status_code, 304)
+        self.assertEqual(second.content, b'')
+    
+    def test_if_modified_since_is_honoured(self):
+        """Test that an unchanged event answers If-Modified-Since with a 304"""
+        url = f'/view-event/?id={self.event1.id}'
+        first = self.client.get(url)
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+    
+    def test_editing_an_event_changes_its_etag(self):
+        """Test that saving an event invalidates its page and the listings"""
+        event_etag = self.client.get(f'/view-event/?id={self.event1.id}')['ETag']
+        listing_etag = self.client.get('/events/')['ETag']
+        
+        self.event1.title = 'Renamed Concert'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.event1.save()
+        
+        response = self.client.get(f'/view-event/?id={self.event1.id}', HTTP_IF_NONE_MATCH=event_etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Renamed Concert')
+        response = self.client.get('/events/', HTTP_IF_NONE_MATCH=listing_etag)
+        self.assertEqual(response.status_code, 200)
+    
+    def test_price_change_keeps_listing_etag(self):
+        """Test that a price-only edit leaves the listing version alone"""
+        listing_etag = self.client.get('/events/')['ETag']
+        self.event1.ticket_price = 75
+        with self.captureOnCommitCallbacks(execute=True):
+            self.event1.save(update_fields=['ticket_price'])
+        
+        response = self.client.get('/events/', HTTP_IF_NONE_MATCH=listing_etag)
+        self.assertEqual(response.status_code, 304)
+    
+    def test_etag_is_per_viewer(self):
+        """Test that a signed-in user can't revalidate against an anonymous copy"""
+        url = f'/view-event/?id={self.event1.id}'
+        anonymous = self.client.get(url)
+        self.assertIn('no-cache', anonymous['Cache-Control'])
+        
+        self.client.login(username='attendee@test.com', password='testpass123')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=anonymous['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], anonymous['ETag'])
+        self.assertIn('private', response['Cache-Control'])
+    
+    def test_bookmarking_changes_bookmarks_etag(self):
+        """Test that toggling a bookmark invalidates the bookmarks page"""
+        self.client.login(username='attendee@test.com', password='testpass123')
+        etag = self.client.get('/bookmarks/')['ETag']
+        self.assertEqual(self.client.get('/bookmarks/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        
+        self.client.post(f'/bookmark/{self.event1.id}/')
+        response = self.client.get('/bookmarks/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Test Music Concert')
+
 class BookingTests(EventPassTestCase):
     """Test booking/ticket functionality"""
     
@@ -136,6 +725,244 @@ class BookingTests(EventPassTestCase):
         self.assertEqual(bookings.count(), 2)
 
 
+class CapacityTests(EventPassTestCase):
+    """Test capacity-aware seat reservation"""
+    
+    def setUp(self):
+        super().setUp()
+        self.event1.capacity = 1
+        self.event1.save()
+    
+    def test_last_seat_cannot_be_oversold(self):
+        """Test that buying past capacity returns a sold out response"""
+        self.client.login(username='organizer@test.com', password='testpass123')
+        self.client.get(f'/buy-ticket/?id={self.event1.id}')
+        
+        self.client.login(username='attendee@test.com', password='testpass123')
+        response = self.client.get(f'/buy-ticket/?id={self.event1.id}', follow=True)
+        self.assertContains(response, 'is sold out')
+        self.assertContains(response, 'Sold Out')
+        self.assertEqual(Booking.objects.filter(event_id=self.event1).count(), 1)
+        
+        self.event1.refresh_from_db()
+        self.assertEqual(self.event1.active_tickets, 1)
+        self.assertEqual(self.event1.tickets_sold, 1)
+    
+    def test_cancelling_releases_the_seat(self):
+        """Test that a cancelled booking frees its seat for the next buyer"""
+        self.client.login(username='organizer@test.com', password='testpass123')
+        self.client.get(f'/buy-ticket/?id={self.event1.id}')
+        booking = Booking.objects.get(event_id=self.event1)
+        self.client.post(f'/cancel-ticket/{booking.id}/')
+        
+        self.client.login(username='attendee@test.com', password='testpass123')
+        self.client.get(f'/buy-ticket/?id={self.event1.id}')
+        self.assertTrue(Booking.objects.filter(
+            event_id=self.event1, user_id=self.attendee, is_cancelled=False
+        ).exists())
+    
+    def test_unlimited_events_have_no_seat_limit(self):
+        """Test that events without a capacity never sell out"""
+        self.assertIsNone(self.event2.seats_left)
+        self.client.login(username='attendee@test.com', password='testpass123')
+        for _ in range(3):
+            self.client.get(f'/buy-ticket/?id={self.event2.id}')
+        self.assertEqual(Booking.objects.filter(event_id=self.event2).count(), 3)
+
+
+class MultiQuantityBookingTests(EventPassTestCase):
+    """Test buying and cancelling several seats at once"""
+    
+    def test_buying_several_tickets_in_one_request(self):
+        """Test that ?quantity= books N seats and records one purchase"""
+        self.client.login(username='attendee@test.com', password='testpass123')
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(f'/buy-ticket/?id={self.event1.id}&quantity=4')
+        
+        self.assertEqual(Booking.objects.filter(event_id=self.event1, user_id=self.attendee).count(), 4)
+        self.assertEqual(Ticket.objects.get(event=self.event1, user=self.attendee).quantity, 4)
+        booking_inserts = [q for q in queries.captured_queries if q['sql'].startswith('INSERT INTO "eventsphereApp_booking"')]
+        self.assertEqual(len(booking_inserts), 1)
+        
+        self.event1.refresh_from_db()
+        self.assertEqual(self.event1.active_tickets, 4)
+        self.assertEqual(EventDailyStats.objects.filter(event=self.event1).aggregate(Sum('revenue'))['revenue__sum'], 200)
+    
+    def test_quantity_larger_than_seats_left_is_rejected(self):
+        """Test that a group purchase is all-or-nothing"""
+        self.event1.capacity = 3
+        self.event1.save()
+        self.client.login(username='attendee@test.com', password='testpass123')
+        response = self.client.get(f'/buy-ticket/?id={self.event1.id}&quantity=4', follow=True)
+        self.assertContains(response, 'is sold out')
+        self.assertFalse(Booking.objects.filter(event_id=self.event1).exists())
+    
+    def test_partial_cancellation(self):
+        """Test that cancel_ticket can cancel part of a group"""
+        self.client.login(username='attendee@test.com', password='testpass123')
+        self.client.get(f'/buy-ticket/?id={self.event1.id}&quantity=5')
+        anchor = Booking.objects.filter(event_id=self.event1).first()
+        
+        self.client.post(f'/cancel-ticket/{anchor.id}/', {'quantity': 3})
+        
+        self.event1.refresh_from_db()
+        self.assertEqual(self.event1.active_tickets, 2)
+        self.assertEqual(self.event1.cancelled_tickets, 3)
+        self.assertTrue(Booking.objects.get(id=anchor.id).is_cancelled)
+        
+        response = self.client.get('/my-tickets/')
+        group = response.context['grouped_tickets'][0]
+        self.assertEqual(group['total_tickets'], 5)
+        self.assertEqual(group['active_tickets'], 2)
+        self.assertEqual(group['cancelled_tickets'], 3)
+    
+    def test_repeated_cancel_releases_no_other_seats(self):
+        """Test that a second submit of the same cancel form leaves the remaining seats alone"""
+        self.client.login(username='attendee@test.com', password='testpass123')
+        self.client.get(f'/buy-ticket/?id={self.event1.id}&quantity=4')
+        anchor = Booking.objects.filter(event_id=self.event1).first()
+        # Both submits loaded the booking before either cancelled it
+        stale = Booking.objects.get(id=anchor.id)
+        
+        self.assertEqual(release_seats(anchor, quantity=2), 2)
+        self.assertEqual(release_seats(stale, quantity=2), 0)
+        self.event1.refresh_from_db()
+        self.assertEqual(self.event1.active_tickets, 2)
+
+
+class MyTicketsTests(EventPassTestCase):
+    """Test the grouped, paginated My Tickets page"""
+    
+    def test_groups_are_aggregated_in_sql(self):
+        """Test counts, cancellability and ordering come from one grouped query"""
+        self.client.login(username='attendee@test.com', password='testpass123')
+        self.client.get(f'/buy-ticket/?id={self.event1.id}&quantity=3')
+        self.client.get(f'/buy-ticket/?id={self.event2.id}&quantity=2')
+        Event.objects.filter(id=self.event1.id).update(starts_at=timezone.now() + timedelta(days=2))
+        
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/my-tickets/')
+        self.assertLessEqual(len(queries.captured_queries), 5)
+        
+        groups = list(response.context['grouped_tickets'])
+        self.assertEqual([g['event_id'] for g in groups], [self.event2.id, self.event1.id])
+        self.assertEqual(groups[0]['total_tickets'], 2)
+        self.assertTrue(groups[0]['can_cancel'])
+        self.assertEqual(groups[1]['active_tickets'], 3)
+        self.assertFalse(groups[1]['can_cancel'])
+    
+    @override_settings(MY_TICKETS_PAGE_SIZE=1)
+    def test_groups_are_paginated(self):
+        """Test that groups are split across pages"""
+        Booking.objects.create(event_id=self.event1, user_id=self.attendee)
+        Booking.objects.create(event_id=self.event2, user_id=self.attendee)
+        self.client.login(username='attendee@test.com', password='testpass123')
+        
+        first = self.client.get('/my-tickets/')
+        second = self.client.get('/my-tickets/?page=2')
+        self.assertEqual([g['event_id'] for g in first.context['grouped_tickets']], [self.event2.id])
+        self.assertEqual([g['event_id'] for g in second.context['grouped_tickets']], [self.event1.id])
+        self.assertContains(first, '?page=2')
+    
+    @override_settings(MY_TICKETS_BOOKINGS_PAGE_SIZE=2)
+    def test_group_bookings_load_lazily(self):
+        """Test that a group's bookings are fetched in pages, and only the user's own"""
+        self.client.login(username='attendee@test.com', password='testpass123')
+        self.client.get(f'/buy-ticket/?id={self.event1.id}&quantity=3')
+        Booking.objects.create(event_id=self.event1, user_id=self.organizer)
+        own = list(Booking.objects.filter(user_id=self.attendee).order_by('-id').values_list('id', flat=True))
+        
+        response = self.client.get('/my-tickets/')
+        self.assertNotContains(response, f'#{own[0]}')
+        
+        response = self.client.get(f'/my-tickets/{self.event1.id}/')
+        self.assertEqual([t.id for t in response.context['page']], own[:2])
+        self.assertContains(response, 'Show more tickets')
+        response = self.client.get(f"/my-tickets/{self.event1.id}/?after={response.context['page'].next_cursor}")
+        self.assertEqual([t.id for t in response.context['page']], own[2:])
+        self.assertNotContains(response, 'Show more tickets')
+
+
+class CheckInTests(EventPassTestCase):
+    """Test signed ticket tokens and batch check-in"""
+    
+    def setUp(self):
+        super().setUp()
+        self.bookings = [Booking.objects.create(event_id=self.event1, user_id=self.attendee) for _ in range(3)]
+        self.client.login(username='organizer@test.com', password='testpass123')
+    
+    def scan(self, tokens, event=None):
+        event = event or self.event1
+        return self.client.post(
+            f'/check-in/{event.id}/', json.dumps({'tokens': tokens}), content_type='application/json'
+        )
+    
+    def test_tokens_verify_without_database(self):
+        """Test that a token round-trips offline and tampering is rejected"""
+        token = ticket_token(self.bookings[0])
+        with self.assertNumQueries(0):
+            self.assertEqual(parse_token(token), (self.event1.id, self.bookings[0].id))
+            forged = f'{self.event1.id}.{self.bookings[1].id}.{token.rsplit(".", 1)[1]}'
+            self.assertIsNone(parse_token(forged))
+            self.assertIsNone(parse_token('not-a-token'))
+    
+    def test_batch_check_in_deduplicates_and_reports_each_scan(self):
+        """Test statuses for new, repeated, cancelled, forged and foreign scans"""
+        first, second, cancelled = self.bookings
+        Booking.objects.filter(id=cancelled.id).update(is_cancelled=True)
+        other = Booking.objects.create(event_id=self.event2, user_id=self.attendee)
+        tokens = [
+            ticket_token(first), ticket_token(first), ticket_token(cancelled),
+            ticket_token(other), 'garbage',
+        ]
+        
+        with CaptureQueriesContext(connection) as queries:
+            response = self.scan(tokens)
+        writes = [q for q in queries.captured_queries if q['sql'].startswith('UPDATE')]
+        self.assertEqual(len(writes), 1)
+        
+        statuses = [result['status'] for result in json.loads(response.content)['results']]
+        self.assertEqual(statuses, ['checked_in', 'duplicate', 'cancelled', 'wrong_event', 'invalid'])
+        self.assertIsNotNone(Booking.objects.get(id=first.id).checked_in_at)
+        self.assertIsNone(Booking.objects.get(id=second.id).checked_in_at)
+        
+        response = self.scan([ticket_token(first), ticket_token(second)])
+        statuses = [result['status'] for result in json.loads(response.content)['results']]
+        self.assertEqual(statuses, ['already_checked_in', 'checked_in'])
+    
+    def test_only_the_organizer_can_check_in(self):
+        """Test that attendees cannot scan or download the manifest"""
+        self.client.login(username='attendee@test.com', password='testpass123')
+        self.assertEqual(self.scan([ticket_token(self.bookings[0])]).status_code, 404)
+        self.assertEqual(self.client.get(f'/check-in/{self.event1.id}/manifest/').status_code, 404)
+    
+    def test_manifest_lists_valid_and_revoked_tickets(self):
+        """Test that the manifest carries the key and ticket states for offline use"""
+        Booking.objects.filter(id=self.bookings[2].id).update(is_cancelled=True)
+        self.scan([ticket_token(self.bookings[0])])
+        
+        data = json.loads(self.client.get(f'/check-in/{self.event1.id}/manifest/').content)
+        self.assertEqual(data['active'], [self.bookings[0].id, self.bookings[1].id])
+        self.assertEqual(data['checked_in'], [self.bookings[0].id])
+        self.assertEqual(data['revoked'], [self.bookings[2].id])
+        self.assertEqual(base64.urlsafe_b64decode(data['key']), event_key(self.event1.id))
+    
+    def test_ticket_page_shows_signed_token_in_one_query(self):
+        """Test that showTicket renders the token with a single lookup"""
+        self.client.login(username='attendee@test.com', password='testpass123')
+        self.client.get('/events/')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f'/ticket/?id={self.bookings[0].id}')
+        self.assertContains(response, ticket_token(self.bookings[0]))
+        booking_queries = [q for q in queries.captured_queries if 'eventsphereApp_booking' in q['sql']]
+        self.assertEqual(len(booking_queries), 1)
+        
+        self.client.login(username='organizer@test.com', password='testpass123')
+        self.assertRedirects(
+            self.client.get(f'/ticket/?id={self.bookings[0].id}'), '/my-tickets', fetch_redirect_response=False
+        )
+
+
 class BookmarkTests(EventPassTestCase):
     """Test bookmark functionality"""
     
@@ -190,6 +1017,49 @@ class BookmarkTests(EventPassTestCase):
         self.assertContains(response, 'Test Music Concert')
 
 
+class BookmarkCacheTests(EventPassTestCase):
+    """Test the per-user bookmark membership cache"""
+    
+    def page_state(self):
+        response = self.client.get(f'/page-state/?ids={self.event1.id},{self.event2.id}')
+        return json.loads(response.content)['bookmarked']
+    
+    def test_warm_cache_answers_without_querying_bookmarks(self):
+        """Test that page_state reads membership from the cache once loaded"""
+        Bookmark.objects.create(user=self.attendee, event=self.event2)
+        self.client.login(username='attendee@test.com', password='testpass123')
+        self.assertEqual(self.page_state(), [self.event2.id])
+        
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.page_state(), [self.event2.id])
+        self.assertFalse(any('eventsphereApp_bookmark' in q['sql'] for q in queries.captured_queries))
+    
+    def test_toggle_invalidates_cache(self):
+        """Test that toggle_bookmark makes the next read see the change"""
+        self.client.login(username='attendee@test.com', password='testpass123')
+        self.assertEqual(self.page_state(), [])
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/bookmark/{self.event1.id}/')
+        self.assertEqual(self.page_state(), [self.event1.id])
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/bookmark/{self.event1.id}/')
+        self.assertEqual(self.page_state(), [])
+    
+    def test_late_fill_from_before_a_toggle_is_ignored(self):
+        """Test that a set read before a bookmark committed can't be cached over it"""
+        self.client.login(username='attendee@test.com', password='testpass123')
+        self.assertEqual(self.page_state(), [])
+        stale_key = f'bookmarks:user:{self.attendee.pk}:0'
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            Bookmark.objects.create(user=self.attendee, event=self.event1)
+        # A reader that loaded the empty set before the commit stores it now
+        cache.set(stale_key, frozenset(), version=bookmark_cache.CACHE_VERSION)
+        self.assertEqual(self.page_state(), [self.event1.id])
+
+
 class MyListedEventsTests(EventPassTestCase):
     """Test My Listed Events functionality"""
     
@@ -234,6 +1104,415 @@ class MyListedEventsTests(EventPassTestCase):
         self.assertContains(response, '$150')
 
 
+class EventCounterTests(EventPassTestCase):
+    """Test the denormalized counters stored on Event"""
+    
+    def test_counters_follow_buy_cancel_and_bookmark(self):
+        """Test that the views keep the Event counters in step"""
+        self.client.login(username='attendee@test.com', password='testpass123')
+        self.client.get(f'/buy-ticket/?id={self.event1.id}')
+        self.client.get(f'/buy-ticket/?id={self.event1.id}')
+        booking = Booking.objects.filter(event_id=self.event1).first()
+        self.client.post(f'/cancel-ticket/{booking.id}/')
+        self.client.post(f'/bookmark/{self.event1.id}/')
+        
+        self.event1.refresh_from_db()
+        self.assertEqual(self.event1.tickets_sold, 2)
+        self.assertEqual(self.event1.active_tickets, 1)
+        self.assertEqual(self.event1.cancelled_tickets, 1)
+        self.assertEqual(self.event1.bookmarks_count, 1)
+        
+        self.client.post(f'/bookmark/{self.event1.id}/')
+        self.event1.refresh_from_db()
+        self.assertEqual(self.event1.bookmarks_count, 0)
+    
+    def test_cancelling_twice_only_moves_counters_once(self):
+        """Test that re-cancelling a booking does not double count"""
+        booking = Booking.objects.create(event_id=self.event1, user_id=self.attendee)
+        self.client.login(username='attendee@test.com', password='testpass123')
+        self.client.post(f'/cancel-ticket/{booking.id}/')
+        self.client.post(f'/cancel-ticket/{booking.id}/')
+        
+        self.event1.refresh_from_db()
+        self.assertEqual(self.event1.active_tickets, 0)
+        self.assertEqual(self.event1.cancelled_tickets, 1)
+    
+    def test_bookings_loaded_without_is_cancelled(self):
+        """Test that deferring is_cancelled costs no query per row and saves still move the counters"""
+        for _ in range(3):
+            Booking.objects.create(event_id=self.event1, user_id=self.attendee)
+        with self.assertNumQueries(1):
+            bookings = list(Booking.objects.only('id', 'event_id'))
+        
+        booking = bookings[0]
+        booking.is_cancelled = True
+        booking.cancelled_at = timezone.now()
+        booking.save()
+        booking.save()
+        self.event1.refresh_from_db()
+        self.assertEqual(self.event1.active_tickets, 2)
+        self.assertEqual(self.event1.cancelled_tickets, 1)
+    
+    def test_reconcile_counters_repairs_drift(self):
+        """Test that reconcile_counters finds and fixes drifted counters"""
+        Booking.objects.create(event_id=self.event1, user_id=self.attendee)
+        Event.objects.filter(id=self.event1.id).update(tickets_sold=7, bookmarks_count=3)
+        
+        out = StringIO()
+        call_command('reconcile_counters', '--dry-run', stdout=out)
+        self.assertIn(f'Event {self.event1.id}: tickets_sold 7 -> 1, bookmarks_count 3 -> 0', out.getvalue())
+        self.event1.refresh_from_db()
+        self.assertEqual(self.event1.tickets_sold, 7)
+        
+        call_command('reconcile_counters', stdout=StringIO())
+        self.event1.refresh_from_db()
+        self.assertEqual(self.event1.tickets_sold, 1)
+        self.assertEqual(self.event1.bookmarks_count, 0)
+    
+    def test_my_listed_events_reads_counters(self):
+        """Test that my_listed_events does not count bookings per event"""
+        Booking.objects.create(event_id=self.event1, user_id=self.attendee)
+        self.client.login(username='organizer@test.com', password='testpass123')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/my-listed-events/')
+        self.assertContains(response, 'View Attendees (1)')
+        self.assertFalse(any('eventsphereApp_booking' in q['sql'] for q in queries.captured_queries))
+
+
+class LoadTestDataTests(EventPassTestCase):
+    """Test the synthetic data generator"""
+    
+    def load(self, *args):
+        call_command(
+            'load_test_data', '--clear', '--users', '30', '--events', '20', '--bookings-per-event', '10',
+            '--bookmarks-per-user', '4', '--batch-size', '50', *args, stdout=StringIO()
+        )
+        return list(Event.objects.order_by('id').values_list('title', 'tickets_sold', 'bookmarks_count'))
+    
+    def test_generates_requested_volume_with_consistent_counters(self):
+        """Test row counts, and that counters and rollup match the inserted rows"""
+        self.load('--seed', '1')
+        self.assertEqual(User.objects.filter(username__endswith='@loadtest.example.com').count(), 30)
+        self.assertEqual(Event.objects.count(), 20)
+        self.assertEqual(Booking.objects.count(), 200)
+        self.assertEqual(Bookmark.objects.count(), 120)
+        out = StringIO()
+        call_command('reconcile_counters', '--dry-run', stdout=out)
+        self.assertIn('All counters are consistent', out.getvalue())
+        self.assertEqual(Event.objects.aggregate(total=Sum('tickets_sold'))['total'], 200)
+        self.assertEqual(EventDailyStats.objects.aggregate(total=Sum('bookings'))['total'], 200)
+    
+    def test_bookings_are_spread_over_time_and_skewed(self):
+        """Test that bookings keep their generated dates and popular events dominate"""
+        events = self.load('--seed', '1')
+        self.assertGreater(Booking.objects.dates('booked_at', 'day').count(), 10)
+        sold = sorted((tickets_sold for _, tickets_sold, _ in events), reverse=True)
+        self.assertGreater(sold[0], 3 * sold[len(sold) // 2])
+    
+    def test_same_seed_gives_same_data(self):
+        """Test that a seed makes the data set reproducible"""
+        self.assertEqual(self.load('--seed', '7'), self.load('--seed', '7'))
+
+
+class BenchmarkViewsTests(EventPassTestCase):
+    """Test the per-route benchmark command"""
+    
+    def test_reports_every_route_for_each_role(self):
+        """Test that each read-only route is measured as every role and writers are skipped"""
+        Booking.objects.create(event_id=self.event1, user_id=self.attendee)
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        with override_settings(MEDIA_ROOT=media_root, THUMBNAIL_WORKERS=0):
+            thumbnails.generate([self.event1], sources={self.event1.id: image_bytes(400, 300)})
+            out = StringIO()
+            call_command(
+                'benchmark_views', '--use-existing', '--iterations', '3', '--warmup', '0', stdout=out, stderr=StringIO()
+            )
+        report = json.loads(out.getvalue())
+        
+        results = {(r['route'], r['role']): r for r in report['results']}
+        self.assertEqual(results[('EventsPage', 'anonymous')]['status'], 200)
+        self.assertEqual(results[('my_listed_events', 'organizer')]['status'], 200)
+        for role in ('anonymous', 'attendee', 'organizer'):
+            self.assertIn(('analytics_dashboard', role), results)
+        self.assertEqual(results[('api_events', 'anonymous')]['status'], 200)
+        self.assertEqual(results[('api_my_tickets', 'attendee')]['status'], 200)
+        self.assertEqual(results[('api_my_tickets', 'anonymous')]['status'], 401)
+        self.assertEqual(results[('event_attendees_export', 'organizer')]['status'], 200)
+        self.assertIn(('metrics', 'anonymous'), results)
+        self.assertEqual(results[('thumbnail', 'anonymous')]['status'], 200)
+        
+        row = results[('my_listed_events', 'organizer')]
+        self.assertLessEqual(row['p50_ms'], row['p95_ms'])
+        self.assertLessEqual(row['p95_ms'], row['p99_ms'])
+        self.assertGreater(row['queries_p50'], 0)
+        self.assertGreater(row['bytes_p50'], 0)
+        self.assertIn('delete_event', report['skipped'])
+        self.assertIn('BuyTicket', report['skipped'])
+        self.assertEqual(Booking.objects.count(), 1)
+
+
+class ConnectionPoolTests(EventPassTestCase):
+    """Test the database connection pool and the connection benchmark"""
+    
+    def make_pool(self, **kwargs):
+        options = {'connect': lambda: sqlite3.connect(':memory:'), 'max_size': 2, 'timeout': 0.05, 'max_idle': 60}
+        options.update(kwargs)
+        pool = ConnectionPool(**options)
+        self.addCleanup(pool.closeall)
+        return pool
+    
+    def test_returned_connections_are_reused(self):
+        """Test that a connection handed back is given out again instead of opening another"""
+        pool = self.make_pool()
+        first = pool.getconn()
+        pool.putconn(first)
+        self.assertIs(pool.getconn(), first)
+        self.assertEqual(pool.stats['opened'], 1)
+        self.assertEqual(pool.stats['reused'], 1)
+        self.assertEqual(pool.in_use, 1)
+    
+    def test_checkout_times_out_when_pool_is_exhausted(self):
+        """Test that max_size bounds the open connections and waiting gives up after the timeout"""
+        pool = self.make_pool()
+        pool.getconn()
+        pool.getconn()
+        with self.assertRaises(PoolTimeout):
+            pool.getconn()
+        self.assertEqual(pool.stats['timeouts'], 1)
+        self.assertEqual(pool.size, 2)
+    
+    def test_unhealthy_and_expired_connections_are_replaced(self):
+        """Test that a connection failing its health check or idle too long is closed, not reused"""
+        pool = self.make_pool(check=lambda conn: conn.execute('SELECT 1'))
+        broken = pool.getconn()
+        broken.close()
+        pool.putconn(broken)
+        replacement = pool.getconn()
+        self.assertIsNot(replacement, broken)
+        self.assertEqual(pool.stats['failed_checks'], 1)
+        
+        pool.max_idle = 0
+        pool.putconn(replacement)
+        self.assertIsNot(pool.getconn(), replacement)
+        self.assertEqual(pool.stats['opened'], 3)
+    
+    def test_discarded_connection_frees_its_slot(self):
+        """Test that a connection dropped on return makes room for a new one"""
+        pool = self.make_pool(max_size=1)
+        conn = pool.getconn()
+        pool.putconn(conn, discard=True)
+        self.assertIsNot(pool.getconn(), conn)
+        self.assertEqual(pool.stats['closed'], 1)
+    
+    def test_benchmark_reports_each_strategy(self):
+        """Test that the benchmark measures fresh, persistent and pooled connections"""
+        out = StringIO()
+        call_command('benchmark_connections', '--iterations', '5', stdout=out)
+        report = json.loads(out.getvalue())
+        self.assertEqual(set(report['results']), {'fresh', 'persistent', 'pooled'})
+        self.assertEqual(set(report['saved_per_request_ms']), {'persistent', 'pooled'})
+        self.assertTrue(report['meta']['health_checks'])
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'])
+class ReplicaRouterTests(EventPassTestCase):
+    """Test which database the replica router picks"""
+    
+    def test_only_replica_blocks_read_from_replicas(self):
+        """Test that reads use a replica inside use_replica() and writes always use the primary"""
+        router = ReplicaRouter()
+        self.assertEqual(router.db_for_read(Event), 'default')
+        with use_replica():
+            self.assertEqual(router.db_for_read(Event), 'replica1')
+            self.assertEqual(router.db_for_write(Event), 'default')
+            with use_primary():
+                self.assertEqual(router.db_for_read(Event), 'default')
+    
+    def test_writes_pin_the_user_to_the_primary(self):
+        """Test that a request that writes sets the pin cookie and a read-only one does not"""
+        self.client.login(username='attendee@test.com', password='testpass123')
+        response = self.client.post(reverse('toggle_bookmark', args=[self.event1.id]))
+        self.assertIn(PIN_COOKIE, response.cookies)
+        self.assertEqual(response.cookies[PIN_COOKIE]['max-age'], settings.REPLICA_LAG_WINDOW)
+        
+        with use_primary():
+            response = self.client.get('/my-tickets/')
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+
+# A separate database that never replicates, so reads show whether they hit it
+STANDIN_REPLICA = 'replica1' in settings.DATABASES and not settings.DATABASES['replica1']['TEST'].get('MIRROR')
+
+
+@unittest.skipUnless(STANDIN_REPLICA, "needs a 'replica1' database that is not a TEST MIRROR")
+@override_settings(DATABASE_REPLICAS=['replica1'], PAGE_CACHE_ENABLED=False)
+class ReplicaRoutingTests(EventPassTestCase):
+    """Test read-heavy views against a stand-in replica"""
+    
+    databases = {'default', 'replica1'} if STANDIN_REPLICA else {'default'}
+    
+    def setUp(self):
+        super().setUp()
+        # Copy the fixtures, then change the primary so the replica is behind
+        for user in (self.organizer, self.attendee):
+            user.save(using='replica1')
+        self.event1.save(using='replica1')
+        Event.objects.filter(id=self.event1.id).update(title='Renamed On Primary')
+    
+    def test_read_views_use_the_replica(self):
+        """Test that catalogue and organizer pages render what the replica has"""
+        for path in ('/events/', f'/view-event/?id={self.event1.id}', '/search/?query=Music'):
+            response = self.client.get(path)
+            self.assertContains(response, 'Test Music Concert')
+            self.assertNotContains(response, 'Renamed On Primary')
+        
+        Booking.objects.create(event_id=self.event1, user_id=self.attendee)
+        self.client.login(username='organizer@test.com', password='testpass123')
+        response = self.client.get(f'/event-attendees/{self.event1.id}/')
+        self.assertNotContains(response, 'Jane')
+    
+    def test_reads_after_a_write_stay_on_the_primary(self):
+        """Test read-your-writes: after a booking the user's reads skip the replica until the pin expires"""
+        self.client.login(username='attendee@test.com', password='testpass123')
+        self.client.get(f'/buy-ticket/?id={self.event1.id}')
+        self.assertContains(self.client.get('/events/'), 'Renamed On Primary')
+        
+        self.client.cookies[PIN_COOKIE] = '0'
+        self.assertContains(self.client.get('/events/'), 'Test Music Concert')
+    
+    @override_settings(PAGE_CACHE_ENABLED=True)
+    def test_page_cache_refills_from_the_primary_after_a_purge(self):
+        """Test that a page missed right after a purge is rendered from the primary, not a lagging replica"""
+        purge_event(self.event1.id)
+        self.assertContains(self.client.get('/events/'), 'Renamed On Primary')
+
+
+class AsyncViewTests(EventPassTestCase):
+    """Test the async views through the ASGI request handler"""
+    
+    def test_io_bound_views_are_coroutines(self):
+        """Test that decorated async views stay coroutine functions, so Django awaits them"""
+        for view in (views.eventsPage, views.searchResults, views.viewEvent, views.createEvent, views.toggle_bookmark):
+            self.assertTrue(asyncio.iscoroutinefunction(view), view.__name__)
+    
+    async def test_catalogue_pages_render(self):
+        """Test that listing, search and event pages render under ASGI and keep the request id"""
+        response = await self.async_client.get('/events/', headers={'X-Request-ID': 'async-1'})
+        self.assertContains(response, 'Test Music Concert')
+        self.assertEqual(response['X-Request-ID'], 'async-1')
+        
+        response = await self.async_client.get('/search/', {'query': 'Music'})
+        self.assertContains(response, 'Test Music Concert')
+        
+        response = await self.async_client.get('/view-event/', {'id': self.event1.id})
+        self.assertContains(response, 'John')
+    
+    async def test_toggle_bookmark(self):
+        """Test that bookmarks toggle under ASGI and that the async decorators still guard the view"""
+        path = f'/bookmark/{self.event1.id}/'
+        response = await self.async_client.post(path)
+        self.assertEqual(response.status_code, 302)
+        
+        await sync_to_async(self.async_client.force_login)(self.attendee)
+        self.assertEqual((await self.async_client.get(path)).status_code, 405)
+        response = await self.async_client.post(path)
+        self.assertEqual(json.loads(response.content), {'bookmarked': True})
+        self.assertTrue(await Bookmark.objects.filter(user=self.attendee, event=self.event1).aexists())
+        
+        response = await self.async_client.post(f'/bookmark/{self.event1.id + 1000}/')
+        self.assertEqual(response.status_code, 404)
+
+
+
+class ApiTests(EventPassTestCase):
+    """Test the read-only JSON API"""
+    
+    def test_events_are_paginated_with_a_cursor(self):
+        """Test that the events list pages newest first and links the next page"""
+        response = self.client.get('/api/v1/events/?page_size=1')
+        data = response.json()
+        self.assertEqual([event['id'] for event in data['results']], [self.event2.id])
+        self.assertEqual(data['results'][0]['title'], 'Test Tech Conference')
+        
+        data = self.client.get(data['next']).json()
+        self.assertEqual([event['id'] for event in data['results']], [self.event1.id])
+        self.assertIsNone(data['next'])
+    
+    def test_sparse_fields_load_only_their_columns(self):
+        """Test that ?fields= limits both the JSON and the columns selected"""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/v1/events/?fields=title,seats_left')
+        self.assertEqual(response.json()['results'][0], {'title': 'Test Tech Conference', 'seats_left': None})
+        sql = queries.captured_queries[-1]['sql']
+        self.assertIn('"active_tickets"', sql)
+        self.assertNotIn('"description"', sql)
+        
+        response = self.client.get('/api/v1/events/?fields=title,secret')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('secret', response.json()['error'])
+    
+    def test_event_and_availability(self):
+        """Test the event detail and its seats, with JSON 404s"""
+        self.event1.capacity = 3
+        self.event1.save()
+        Booking.objects.create(event_id=self.event1, user_id=self.attendee)
+        
+        data = self.client.get(f'/api/v1/events/{self.event1.id}/?fields=id,url').json()
+        self.assertEqual(data, {'id': self.event1.id, 'url': f'/view-event/?id={self.event1.id}'})
+        data = self.client.get(f'/api/v1/events/{self.event1.id}/availability/').json()
+        self.assertEqual(data['seats_left'], 2)
+        self.assertFalse(data['sold_out'])
+        
+        response = self.client.get(f'/api/v1/events/{self.event2.id + 1000}/')
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json(), {'error': 'Not found'})
+    
+    def test_my_endpoints_need_a_session(self):
+        """Test that tickets and bookmarks answer 401 instead of redirecting"""
+        for path in ('/api/v1/me/tickets/', '/api/v1/me/bookmarks/'):
+            response = self.client.get(path)
+            self.assertEqual(response.status_code, 401)
+            self.assertIn('error', response.json())
+    
+    def test_my_tickets_and_bookmarks(self):
+        """Test that the user sees only their own tickets, with tokens on request"""
+        booking = Booking.objects.create(event_id=self.event1, user_id=self.attendee)
+        Booking.objects.create(event_id=self.event1, user_id=self.organizer)
+        Bookmark.objects.create(user=self.attendee, event=self.event2)
+        self.client.login(username='attendee@test.com', password='testpass123')
+        
+        data = self.client.get('/api/v1/me/tickets/?fields=id,token').json()
+        self.assertEqual(data['results'], [{'id': booking.id, 'token': ticket_token(booking)}])
+        
+        data = self.client.get('/api/v1/me/bookmarks/?fields=id,city').json()
+        self.assertEqual(data['results'][0]['event'], {'id': self.event2.id, 'city': 'Lyon'})
+    
+    def test_sparse_tickets_page_is_one_query(self):
+        """Test that a sparse ticket page doesn't load fields row by row"""
+        for _ in range(5):
+            Booking.objects.create(event_id=self.event1, user_id=self.attendee)
+        self.client.login(username='attendee@test.com', password='testpass123')
+        self.client.get('/api/v1/me/tickets/')
+        # The session and its user, then the page
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/v1/me/tickets/?fields=id,event_id,token')
+        self.assertEqual(len(response.json()['results']), 5)
+    
+    def test_responses_are_gzipped_and_read_only(self):
+        """Test that gzip is applied when accepted and that writes are refused"""
+        for i in range(10):
+            Event.objects.create(
+                title=f'Gzip Event {i}', city='Paris', user_id=self.organizer,
+                starts_at=self.event1.starts_at, ends_at=self.event1.ends_at,
+                address='1 Test Street', pincode=75001, category='Music', description='x', ticket_price=10
+            )
+        response = self.client.get('/api/v1/events/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        
+        self.assertEqual(self.client.post('/api/v1/events/').status_code, 405)
+
 class EventAttendeesTests(EventPassTestCase):
     """Test event attendees page"""
     
@@ -252,6 +1531,80 @@ class EventAttendeesTests(EventPassTestCase):
         self.client.login(username='attendee@test.com', password='testpass123')
         response = self.client.get(f'/event-attendees/{self.event1.id}/')
         self.assertEqual(response.status_code, 404)  # Should return 404
+    
+    @override_settings(ATTENDEES_PAGE_SIZE=2)
+    def test_attendees_page_is_paginated(self):
+        """Test that the list shows one page, with totals from the counters"""
+        bookings = [Booking.objects.create(event_id=self.event1, user_id=self.attendee) for _ in range(3)]
+        
+        self.client.login(username='organizer@test.com', password='testpass123')
+        response = self.client.get(f'/event-attendees/{self.event1.id}/')
+        self.assertEqual([b.id for b in response.context['page']], [bookings[2].id, bookings[1].id])
+        self.assertContains(response, 'Total Attendees: 3')
+        self.assertContains(response, '$150')
+        
+        response = self.client.get(f'/event-attendees/{self.event1.id}/?after={response.context["page"].next_cursor}')
+        self.assertEqual([b.id for b in response.context['page']], [bookings[0].id])
+        self.assertFalse(response.context['page'].has_next)
+
+
+class AttendeeExportTests(EventPassTestCase):
+    """Test the streamed attendee export"""
+    
+    def setUp(self):
+        super().setUp()
+        self.bookings = [Booking.objects.create(event_id=self.event1, user_id=self.attendee) for _ in range(3)]
+        self.url = f'/event-attendees/{self.event1.id}/export/'
+    
+    def test_csv_export_streams_every_booking(self):
+        """Test that the CSV has a header and one row per booking, oldest first"""
+        self.client.login(username='organizer@test.com', password='testpass123')
+        with override_settings(ATTENDEE_EXPORT_CHUNK_SIZE=2):
+            response = self.client.get(self.url)
+            self.assertTrue(response.streaming)
+            content = b''.join(response.streaming_content).decode()
+        
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertIn('attachment', response['Content-Disposition'])
+        rows = list(csv.reader(io.StringIO(content)))
+        self.assertEqual(rows[0][0], 'booking_id')
+        self.assertEqual([int(row[0]) for row in rows[1:]], [b.id for b in self.bookings])
+        self.assertEqual(rows[1][1:4], ['Jane', 'Attendee', 'attendee@test.com'])
+    
+    def test_jsonl_export(self):
+        """Test that JSONL has one object per booking"""
+        self.bookings[0].is_cancelled = True
+        self.bookings[0].save()
+        self.client.login(username='organizer@test.com', password='testpass123')
+        response = self.client.get(self.url, {'format': 'jsonl'})
+        records = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        
+        self.assertEqual(len(records), 3)
+        self.assertEqual(records[0]['status'], 'cancelled')
+        self.assertEqual(records[1]['ticket_price'], 50)
+    
+    def test_csv_cells_cannot_become_formulas(self):
+        """Test that names starting with = are escaped for spreadsheet apps"""
+        self.attendee.first_name = '=HYPERLINK("http://evil")'
+        self.attendee.save()
+        self.client.login(username='organizer@test.com', password='testpass123')
+        content = b''.join(self.client.get(self.url).streaming_content).decode()
+        self.assertIn("'=HYPERLINK", content)
+    
+    def test_only_the_organizer_can_export(self):
+        """Test that other users get a 404 and unknown formats a 400"""
+        self.client.login(username='attendee@test.com', password='testpass123')
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+        self.client.login(username='organizer@test.com', password='testpass123')
+        self.assertEqual(self.client.get(self.url, {'format': 'xlsx'}).status_code, 400)
+    
+    async def test_asgi_export_streams_asynchronously(self):
+        """Test that ASGI requests get an async iterator, which Django streams without buffering"""
+        await sync_to_async(self.async_client.force_login)(self.organizer)
+        response = await self.async_client.get(self.url)
+        self.assertTrue(response.is_async)
+        content = b''.join([chunk async for chunk in response.streaming_content]).decode()
+        self.assertEqual(len(content.splitlines()), 4)
 
 
 class EventBookmarksListTests(EventPassTestCase):
@@ -312,6 +1665,64 @@ class AnalyticsDashboardTests(EventPassTestCase):
         self.assertContains(response, 'No data to display the results')
 
 
+class DailyStatsRollupTests(EventPassTestCase):
+    """Test the incrementally maintained analytics rollup"""
+    
+    def totals(self, event):
+        return EventDailyStats.objects.filter(event=event).aggregate(
+            bookings=Sum('bookings'),
+            cancellations=Sum('cancellations'),
+            revenue=Sum('revenue'),
+            bookmarks=Sum('bookmarks')
+        )
+    
+    def test_bookings_cancellations_and_bookmarks_are_rolled_up(self):
+        """Test that writes to Booking and Bookmark update the rollup"""
+        booking = Booking.objects.create(event_id=self.event1, user_id=self.attendee)
+        Booking.objects.create(event_id=self.event1, user_id=self.organizer)
+        booking.is_cancelled = True
+        booking.cancelled_at = timezone.now()
+        booking.save()
+        bookmark = Bookmark.objects.create(user=self.attendee, event=self.event1)
+        Bookmark.objects.create(user=self.organizer, event=self.event1)
+        bookmark.delete()
+        
+        self.assertEqual(self.totals(self.event1), {
+            'bookings': 2, 'cancellations': 1, 'revenue': 100, 'bookmarks': 1
+        })
+    
+    def test_rebuild_matches_incremental_rollup(self):
+        """Test that rebuild_analytics reproduces the incremental numbers"""
+        Booking.objects.create(event_id=self.event1, user_id=self.attendee)
+        Booking.objects.create(event_id=self.event2, user_id=self.attendee)
+        Bookmark.objects.create(user=self.attendee, event=self.event2)
+        before = [self.totals(self.event1), self.totals(self.event2)]
+        
+        EventDailyStats.objects.all().delete()
+        call_command('rebuild_analytics', stdout=StringIO())
+        self.assertEqual([self.totals(self.event1), self.totals(self.event2)], before)
+    
+    def test_dashboard_query_count_does_not_grow_with_events(self):
+        """Test that the dashboard runs a fixed number of queries"""
+        self.client.login(username='organizer@test.com', password='testpass123')
+        with CaptureQueriesContext(connection) as few_events:
+            self.client.get('/analytics-dashboard/')
+        
+        for i in range(5):
+            event = Event.objects.create(
+                title=f'Extra Event {i}', city='Paris', user_id=self.organizer,
+                starts_at=timezone.now() + timedelta(days=10), ends_at=timezone.now() + timedelta(days=11),
+                address='1 Street', pincode=75001, category='Music', description='Extra',
+                image='https://picsum.photos/400/300', ticket_price=10
+            )
+            Booking.objects.create(event_id=event, user_id=self.attendee)
+        
+        with CaptureQueriesContext(connection) as many_events:
+            response = self.client.get('/analytics-dashboard/')
+        self.assertContains(response, '$50')
+        self.assertEqual(len(many_events), len(few_events))
+
+
 class EditTicketPriceTests(EventPassTestCase):
     """Test ticket price editing"""
     
@@ -357,4 +1768,269 @@ class ModelTests(EventPassTestCase):
         # Try to create duplicate - should raise IntegrityError
         from django.db import IntegrityError
         with self.assertRaises(IntegrityError):
-            Bookmark.objects.create(user=self.attendee, event=self.event1)
\ No newline at end of file
+            Bookmark.objects.create(user=self.attendee, event=self.event1)
+
+
+@override_settings(METRICS_TOKEN='scrape-secret', METRICS_DIR='')
+class MetricsTests(EventPassTestCase):
+    """Test request metrics and the /metrics endpoint"""
+    
+    def setUp(self):
+        super().setUp()
+        request_metrics.registry.reset()
+    
+    def scrape(self):
+        return self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer scrape-secret').content.decode()
+    
+    def test_metrics_require_token_or_staff(self):
+        """Test that /metrics is hidden from anonymous and regular users"""
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+        self.client.login(username='attendee@test.com', password='testpass123')
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        User.objects.filter(username='attendee@test.com').update(is_staff=True)
+        self.assertEqual(self.client.get('/metrics').status_code, 200)
+    
+    def test_requests_are_recorded_per_view(self):
+        """Test request counts, latency histogram, query and byte totals per url name"""
+        self.client.get('/events/')
+        self.client.get('/events/')
+        self.client.get(f'/view-event/?id={self.event1.id}')
+        body = self.scrape()
+        
+        self.assertIn('eventsphere_http_requests_total{view="EventsPage",method="GET",status="200"} 2', body)
+        self.assertIn('eventsphere_http_request_duration_seconds_count{view="EventsPage"} 2', body)
+        self.assertIn('eventsphere_http_request_duration_seconds_bucket{view="EventsPage",le="+Inf"} 2', body)
+        self.assertIn('eventsphere_db_queries_per_request_count{view="ViewEvent"} 1', body)
+        self.assertIn('eventsphere_db_query_seconds_total{view="ViewEvent"}', body)
+        self.assertIn('eventsphere_http_response_bytes_total{view="EventsPage"}', body)
+    
+    def test_streamed_bytes_are_counted(self):
+        """Test that a streamed export without Content-Length records the bytes it sent"""
+        Booking.objects.create(event_id=self.event1, user_id=self.attendee)
+        self.client.login(username='organizer@test.com', password='testpass123')
+        response = self.client.get(f'/event-attendees/{self.event1.id}/export/', {'format': 'csv'})
+        body = b''.join(response.streaming_content)
+        response.close()
+        self.assertIn(f'eventsphere_http_response_bytes_total{{view="event_attendees_export"}} {len(body)}\n', self.scrape())
+    
+    async def test_async_requests_count_their_queries(self):
+        """Test that queries run by the ORM's worker threads are counted for async views"""
+        await self.async_client.get('/events/')
+        body = await sync_to_async(self.scrape)()
+        self.assertIn('eventsphere_db_queries_per_request_count{view="EventsPage"} 1', body)
+        # The one request is not in the zero-queries bucket
+        self.assertIn('eventsphere_db_queries_per_request_bucket{view="EventsPage",le="0.0"} 0', body)
+        self.assertNotIn('eventsphere_db_query_seconds_total{view="EventsPage"} 0.0\n', body)
+    
+    def test_snapshots_from_every_worker_are_summed(self):
+        """Test that /metrics adds up the snapshots other worker processes wrote"""
+        metrics_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, metrics_dir)
+        with open(f'{metrics_dir}/99999.json', 'w') as other_worker:
+            json.dump({'requests': [[['EventsPage', 'GET', '200'], 5]]}, other_worker)
+        
+        with override_settings(METRICS_DIR=metrics_dir):
+            self.client.get('/events/')
+            body = self.scrape()
+        self.assertIn('eventsphere_http_requests_total{view="EventsPage",method="GET",status="200"} 6', body)
+
+
+class ExplainQueriesTests(EventPassTestCase):
+    """Test the EXPLAIN advisor command"""
+    
+    def explain(self, *args):
+        Booking.objects.create(event_id=self.event1, user_id=self.attendee)
+        Bookmark.objects.create(event=self.event1, user=self.attendee)
+        out = StringIO()
+        call_command('explain_queries', '--json', *args, stdout=out, stderr=StringIO())
+        return json.loads(out.getvalue())
+    
+    def test_hot_path_queries_use_indexes(self):
+        """Test that the booking and bookmark lookups behind user pages avoid full scans"""
+        report = self.explain('--min-rows', '0')
+        routes = {entry['route'] for entry in report}
+        self.assertTrue({'MyTickets', 'my_event_tickets', 'bookmarked_events', 'my_listed_events'} <= routes)
+        export = [entry for entry in report if entry['route'] == 'event_attendees_export']
+        self.assertTrue(any('eventsphereApp_booking' in entry['sql'] for entry in export))
+        for entry in report:
+            if entry['route'] in ('MyTickets', 'my_event_tickets', 'bookmarked_events', 'my_listed_events'):
+                scanned = [issue['table'] for issue in entry['issues'] if issue['kind'] == 'seq_scan']
+                self.assertNotIn('eventsphereApp_booking', scanned, entry['sql'])
+                self.assertNotIn('eventsphereApp_bookmark', scanned, entry['sql'])
+    
+    def test_fail_on_issues(self):
+        """Test that flagged plans fail the command for CI, and small tables are ignored by default"""
+        Booking.objects.create(event_id=self.event1, user_id=self.attendee)
+        call_command('explain_queries', '--route', 'event_attendees', stdout=StringIO())
+        with self.assertRaises(CommandError):
+            call_command(
+                'explain_queries', '--route', 'SearchResults', '--min-rows', '0', '--fail-on-issues',
+                stdout=StringIO()
+            )
+    
+    def test_database_is_left_untouched(self):
+        """Test that requests made while explaining are rolled back"""
+        before = User.objects.filter(last_login__isnull=False).count()
+        self.explain()
+        self.assertEqual(User.objects.filter(last_login__isnull=False).count(), before)
+
+
+class StructuredLoggingTests(EventPassTestCase):
+    """Test request correlation ids, JSON log lines and sampling"""
+    
+    def capture(self, logger_name='eventsphereApp.views'):
+        """Attach a handler with the production filters and formatter, return its list of lines"""
+        lines = []
+        
+        class ListHandler(logging.Handler):
+            def emit(self, record):
+                lines.append(json.loads(self.format(record)))
+        
+        handler = ListHandler()
+        handler.addFilter(RequestIdFilter())
+        handler.addFilter(SamplingFilter())
+        handler.setFormatter(JsonFormatter())
+        logger = logging.getLogger(logger_name)
+        old_level = logger.level
+        logger.addHandler(handler)
+        logger.setLevel(logging.DEBUG)
+        self.addCleanup(logger.removeHandler, handler)
+        self.addCleanup(logger.setLevel, old_level)
+        return lines
+    
+    def test_request_id_is_echoed_or_generated(self):
+        """Test that a sane incoming X-Request-ID is kept and anything else replaced"""
+        response = self.client.get('/events/', HTTP_X_REQUEST_ID='abc-123')
+        self.assertEqual(response['X-Request-ID'], 'abc-123')
+        response = self.client.get('/events/', HTTP_X_REQUEST_ID='bad id\nwith newline')
+        self.assertRegex(response['X-Request-ID'], r'^[0-9a-f]{32}$')
+    
+    def test_log_lines_carry_request_id_and_extra_fields(self):
+        """Test that view log records are JSON with the request's correlation id"""
+        lines = self.capture()
+        response = self.client.get('/events/', HTTP_X_REQUEST_ID='trace-1')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(lines[0]['message'], 'Listed 2 events')
+        self.assertEqual(lines[0]['request_id'], 'trace-1')
+        self.assertEqual(lines[0]['level'], 'DEBUG')
+    
+    @override_settings(LOG_SAMPLE_RATE=0)
+    def test_sampling_drops_debug_but_keeps_warnings(self):
+        """Test that unsampled requests lose DEBUG/INFO lines but never warnings"""
+        lines = self.capture()
+        self.client.get('/events/')
+        self.assertEqual(lines, [])
+        logging.getLogger('eventsphereApp.views').warning('Something odd')
+        self.assertEqual([line['message'] for line in lines], ['Something odd'])
+    
+    def test_queue_handler_drops_instead_of_blocking(self):
+        """Test that a full queue drops records rather than stalling the caller"""
+        handler = QueueHandler(stream=StringIO(), queue_size=1)
+        handler.listener.stop()
+        handler.listener = None
+        record = logging.LogRecord('test', logging.INFO, __file__, 1, 'line %s', ('one',), None)
+        handler.handle(record)
+        handler.handle(record)
+        self.assertEqual(handler.dropped, 1)
+        self.assertEqual(handler.queue.get_nowait().msg, 'line one')
+
+
+class RecommendationTests(EventPassTestCase):
+    """Test the precomputed "you may also like" recommendations"""
+    
+    def setUp(self):
+        super().setUp()
+        self.event3 = Event.objects.create(
+            title='Test Jazz Night', city='Paris', user_id=self.organizer,
+            starts_at=timezone.now() + timedelta(days=40), ends_at=timezone.now() + timedelta(days=40, hours=2),
+            address='1 Test Street', pincode=75001, category='Music', description='Jazz', ticket_price=20
+        )
+        self.fan = User.objects.create_user(username='fan@test.com', password='testpass123', first_name='Fan')
+    
+    def build(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('build_recommendations', stdout=StringIO())
+    
+    def test_similarities_use_cosine_and_skip_rare_pairs(self):
+        """Test the scores, the shared-user threshold and the candidate filter"""
+        similar = recommendations.similarities(
+            [[1, 2, 3], [1, 2], [1, 3, 4], [3]], candidates={1, 2, 3}, per_event=5
+        )
+        # Events 1 and 2 share two users; 1 has three and 2 has two
+        self.assertEqual(similar[2], [(2 / (3 * 2) ** 0.5, 1)])
+        # 2 beats 3, which shares as many users with 1 but has more of its own
+        self.assertEqual([other for _, other in similar[1]], [2, 3])
+        # 4 is not a candidate, and 2 and 3 share only one user
+        self.assertNotIn(4, [other for _, other in similar[3]])
+        self.assertEqual([other for _, other in similar[3]], [1])
+    
+    def test_histories_are_distinct_and_capped(self):
+        """Test that each user's events are deduplicated and limited to the newest"""
+        rows = [(2, 9), (2, 9), (2, 7), (2, 5), (1, 3)]
+        self.assertEqual(list(recommendations.histories(rows, limit=2)), [[9, 7], [3]])
+    
+    def test_rebuild_stores_top_events_from_bookings_and_bookmarks(self):
+        """Test that the command recommends upcoming events that share users"""
+        for user in (self.attendee, self.fan):
+            Booking.objects.create(event_id=self.event1, user_id=user)
+            Bookmark.objects.create(user=user, event=self.event3)
+        # Cancelled bookings don't count
+        Booking.objects.create(event_id=self.event2, user_id=self.attendee, is_cancelled=True)
+        Booking.objects.create(event_id=self.event2, user_id=self.fan, is_cancelled=True)
+        self.build()
+        
+        rows = EventRecommendation.objects.order_by('event_id', 'rank').values_list('event_id', 'recommended_id', 'rank')
+        self.assertEqual(list(rows), [(self.event1.id, self.event3.id, 1), (self.event3.id, self.event1.id, 1)])
+        
+        # A rebuild replaces the table
+        self.build()
+        self.assertEqual(EventRecommendation.objects.count(), 2)
+    
+    def test_past_events_are_not_recommended(self):
+        """Test that only events yet to start are recommended"""
+        self.event3.starts_at = timezone.now() - timedelta(days=1)
+        self.event3.save()
+        for user in (self.attendee, self.fan):
+            Booking.objects.create(event_id=self.event1, user_id=user)
+            Booking.objects.create(event_id=self.event3, user_id=user)
+        self.build()
+        
+        self.assertEqual(list(EventRecommendation.objects.values_list('recommended_id', flat=True)), [self.event1.id])
+    
+    def test_event_page_reads_recommendations_in_one_query(self):
+        """Test that the event page lists similar events and is refreshed by a rebuild"""
+        url = f'/view-event/?id={self.event1.id}'
+        first = self.client.get(url)
+        self.assertNotContains(first, 'You may also like')
+        
+        for user in (self.attendee, self.fan):
+            Booking.objects.create(event_id=self.event1, user_id=user)
+            Booking.objects.create(event_id=self.event3, user_id=user)
+        self.build()
+        with self.assertNumQueries(1):
+            self.assertEqual(list(recommendations.similar_events(self.event1.id)), [self.event3])
+        
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'You may also like')
+        self.assertContains(response, 'Test Jazz Night')
+    
+    def test_profile_recommends_events_like_the_users(self):
+        """Test that the profile suggests similar events the user has not booked or bookmarked"""
+        for user in (self.attendee, self.fan):
+            Booking.objects.create(event_id=self.event1, user_id=user)
+            Bookmark.objects.create(user=user, event=self.event3)
+        Booking.objects.create(event_id=self.event2, user_id=self.attendee)
+        Booking.objects.create(event_id=self.event2, user_id=self.fan)
+        self.build()
+        
+        viewer = User.objects.create_user(username='viewer@test.com', password='testpass123')
+        Booking.objects.create(event_id=self.event1, user_id=viewer)
+        with self.assertNumQueries(1):
+            suggested = list(recommendations.for_user(viewer))
+        self.assertEqual(set(suggested), {self.event2, self.event3})
+        
+        self.client.login(username='fan@test.com', password='testpass123')
+        response = self.client.get('/profile/')
+        self.assertNotContains(response, 'You may also like')
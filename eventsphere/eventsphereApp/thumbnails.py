@@ -0,0 +1,293 @@
+"""
+Locally stored thumbnails for event images.
+
+Event.image can be any remote URL, often a multi-megabyte stock photo.
+generate() fetches each image once and resizes it in a process pool to every
+width in THUMBNAIL_WIDTHS, as WebP and JPEG. The results go under
+MEDIA_ROOT/thumbnails/<key>/. The key hashes the source bytes and the
+resize settings, so a set never changes and the thumbnail view can serve it
+as immutable. Event.thumbnails records the key, the widths that exist and
+the URL the set was made from. Templates use it through the event_image tag
+and fall back to the original when there is no set, or when event.image has
+changed since.
+
+The thumbnails directory is held to THUMBNAIL_DISK_BUDGET bytes. A set's
+directory mtime is its last use: it is refreshed when the set is generated
+and, at most hourly, when the thumbnail view serves a file from it. When the
+budget is exceeded, the least recently used sets are deleted and their events
+go back to the original image until the generate_thumbnails command runs.
+A set lost some other way (a wiped disk) is regenerated on first request;
+see missing().
+"""
+import hashlib
+import logging
+import multiprocessing
+import os
+import re
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import requests
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image, UnidentifiedImageError
+
+from . import imaging, page_cache
+from .conditional import bump_catalogue
+from .jobs import enqueue
+from .models import Event
+
+logger = logging.getLogger(__name__)
+
+DIRECTORY = 'thumbnails'
+CONTENT_TYPES = {'webp': 'image/webp', 'jpeg': 'image/jpeg'}
+EXTENSIONS = {'webp': 'webp', 'jpeg': 'jpg'}
+# How often serving a set may refresh its last-use time
+TOUCH_INTERVAL = 3600
+# How long a lost set waits before another request can queue it again
+REGENERATE_INTERVAL = 600
+
+KEY_RE = re.compile(r'^[0-9a-f]{32}$')
+NAME_RE = re.compile(r'^(\d+)\.(webp|jpg)$')
+
+_executor = None
+_executor_pid = None
+
+
+class ThumbnailError(Exception):
+    """The source image could not be fetched or decoded"""
+
+
+def root():
+    return os.path.join(settings.MEDIA_ROOT, DIRECTORY)
+
+
+def set_path(key):
+    return os.path.join(root(), key)
+
+
+def file_name(width, image_format):
+    return f'{width}.{EXTENSIONS[image_format]}'
+
+
+def _pool():
+    """The process pool for this process, or None to resize inline"""
+    global _executor, _executor_pid
+    if settings.THUMBNAIL_WORKERS <= 0:
+        return None
+    if _executor is None or _executor_pid != os.getpid():
+        # Spawned, not forked: the web and job processes run background threads
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.THUMBNAIL_WORKERS, mp_context=multiprocessing.get_context('spawn')
+        )
+        _executor_pid = os.getpid()
+    return _executor
+
+
+def fetch(url):
+    """The bytes of the image at url: a remote URL, or a path under STATIC_URL or MEDIA_URL"""
+    static_prefix = '/' + settings.STATIC_URL.lstrip('/')
+    media_prefix = '/' + settings.MEDIA_URL.lstrip('/')
+    if url.startswith(static_prefix):
+        path = finders.find(url[len(static_prefix):]) or os.path.join(
+            settings.STATIC_ROOT, url[len(static_prefix):]
+        )
+        try:
+            with open(path, 'rb') as image_file:
+                return image_file.read(settings.THUMBNAIL_MAX_SOURCE_BYTES + 1)
+        except OSError as e:
+            raise ThumbnailError(f'Cannot read {url}: {e}') from e
+    if url.startswith(media_prefix):
+        try:
+            with default_storage.open(url[len(media_prefix):], 'rb') as image_file:
+                return image_file.read(settings.THUMBNAIL_MAX_SOURCE_BYTES + 1)
+        except OSError as e:
+            raise ThumbnailError(f'Cannot read {url}: {e}') from e
+    if not url.startswith(('http://', 'https://')):
+        raise ThumbnailError(f'Unsupported image URL {url!r}')
+
+    try:
+        with requests.get(url, stream=True, timeout=settings.THUMBNAIL_FETCH_TIMEOUT) as response:
+            response.raise_for_status()
+            chunks, received = [], 0
+            for chunk in response.iter_content(64 * 1024):
+                received += len(chunk)
+                if received > settings.THUMBNAIL_MAX_SOURCE_BYTES:
+                    raise ThumbnailError(f'{url} is larger than {settings.THUMBNAIL_MAX_SOURCE_BYTES} bytes')
+                chunks.append(chunk)
+    except requests.RequestException as e:
+        raise ThumbnailError(f'Cannot fetch {url}: {e}') from e
+    return b''.join(chunks)
+
+
+def _key(data):
+    settings_part = f"{sorted(settings.THUMBNAIL_WIDTHS)}:{settings.THUMBNAIL_QUALITY}:{imaging.FORMATS}"
+    return hashlib.sha256(data + settings_part.encode()).hexdigest()[:32]
+
+
+def _store(key, rendered):
+    """Write a rendered set, atomically, and return its Event.thumbnails entry"""
+    final = set_path(key)
+    if not os.path.isdir(final):
+        staging = f'{final}.{os.getpid()}.tmp'
+        os.makedirs(staging, exist_ok=True)
+        for width, encoded in rendered['variants'].items():
+            for image_format, content in encoded.items():
+                with open(os.path.join(staging, file_name(width, image_format)), 'wb') as out:
+                    out.write(content)
+        try:
+            os.rename(staging, final)
+        except OSError:
+            # Another worker stored the same set first
+            shutil.rmtree(staging, ignore_errors=True)
+    os.utime(final)
+    return {
+        'key': key,
+        'widths': sorted(rendered['variants']),
+        'width': rendered['width'],
+        'height': rendered['height'],
+    }
+
+
+def generate(events, sources=None):
+    """
+    Make thumbnails for events and point them at the results.
+
+    sources optionally maps event id to the image bytes, for images that are
+    already at hand. Others are fetched. The resizing runs in the process
+    pool. Events whose image can't be fetched or decoded are logged and
+    skipped. Returns {event id: Event.thumbnails entry} for the rest.
+    """
+    sources = sources or {}
+    pool = _pool()
+    args = (settings.THUMBNAIL_WIDTHS, settings.THUMBNAIL_QUALITY)
+    pending = []
+    for event in events:
+        try:
+            data = sources.get(event.id) or fetch(event.image)
+        except ThumbnailError as e:
+            logger.warning('Skipping thumbnails for event %s: %s', event.id, e, extra={'event_id': event.id})
+            continue
+        if len(data) > settings.THUMBNAIL_MAX_SOURCE_BYTES:
+            logger.warning('Skipping thumbnails for event %s: image too large', event.id, extra={'event_id': event.id})
+            continue
+        if pool is None:
+            render = lambda data=data: imaging.render_variants(data, *args)
+        else:
+            render = pool.submit(imaging.render_variants, data, *args).result
+        pending.append((event, _key(data), render))
+
+    stored = {}
+    for event, key, render in pending:
+        try:
+            rendered = render()
+        except (UnidentifiedImageError, Image.DecompressionBombError, OSError, ValueError) as e:
+            logger.warning('Cannot resize image of event %s: %s', event.id, e, extra={'event_id': event.id})
+            continue
+        entry = _store(key, rendered)
+        entry['source'] = event.image
+        # Only if the image hasn't changed while we worked
+        if Event.objects.filter(pk=event.id, image=event.image).update(thumbnails=entry, updated_at=timezone.now()):
+            stored[event.id] = entry
+
+    if stored:
+        bump_catalogue()
+        page_cache.purge(page_cache.CATALOGUE_TAG, *[page_cache.event_tag(event_id) for event_id in stored])
+        evict(keep={entry['key'] for entry in stored.values()})
+    return stored
+
+
+def disk_usage():
+    """[(last used, bytes, key)] for every stored set"""
+    usage = []
+    try:
+        entries = list(os.scandir(root()))
+    except FileNotFoundError:
+        return usage
+    for entry in entries:
+        if not entry.is_dir() or not KEY_RE.match(entry.name):
+            continue
+        size = sum(f.stat().st_size for f in os.scandir(entry.path) if f.is_file())
+        usage.append((entry.stat().st_mtime, size, entry.name))
+    return usage
+
+
+def evict(keep=()):
+    """Delete least recently used sets until the directory fits THUMBNAIL_DISK_BUDGET"""
+    usage = sorted(disk_usage())
+    total = sum(size for _, size, _ in usage)
+    evicted = []
+    for _, size, key in usage:
+        if total <= settings.THUMBNAIL_DISK_BUDGET:
+            break
+        if key in keep:
+            continue
+        shutil.rmtree(set_path(key), ignore_errors=True)
+        total -= size
+        evicted.append(key)
+
+    if evicted:
+        event_ids = list(Event.objects.filter(thumbnails__key__in=evicted).values_list('id', flat=True))
+        Event.objects.filter(id__in=event_ids).update(thumbnails={}, updated_at=timezone.now())
+        bump_catalogue()
+        page_cache.purge(page_cache.CATALOGUE_TAG, *[page_cache.event_tag(event_id) for event_id in event_ids])
+        logger.info('Evicted %d thumbnail sets', len(evicted), extra={'evicted': len(evicted), 'bytes': total})
+    return evicted
+
+
+def touch(key):
+    """Record a use of the set, at most once per TOUCH_INTERVAL"""
+    path = set_path(key)
+    try:
+        if time.time() - os.stat(path).st_mtime > TOUCH_INTERVAL:
+            os.utime(path)
+    except OSError:
+        pass
+
+
+def missing(key):
+    """
+    The original image URL for a set that is referenced but not on disk.
+
+    Queues the set's event for regeneration, at most once per
+    REGENERATE_INTERVAL. Returns None if no event uses the key.
+    """
+    event = Event.objects.filter(thumbnails__key=key).only('id', 'image').first()
+    if event is None:
+        return None
+    if cache.add(f'thumbnails:regenerate:{event.id}', 1, REGENERATE_INTERVAL):
+        enqueue('generate_thumbnails', {'event_id': event.id})
+    return event.image
+
+
+def variants(event):
+    """[{'width': w, format: url, ...}] for event's current thumbnails, narrowest first"""
+    entry = event.thumbnails
+    if not entry or entry.get('source') != event.image:
+        return []
+    return [
+        {
+            'width': width,
+            **{
+                image_format: reverse('thumbnail', args=[entry['key'], file_name(width, image_format)])
+                for image_format in imaging.FORMATS
+            },
+        }
+        for width in entry['widths']
+    ]
+
+
+def srcset(event, image_format):
+    """The srcset for event's thumbnails in image_format, or '' when it has none for its current image"""
+    entry = event.thumbnails
+    if not entry or entry.get('source') != event.image or image_format not in imaging.FORMATS:
+        return ''
+    return ', '.join(
+        f"{reverse('thumbnail', args=[entry['key'], file_name(width, image_format)])} {width}w"
+        for width in entry['widths']
+    )
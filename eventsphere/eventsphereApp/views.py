@@ -1,41 +1,63 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.http import HttpResponse
-from .models import Event, Booking, Ticket
+from .models import Event, Booking
 from django.contrib.auth.models import User
 from django.contrib.auth import authenticate, login, logout
 from django.contrib import messages
-from django.db.models import Q
-from django.core.files.storage import FileSystemStorage
+from django.core.files.storage import FileSystemStorage, default_storage
 from django.templatetags.static import static
 from django.utils import timezone
-from django.db import models
+from django.db import models, transaction
 # --- Image Upload to CDN ---
 import os
 import sys
 import base64
-import requests
 from dotenv import load_dotenv
 load_dotenv('.env')
 import datetime
+import json
+import uuid
 # ---------------------------
 # --- Bookmark Events ----
-from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse
-from django.views.decorators.http import require_POST
+from asgiref.sync import sync_to_async
+from django.http import FileResponse, Http404, JsonResponse
+from .async_support import aget_object_or_404, aget_user, arender, login_required, require_POST
 from .models import Bookmark
 # ---------------------------
+from django.conf import settings
+from django.core.paginator import Paginator
+from .pagination import akeyset_paginate, keyset_paginate, get_page_size
+from .analytics import organizer_dashboard
+from .jobs import enqueue
+from .bookings import reserve_seats, release_seats, SoldOut, booking_groups, cancellation_cutoff, seat_availability
+from .page_cache import cached_page, event_tag, CATALOGUE_TAG, PRICES_TAG, RECOMMENDATIONS_TAG
+from .db_router import read_from_replica
+from .conditional import conditional_page, catalogue_validator, event_validator, bookmarks_validator
+from .bookmark_cache import get_bookmarked_ids
+from . import metrics as request_metrics
+from . import exports, facets, recommendations, thumbnails
+from .checkin import check_in, manifest, ticket_token
+import logging
+
+logger = logging.getLogger(__name__)
 
 # def appHome(request):
 #     event_records = Event.objects.all().order_by('id')[:5]
 #     return render(request, 'index.html', context={'user': request.user, 'event_records': event_records})
+@cached_page([CATALOGUE_TAG])
 def appHome(request):
-    # Get the latest 5 events
-    event_records = Event.objects.all().order_by('id')[:5]
+    # Get the latest events, one keyset page at a time
+    page = keyset_paginate(
+        Event.objects.all(),
+        after=request.GET.get('after'),
+        page_size=get_page_size(request, default=settings.HOME_PAGE_SIZE)
+    )
 
     # Render the home page with events
     return render(request, 'index.html', context={
         'user': request.user,
-        'event_records': event_records
+        'event_records': page.object_list,
+        'page': page
     })
 
 def signup(request):
@@ -94,11 +116,15 @@ def logoutUser(request):
 
 def profile(request):
     if request.user.is_authenticated:
-        return render(request, "profile.html", context={'user': request.user})
+        return render(request, "profile.html", context={
+            'user': request.user,
+            'recommended_events': recommendations.for_user(request.user)
+        })
     else:
         return redirect('/login/')
 
 
+@cached_page()
 def about(request):
     return render(request, 'about.html', context={'user': request.user})        
 
@@ -108,37 +134,36 @@ def about(request):
 
 #     return render(request, 'events.html', context={'user': request.user})
 
-def eventsPage(request):
-    print(">>> eventsPage() CALLED <<<", flush=True)
-
-    # Get all events (newest first)
-    event_records = Event.objects.all().order_by('-id')
-    print(f">>> Retrieved {len(event_records)} events <<<", flush=True)
-    
-    # Add bookmark information
-    bookmarked_event_ids = []
-    if request.user.is_authenticated:
-        bookmarked_event_ids = list(
-            Bookmark.objects.filter(user=request.user).values_list('event_id', flat=True)
-        )
-
-    return render(request, 'events.html', context={
-        'user': request.user,
-        'event_records': event_records,
-        'bookmarked_event_ids': bookmarked_event_ids
+@conditional_page(catalogue_validator)
+@cached_page([CATALOGUE_TAG])
+@read_from_replica
+async def eventsPage(request):
+    # Get one page of events (newest first)
+    page = await akeyset_paginate(
+        Event.objects.all(),
+        after=request.GET.get('after'),
+        page_size=get_page_size(request)
+    )
+    logger.debug('Listed %d events', len(page))
+
+    # Bookmark hearts are filled in by page_state so the page can be cached
+    return await arender(request, 'events.html', context={
+        'user': await aget_user(request),
+        'event_records': page.object_list,
+        'page': page
     })
 
-def createEvent(request):
-    print(">>> createEvent() CALLED <<<", flush=True)
-
-    if not request.user.is_authenticated:
-        print(">>> User not authenticated, redirecting to login <<<", flush=True)
+async def createEvent(request):
+    user = await aget_user(request)
+    if not user.is_authenticated:
         return redirect('/login')
 
     if request.method == "POST":
-        print(">>> STEP 1: Entered POST block", flush=True)
-        print(">>> POST data:", request.POST, flush=True)
-        print(">>> FILES:", request.FILES, flush=True)
+        # Field names only: the values hold the CSRF token and user input
+        logger.debug('Create event form submitted', extra={
+            'fields': sorted(request.POST.keys()),
+            'files': sorted(request.FILES.keys())
+        })
 
         # Extract all form fields
         title = request.POST.get('event-title')
@@ -153,6 +178,7 @@ def createEvent(request):
         end_datetime = request.POST.get('end-date-time')
         description = request.POST.get('event-description')
         ticket_price = request.POST.get('ticket-price')
+        capacity = request.POST.get('event-capacity') or None
         image_file = request.FILES.get('image-upload')
 
         # Default images map
@@ -165,197 +191,164 @@ def createEvent(request):
             "festival": static("images/default_festival.jpg")
         }
 
-        # Debug
-        print(f">>> STEP 2: Got image file = {image_file}", flush=True)
+        # Start with the category default; an uploaded image replaces it once
+        # the upload_event_image job has pushed it to the image host
+        image_url = default_images.get(event_type.lower(), static("images/default_generic.jpg"))
 
-        image_url = None
+        upload_path = None
         if image_file:
-            try:
-                imgbb_key = os.environ.get("IMGBB_KEY")
-                if imgbb_key:
-                    image_bytes = image_file.read()
-                    response = requests.post(
-                        'https://api.imgbb.com/1/upload',
-                        params={'key': imgbb_key},
-                        files={'image': (image_file.name, image_bytes, image_file.content_type)}
-                    )
-                    response_data = response.json()
-                    print(">>> imgbb response:", response_data, flush=True)
-                    if response.status_code == 200 and 'data' in response_data:
-                        image_url = response_data['data']['url']
-                else:
-                    print(">>> ERROR: IMGBB_KEY not found in environment variables <<<", flush=True)
-            except Exception as e:
-                print(">>> EXCEPTION during image upload:", str(e), flush=True)
+            # Streams the upload to MEDIA_ROOT in chunks rather than reading it into memory
+            extension = os.path.splitext(image_file.name)[1].lower()
+            upload_path = await sync_to_async(default_storage.save)(
+                f'event_uploads/{uuid.uuid4().hex}{extension}', image_file
+            )
 
-        # If no image uploaded, assign default
-        if not image_url:
-            image_url = default_images.get(event_type.lower(), static("images/default_generic.jpg"))
+        # Create the event object; transactions are sync only, so in a worker thread
+        @sync_to_async
+        def create_event():
+            with transaction.atomic():
+                event = Event.objects.create(
+                    title=title,
+                    category=event_type,
+                    address=address,
+                    city=city,
+                    pincode=pincode,
+                    starts_at=start_datetime,
+                    ends_at=end_datetime,
+                    description=description,
+                    ticket_price=ticket_price,
+                    capacity=capacity,
+                    image=image_url,
+                    user_id=user
+                )
+
+                if upload_path:
+                    enqueue('upload_event_image', {
+                        'event_id': event.id,
+                        'path': upload_path,
+                        'content_type': image_file.content_type
+                    })
+                else:
+                    enqueue('generate_thumbnails', {'event_id': event.id})
+            return event
 
-        # Create the event object
         try:
-            event = Event.objects.create(
-                title=title,
-                category=event_type,
-                address=address,
-                city=city,
-                pincode=pincode,
-                starts_at=start_datetime,
-                ends_at=end_datetime,
-                description=description,
-                ticket_price=ticket_price,
-                image=image_url,
-                user_id=request.user
-            )
-
-            print(f">>> STEP 3: Event '{event.title}' created successfully <<<", flush=True)
+            event = await create_event()
+            logger.info('Created event %s', event.id, extra={'event_id': event.id, 'image_upload': bool(upload_path)})
             return redirect('/events')
-        except Exception as e:
-            print(">>> ERROR creating event:", str(e), flush=True)
-            return render(request, 'event_create_form.html', {
-                'user': request.user,
+        except Exception:
+            logger.exception('Failed to create event')
+            if upload_path:
+                await sync_to_async(default_storage.delete)(upload_path)
+            return await arender(request, 'event_create_form.html', {
+                'user': user,
                 'error': 'Failed to create event. Check logs for details.'
             })
 
     # GET request: render empty form
-    print(">>> Rendering event_create_form.html (GET) <<<", flush=True)
-    return render(request, 'event_create_form.html', context={'user': request.user})
+    return await arender(request, 'event_create_form.html', context={'user': user})
 
 def myTicketsList(request):
     if request.user.is_authenticated:
-        # get the userid
-        user_id = request.user.id
-        # for that userid get the tickets record
-        ticket_records = Booking.objects.filter(user_id=user_id).select_related('event_id')
-        
-        # Group tickets by event
-        grouped_tickets = {}
-        for t_record in ticket_records:
-            event_record = t_record.event_id
-            event_id = event_record.id
-            
-            if event_id not in grouped_tickets:
-                grouped_tickets[event_id] = {
-                    'event_name': event_record.title,
-                    'dateTime': event_record.starts_at,
-                    'location': event_record.city,
-                    'event_image': event_record.image,
-                    'tickets': []
-                }
-            
-            ticket = {
-                'id': t_record.id,
-                'is_cancelled': t_record.is_cancelled,
-                'can_cancel': t_record.can_cancel(),
-                'booked_at': t_record.booked_at
-            }
-            grouped_tickets[event_id]['tickets'].append(ticket)
-        
-        # Convert to list and calculate counts
-        grouped_tickets_list = []
-        for event_id, data in grouped_tickets.items():
-            data['event_id'] = event_id
-            data['total_tickets'] = len(data['tickets'])
-            data['active_tickets'] = sum(1 for t in data['tickets'] if not t['is_cancelled'])
-            data['cancelled_tickets'] = sum(1 for t in data['tickets'] if t['is_cancelled'])
-            grouped_tickets_list.append(data)
-        
-        # Sort by most recent booking
-        grouped_tickets_list.sort(key=lambda x: max(t['booked_at'] for t in x['tickets']), reverse=True)
+        # Groups are aggregated and paginated in SQL; each group's bookings
+        # are fetched from my_event_tickets when it is expanded
+        paginator = Paginator(booking_groups(request.user), settings.MY_TICKETS_PAGE_SIZE)
+        page = paginator.get_page(request.GET.get('page'))
         
         # pass to the template
-        return render(request, 'mytickets.html', context={'grouped_tickets': grouped_tickets_list})
+        return render(request, 'mytickets.html', context={'grouped_tickets': page.object_list, 'page': page})
     else:
         return redirect('/login')
 
 
+@login_required
+def my_event_tickets(request, event_id):
+    """The user's bookings for one event, newest first, as rows for My Tickets"""
+    event = get_object_or_404(Event.objects.only('id', 'starts_at'), id=event_id)
+    page = keyset_paginate(
+        Booking.objects.filter(user_id=request.user, event_id=event).only('id', 'booked_at', 'is_cancelled'),
+        after=request.GET.get('after'),
+        page_size=settings.MY_TICKETS_BOOKINGS_PAGE_SIZE
+    )
+    return render(request, 'mytickets_bookings.html', context={
+        'event_id': event.id,
+        'page': page,
+        'can_cancel': event.starts_at >= cancellation_cutoff()
+    })
+
+
 def showTicket(request):
-    ticket_id = request.GET.get('id')
-    user_id = request.user.id
-    ticket_record = Booking.objects.get(id=ticket_id)
+    ticket_id = request.GET.get('id', '')
+    # One query: the owner check is part of the lookup and the holder is the current user
+    ticket_record = None
+    if request.user.is_authenticated and ticket_id.isdigit():
+        ticket_record = Booking.objects.select_related('event_id').filter(
+            id=ticket_id, user_id=request.user
+        ).first()
     # check if this userid have access to the request ticket using ticket id
-    if ticket_record.user_id.id == user_id:
+    if ticket_record is not None:
         ticket = {}
         ticket['id'] = ticket_record.id
         ticket['ename'] = ticket_record.event_id.title
         ticket['dateTime'] = ticket_record.event_id.starts_at
         ticket['location'] = ticket_record.event_id.city
-        ticket['holder'] = ticket_record.user_id.first_name
+        ticket['holder'] = request.user.first_name
+        ticket['token'] = ticket_token(ticket_record)
+        ticket['is_cancelled'] = ticket_record.is_cancelled
 
         return render(request, 'ticket.html', context={'ticket': ticket})
     else:
         return redirect('/my-tickets')
         
 
-def searchResults(request):
-    search_query = request.GET.get('query', '').strip()
-    search_date = request.GET.get('date', '').strip()
-    search_type = request.GET.get('search-type', '').strip()
-    
-    # Start with all events
-    event_records = Event.objects.all()
-    
-    # Filter by search query if provided
-    if search_query:
-        if search_type == 'name':
-            # Search only by name
-            event_records = event_records.filter(title__icontains=search_query)
-        elif search_type == 'location':
-            # Search only by location
-            event_records = event_records.filter(city__icontains=search_query)
-        else:
-            # Search in both title and city
-            query = Q(title__icontains=search_query)
-            query.add(Q(city__icontains=search_query), Q.OR)
-            event_records = event_records.filter(query)
-    
-    # Filter by date if provided (applies regardless of search_type)
-    if search_date:
-        try:
-            # Parse the date from the date input (format: YYYY-MM-DD)
-            search_datetime = datetime.datetime.strptime(search_date, '%Y-%m-%d')
-            search_datetime = timezone.make_aware(search_datetime)
-            next_day = search_datetime + datetime.timedelta(days=1)
-            
-            # Filter events that start on the selected date
-            event_records = event_records.filter(
-                starts_at__gte=search_datetime,
-                starts_at__lt=next_day
-            )
-        except ValueError:
-            messages.error(request, 'Invalid date format.')
+@cached_page([CATALOGUE_TAG, PRICES_TAG])
+@read_from_replica
+async def searchResults(request):
+    # Free text ('name' searches titles, 'location' searches cities, anything
+    # else searches everything) narrowed by category, city, price and date facets
+    filters, errors = facets.parse_filters(request.GET)
+    for error in errors:
+        messages.error(request, error)
     
     # If no search parameters provided at all, redirect to home
-    if not search_query and not search_date:
+    if facets.is_empty(filters):
         return redirect('/')
     
+    event_records, total_results, facet_groups = await sync_to_async(facets.search)(filters)
+    
     # Pass search values back to template to preserve them
     context = {
         'event_records': event_records,
-        'search_query': search_query,
-        'search_date': search_date,
-        'search_type': search_type
+        'total_results': total_results,
+        'facets': facet_groups,
+        'search_query': filters['query'],
+        'search_date': request.GET.get('date', '').strip(),
+        'search_type': filters['search_type']
     }
     
-    return render(request, 'events.html', context=context)
+    return await arender(request, 'events.html', context=context)
 
-def viewEvent(request):
+@conditional_page(event_validator)
+@cached_page(lambda request: [event_tag(request.GET.get('id')), RECOMMENDATIONS_TAG])
+@read_from_replica
+async def viewEvent(request):
     event_id = request.GET.get('id')
     if event_id:
-        event = Event.objects.get(id=event_id)
-        organizer = User.objects.get(id=event.user_id_id).first_name
+        event = await Event.objects.select_related('user_id').aget(id=event_id)
+        organizer = event.user_id.first_name
         
-        # Add bookmark check
-        bookmarked_event_ids = []
-        if request.user.is_authenticated:
-            bookmarked_event_ids = list(
-                Bookmark.objects.filter(user=request.user, event=event).values_list('event_id', flat=True)
-            )
+        # Bookmark state and seats left are refreshed by page_state, since
+        # this page is served from the page cache
+        # Largest quantity the buy form offers
+        max_tickets = settings.MAX_TICKETS_PER_PURCHASE
+        if event.seats_left is not None:
+            max_tickets = min(max_tickets, event.seats_left)
         
-        return render(request, 'view_event.html', context={
+        return await arender(request, 'view_event.html', context={
             'event': event, 
             'organizer': organizer,
-            'bookmarked_event_ids': bookmarked_event_ids
+            'max_tickets': max_tickets,
+            'recommended_events': [similar async for similar in recommendations.similar_events(event.id)]
         })
     else:
         return HttpResponse(status=204)
@@ -365,11 +358,19 @@ def buyTicket(request):
         event_id = request.GET.get('id')
 
         event_record = Event.objects.get(id=event_id)
-        user_record = User.objects.get(id=request.user.id)
-        Booking.objects.create(
-            event_id=event_record,
-            user_id=user_record
-        )
+        try:
+            quantity = int(request.GET.get('quantity', 1))
+        except ValueError:
+            quantity = 1
+        if not 1 <= quantity <= settings.MAX_TICKETS_PER_PURCHASE:
+            messages.error(request, f"You can buy between 1 and {settings.MAX_TICKETS_PER_PURCHASE} tickets at a time.")
+            return redirect(f'/view-event/?id={event_record.id}')
+        
+        try:
+            reserve_seats(event_record, request.user, quantity=quantity)
+        except SoldOut:
+            messages.error(request, f"Sorry, '{event_record.title}' is sold out.")
+            return redirect(f'/view-event/?id={event_record.id}')
         return redirect('/my-tickets')
 
     else:
@@ -379,13 +380,21 @@ def buyTicket(request):
 @require_POST
 def cancel_ticket(request, booking_id):
     """Cancel a ticket booking if 5 or more days before event"""
-    booking = get_object_or_404(Booking, id=booking_id, user_id=request.user)
-    
-    if booking.can_cancel():
-        booking.is_cancelled = True
-        booking.cancelled_at = timezone.now()
-        booking.save()
+    booking = get_object_or_404(
+        Booking.objects.select_related('event_id'), id=booking_id, user_id=request.user
+    )
+    
+    try:
+        quantity = max(int(request.POST.get('quantity', 1)), 1)
+    except ValueError:
+        quantity = 1
+    
+    # release_seats only cancels each booking once, even if the form is submitted twice
+    released = booking.can_cancel() and release_seats(booking, quantity=quantity)
+    if released == 1:
         messages.success(request, f"Ticket for '{booking.event_id.title}' has been cancelled successfully.")
+    elif released:
+        messages.success(request, f"{released} tickets for '{booking.event_id.title}' have been cancelled successfully.")
     else:
         if booking.is_cancelled:
             messages.error(request, "This ticket has already been cancelled.")
@@ -402,9 +411,8 @@ def deleteEvent(request, event_id):
         messages.error(request, "You are not allowed to delete this event.")
         return redirect('/events')
 
-    # Check if tickets have been sold
-    tickets_sold = Ticket.objects.filter(event=event).count()
-    if tickets_sold > 0:
+    # Only while nobody holds a ticket; Ticket rows stay after seats are cancelled
+    if Booking.objects.filter(event_id=event, is_cancelled=False).exists():
         messages.error(request, "Cannot delete event. Tickets have already been sold.")
         return redirect('/events')
 
@@ -415,17 +423,25 @@ def deleteEvent(request, event_id):
 
 @login_required
 @require_POST
-def toggle_bookmark(request, event_id):
-    event = get_object_or_404(Event, id=event_id)
-    bookmark, created = Bookmark.objects.get_or_create(user=request.user, event=event)
-    
+async def toggle_bookmark(request, event_id):
+    event = await aget_object_or_404(Event.objects.only('id'), id=event_id)
+    
+    @sync_to_async
+    def toggle():
+        with transaction.atomic():
+            bookmark, created = Bookmark.objects.get_or_create(user=request.user, event=event)
+            if not created:
+                bookmark.delete()
+        return created
+    
+    created = await toggle()
     if not created:
-        bookmark.delete()
         return JsonResponse({'bookmarked': False})
     
     return JsonResponse({'bookmarked': True})
 
 @login_required
+@conditional_page(bookmarks_validator)
 def bookmarked_events(request):
     bookmarks = Bookmark.objects.filter(user=request.user).select_related('event')
     bookmarked_events_list = [bookmark.event for bookmark in bookmarks]
@@ -441,19 +457,14 @@ def my_listed_events(request):
     # Get all events created by the logged-in user
     user_events = Event.objects.filter(user_id=request.user).order_by('-id')
     
-    # Calculate stats for each event
+    # Stats come from the counters stored on each Event row
     events_with_stats = []
     for event in user_events:
-        # Count bookings (tickets sold) for this event
-        bookings_count = Booking.objects.filter(event_id=event).count()
-        
-        bookmarks_count = Bookmark.objects.filter(event=event).count()
-        
         events_with_stats.append({
             'event': event,
-            'tickets_sold': bookings_count,
-            'bookmarks_count': bookmarks_count,
-            'revenue': bookings_count * event.ticket_price
+            'tickets_sold': event.tickets_sold,
+            'bookmarks_count': event.bookmarks_count,
+            'revenue': event.tickets_sold * event.ticket_price
         })
     
     context = {
@@ -463,24 +474,39 @@ def my_listed_events(request):
 
 
 @login_required
+@read_from_replica
 def event_attendees(request, event_id):
     event = get_object_or_404(Event, id=event_id, user_id=request.user)
     
-    # Get all bookings for this event
-    bookings = Booking.objects.filter(event_id=event).select_related('user_id').order_by('-id')
+    # One page of bookings, newest first; the totals come from the event's counters
+    page = keyset_paginate(
+        Booking.objects.filter(event_id=event).select_related('user_id'),
+        after=request.GET.get('after'),
+        page_size=settings.ATTENDEES_PAGE_SIZE
+    )
     
-    # Calculate total revenue (each booking = 1 ticket in your current model)
-    total_bookings = bookings.count()
-    total_revenue = total_bookings * event.ticket_price
+    # Each booking is one ticket
+    total_revenue = event.tickets_sold * event.ticket_price
     
     context = {
         'event': event,
-        'bookings': bookings,
+        'page': page,
         'total_revenue': total_revenue
     }
     return render(request, 'event_attendees.html', context)
 
 
+@login_required
+@read_from_replica
+def event_attendees_export(request, event_id):
+    """Every booking for the organizer's event as a streamed CSV or JSONL download"""
+    event = get_object_or_404(Event.objects.only('id', 'ticket_price'), id=event_id, user_id=request.user)
+    export_format = request.GET.get('format', 'csv')
+    if export_format not in exports.FORMATS:
+        return HttpResponse(f"format must be one of {', '.join(exports.FORMATS)}", status=400)
+    return exports.attendee_export(request, event, export_format)
+
+
 @login_required
 def event_bookmarks_list(request, event_id):
     event = get_object_or_404(Event, id=event_id, user_id=request.user)
@@ -504,7 +530,8 @@ def edit_ticket_price(request, event_id):
         if new_price:
             try:
                 event.ticket_price = int(new_price)
-                event.save()
+                # Only write the price so a stale copy of the counters isn't saved back
+                event.save(update_fields=['ticket_price'])
                 return JsonResponse({'success': True, 'new_price': event.ticket_price})
             except ValueError:
                 return JsonResponse({'success': False, 'error': 'Invalid price'})
@@ -512,68 +539,106 @@ def edit_ticket_price(request, event_id):
     return JsonResponse({'success': False})
 
 @login_required
+@read_from_replica
 def analytics_dashboard(request):
-    # Get all events created by the logged-in user
-    user_events = Event.objects.filter(user_id=request.user)
+    # Everything comes from the daily rollup table, whatever the number of events
+    dashboard = organizer_dashboard(request.user)
     
     # Check if user has any events
-    if not user_events.exists():
+    if dashboard is None:
         context = {
             'has_data': False,
             'message': 'No data to display the results'
         }
         return render(request, 'analytics_dashboard.html', context)
     
-    # Calculate total revenue and tickets sold
-    total_tickets_sold = 0
-    total_revenue = 0
-    event_stats = []
-    category_revenue = {}
-    
-    for event in user_events:
-        bookings_count = Booking.objects.filter(event_id=event).count()
-        revenue = bookings_count * event.ticket_price
-        
-        total_tickets_sold += bookings_count
-        total_revenue += revenue
-        
-        event_stats.append({
-            'title': event.title,
-            'tickets_sold': bookings_count,
-            'revenue': revenue
-        })
-        
-        # Aggregate by category
-        if event.category in category_revenue:
-            category_revenue[event.category] += revenue
-        else:
-            category_revenue[event.category] = revenue
-    
-    # Sort events by tickets sold and get top 5
-    top_5_events = sorted(event_stats, key=lambda x: x['tickets_sold'], reverse=True)[:5]
+    context = {'has_data': True, **dashboard}
     
-    # Sort categories by revenue and get top 5
-    top_5_categories = sorted(category_revenue.items(), key=lambda x: x[1], reverse=True)[:5]
+    return render(request, 'analytics_dashboard.html', context)
+
+
+PAGE_STATE_MAX_EVENTS = 100
+
+def page_state(request):
+    """Per-user and fast-changing bits for pages served from the page cache"""
+    try:
+        event_ids = [int(i) for i in request.GET.get('ids', '').split(',') if i][:PAGE_STATE_MAX_EVENTS]
+    except ValueError:
+        return JsonResponse({'error': 'ids must be a comma separated list of event ids'}, status=400)
     
-    # Calculate percentage for pie chart (all events)
-    event_revenue_percentage = []
-    if total_revenue > 0:
-        for stat in event_stats:
-            if stat['revenue'] > 0:
-                percentage = (stat['revenue'] / total_revenue) * 100
-                event_revenue_percentage.append({
-                    'title': stat['title'],
-                    'revenue': stat['revenue'],
-                    'percentage': round(percentage, 2)
-                })
+    bookmarked = []
+    if request.user.is_authenticated and event_ids:
+        bookmarked_ids = get_bookmarked_ids(request.user)
+        bookmarked = [event_id for event_id in event_ids if event_id in bookmarked_ids]
     
-    context = {
-        'has_data': True,
-        'total_revenue': total_revenue,
-        'total_tickets_sold': total_tickets_sold,
-        'top_5_events': top_5_events,
-        'top_5_categories': top_5_categories,
-        'event_revenue_percentage': event_revenue_percentage,
-    }
+    availability = {}
+    if request.GET.get('availability') and event_ids:
+        availability = seat_availability(
+            Event.objects.filter(id__in=event_ids).only('id', 'capacity', 'active_tickets')
+        )
     
-    return render(request, 'analytics_dashboard.html', context)
\ No newline at end of file
+    response = JsonResponse({
+        'authenticated': request.user.is_authenticated,
+        'bookmarked': bookmarked,
+        'availability': availability
+    })
+    response['Cache-Control'] = 'private, no-store'
+    return response
+
+
+def metrics(request):
+    """Prometheus scrape endpoint"""
+    if not request_metrics.is_authorized(request):
+        return HttpResponse(status=403)
+    response = HttpResponse(request_metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+    response['Cache-Control'] = 'no-store'
+    return response
+
+
+def thumbnail(request, key, name):
+    """Serve a stored event thumbnail; a set's files never change, so browsers may keep them for good"""
+    match = thumbnails.NAME_RE.match(name)
+    if not thumbnails.KEY_RE.match(key) or not match:
+        raise Http404('No such thumbnail')
+    try:
+        image_file = open(os.path.join(thumbnails.set_path(key), name), 'rb')
+    except FileNotFoundError:
+        original = None if os.path.isdir(thumbnails.set_path(key)) else thumbnails.missing(key)
+        if original is None:
+            raise Http404('No such thumbnail')
+        return redirect(original)
+    thumbnails.touch(key)
+    image_format = 'webp' if match.group(2) == 'webp' else 'jpeg'
+    response = FileResponse(image_file, content_type=thumbnails.CONTENT_TYPES[image_format])
+    response['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+
+
+@login_required
+@require_POST
+def checkin_scan(request, event_id):
+    """Check in a batch of scanned ticket tokens: {"tokens": [...]}"""
+    event = get_object_or_404(Event.objects.only('id', 'user_id'), id=event_id, user_id=request.user)
+    try:
+        tokens = json.loads(request.body).get('tokens')
+    except (ValueError, AttributeError):
+        tokens = None
+    if not isinstance(tokens, list) or not all(isinstance(token, str) for token in tokens):
+        return JsonResponse({'error': 'Send a JSON object with a "tokens" list of strings'}, status=400)
+    if len(tokens) > settings.CHECKIN_MAX_BATCH:
+        return JsonResponse({'error': f'At most {settings.CHECKIN_MAX_BATCH} tokens per batch'}, status=400)
+    
+    results = check_in(event, tokens)
+    return JsonResponse({
+        'checked_in': sum(1 for result in results if result['status'] == 'checked_in'),
+        'results': results
+    })
+
+
+@login_required
+def checkin_manifest(request, event_id):
+    """Valid, checked-in and revoked tickets plus the signing key, for offline gate devices"""
+    event = get_object_or_404(Event.objects.only('id', 'user_id'), id=event_id, user_id=request.user)
+    response = JsonResponse(manifest(event))
+    response['Cache-Control'] = 'private, no-store'
+    return response
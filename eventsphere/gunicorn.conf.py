@@ -0,0 +1,18 @@
+"""
+gunicorn settings for serving eventsphere.asgi with uvicorn workers.
+
+Each worker process runs an event loop, so while async views wait on the
+database or the network the same process keeps serving other requests.
+Sync views still run in a thread each, and under ASGI database connections
+are not kept per thread, so set DB_POOL_SIZE (see eventsphere/settings.py).
+Start with: gunicorn -c gunicorn.conf.py
+"""
+import os
+
+wsgi_app = 'eventsphere.asgi:application'
+worker_class = 'uvicorn.workers.UvicornWorker'
+workers = int(os.environ.get('WEB_CONCURRENCY', '2'))
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '30'))
+graceful_timeout = 30
+keepalive = 5